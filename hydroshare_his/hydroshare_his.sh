@@ -5,8 +5,17 @@ echo Activating Environment
 source activate his
 echo Collecting Static Files
 python manage.py collectstatic --noinput
+echo Applying Migrations
+python manage.py migrate --noinput
+
+echo Clearing Worker Metrics
+METRICS_DIR=$(python -c "from hydroshare_his import settings; print(settings.HIS.get('metrics_dir') or '')")
+if [ -n "$METRICS_DIR" ]; then
+    rm -rf "$METRICS_DIR"
+fi
 
 echo Starting Gunicorn.
 exec gunicorn hydroshare_his.wsgi:application \
     --bind 0.0.0.0:8000 \
-    --workers 3
\ No newline at end of file
+    --workers 3 \
+    --threads 16
\ No newline at end of file
@@ -11,10 +11,14 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Files written while the application runs are kept outside the project.
+RUNTIME_DIR = os.path.join(tempfile.gettempdir(), "hydroshare_his")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.11/howto/deployment/checklist/
@@ -144,12 +148,52 @@ HIS = {
     "hydroshare_url": None,
     "geoserver_url": None,
     "geoserver_data_dir":  None,
+    "geoserver_catalog_dir": None,
     "geoserver_user": None,
     "geoserver_pass": None,
     "geoserver_ns": None,
     "hydroserver_url": None,
     "hydroserver_data_dir": None,
     "hydroserver_user": None,
-    "hydroserver_pass": None
+    "hydroserver_pass": None,
+    "http_pool_size": 10,
+    "http_connect_timeout": 5,
+    "http_read_timeout": 120,
+    "http_retries": 3,
+    "http_backoff_factor": 0.5,
+    "geoserver_concurrency": 4,
+    "hydroserver_concurrency": 4,
+    "update_engine": "threads",
+    "async_pool_size": 100,
+    "async_updates": False,
+    "job_workers": 2,
+    "job_heartbeat_timeout": 60,
+    "job_admission_timeout": 600,
+    "update_debounce_window": 0,
+    "update_lock_timeout": 600,
+    "update_wait_timeout": 900,
+    "update_poll_interval": 0.5,
+    "reconcile_cache_ttl": 86400,
+    "bulk_workers": 4,
+    "bulk_max_workers": 16,
+    "raster_stats_cache_size": 100000,
+    "raster_stats_max_pixels": None,
+    "style_scope": "global",
+    "geoserver_preflight": True,
+    "hydroserver_preflight": True,
+    "slow_raster_pixels": 16777216,
+    "odm2_summary_cache_size": 10000,
+    "metrics_dir": os.path.join(RUNTIME_DIR, "metrics"),
+    "metrics_flush_interval": 1,
+    "circuit_failure_threshold": 5,
+    "circuit_reset_timeout": 30,
+    "circuit_refresh_interval": 1,
+    "max_concurrent_updates": 4,
+    "admission_queue_size": 32,
+    "admission_wait_timeout": 50,
+    "admission_retry_after": 10,
+    "admission_heartbeat_timeout": 30,
+    "trace_updates": False,
+    "trace_dir": os.path.join(RUNTIME_DIR, "traces")
 }
 
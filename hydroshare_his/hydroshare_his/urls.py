@@ -6,6 +6,7 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.urls import path
 from hydroshare_his import settings
+from web_services_manager import views
 
 
 schema_view = get_schema_view(
@@ -24,4 +25,5 @@ urlpatterns = [
     url(r'^his/admin/', admin.site.urls),
     url(r'^his/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     url(r'^his/services/', include('web_services_manager.urls')),
+    url(r'^his/metrics$', views.get_metrics, name='metrics'),
 ]
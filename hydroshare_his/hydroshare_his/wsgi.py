@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hydroshare_his.settings")
 
 application = get_wsgi_application()
+
+from web_services_manager import jobs
+
+jobs.start_job_pool()
@@ -2,5 +2,29 @@
 from __future__ import unicode_literals
 
 from django.contrib import admin
+from web_services_manager.models import UpdateJob, ResourceUpdate, PublishedResource, PublishedLayer
 
-# Register your models here.
+
+@admin.register(UpdateJob)
+class UpdateJobAdmin(admin.ModelAdmin):
+    list_display = ("job_id", "resource_id", "status", "layers_completed", "layers_total", "created", "finished")
+    list_filter = ("status",)
+    search_fields = ("resource_id",)
+
+
+@admin.register(ResourceUpdate)
+class ResourceUpdateAdmin(admin.ModelAdmin):
+    list_display = ("resource_id", "requested", "completed", "last_requested", "owner", "heartbeat")
+    search_fields = ("resource_id",)
+
+
+class PublishedLayerInline(admin.TabularInline):
+    model = PublishedLayer
+    extra = 0
+
+
+@admin.register(PublishedResource)
+class PublishedResourceAdmin(admin.ModelAdmin):
+    list_display = ("resource_id", "workspace_id", "network_id", "updated", "drift_checked")
+    search_fields = ("resource_id",)
+    inlines = (PublishedLayerInline,)
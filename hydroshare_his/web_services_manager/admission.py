@@ -0,0 +1,198 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager import coalesce
+from web_services_manager import metrics
+from web_services_manager.models import UpdateSlot, UpdateTicket
+
+
+INTERACTIVE = UpdateTicket.INTERACTIVE
+BULK = UpdateTicket.BULK
+
+_slots_created = 0
+_slots_lock = threading.Lock()
+
+
+class AdmissionError(coalesce.UpdateNotStartedError):
+    """
+    Raised when an update is turned away because the queue is full or it waited too long for a slot.
+    retry_after is the number of seconds the caller should wait before trying again.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_enabled():
+    return settings.HIS.get("max_concurrent_updates") is not None
+
+
+def get_stale_time():
+    return timezone.now() - timedelta(seconds=settings.HIS.get("admission_heartbeat_timeout", 30))
+
+
+def ensure_slots():
+    """
+    Creates the shared update slots, once per process.
+    """
+
+    global _slots_created
+
+    slot_count = settings.HIS.get("max_concurrent_updates")
+
+    with _slots_lock:
+        if _slots_created >= slot_count:
+            return
+        for slot in range(_slots_created, slot_count):
+            UpdateSlot.objects.get_or_create(slot=slot)
+        _slots_created = slot_count
+
+
+def get_free_slots():
+    """
+    Gets the numbers of slots that are free or whose holder stopped responding.
+    """
+
+    return list(
+        UpdateSlot.objects.filter(slot__lt=settings.HIS.get("max_concurrent_updates"))
+        .filter(Q(owner="") | Q(heartbeat__lt=get_stale_time()))
+        .values_list("slot", flat=True)
+    )
+
+
+def claim_slot(owner, free_slots):
+    """
+    Takes the first of free_slots no other caller took first. Returns the slot number, or None.
+    """
+
+    for slot in free_slots:
+        claimed = UpdateSlot.objects.filter(slot=slot).filter(
+            Q(owner="") | Q(heartbeat__lt=get_stale_time())
+        ).update(owner=owner, heartbeat=timezone.now())
+        if claimed:
+            return slot
+
+    return None
+
+
+def release_slot(slot, owner):
+    UpdateSlot.objects.filter(slot=slot, owner=owner).update(owner="")
+
+
+def keep_slot_alive(slot, owner, stop):
+    """
+    Refreshes the slot heartbeat until stop is set.
+    """
+
+    interval = settings.HIS.get("admission_heartbeat_timeout", 30) / 3
+
+    try:
+        while not stop.wait(interval):
+            UpdateSlot.objects.filter(slot=slot, owner=owner).update(heartbeat=timezone.now())
+    finally:
+        connection.close()
+
+
+def get_waiting(priority):
+    """
+    Gets the live tickets an update of this priority has to wait behind.
+    """
+
+    return UpdateTicket.objects.filter(priority__lte=priority, heartbeat__gte=get_stale_time())
+
+
+def get_queue_position(ticket):
+    return get_waiting(ticket.priority).filter(
+        Q(priority__lt=ticket.priority) | Q(id__lt=ticket.id)
+    ).count()
+
+
+def wait_for_slot(owner, priority):
+    """
+    Claims an update slot, queueing behind waiting updates of the same or higher priority.
+
+    Raises AdmissionError if admission_queue_size updates are already waiting or no slot comes free
+    within admission_wait_timeout seconds.
+    """
+
+    retry_after = settings.HIS.get("admission_retry_after", 10)
+
+    if not get_waiting(priority).exists():
+        slot = claim_slot(owner, get_free_slots())
+        if slot is not None:
+            return slot
+
+    if get_waiting(priority).count() >= settings.HIS.get("admission_queue_size", 32):
+        raise AdmissionError("Error: Too many updates are queued.", retry_after)
+
+    UpdateTicket.objects.filter(heartbeat__lt=get_stale_time()).delete()
+    ticket = UpdateTicket.objects.create(priority=priority, heartbeat=timezone.now())
+
+    poll_interval = settings.HIS.get("update_poll_interval", 0.5)
+    heartbeat_interval = settings.HIS.get("admission_heartbeat_timeout", 30) / 3
+    deadline = time.monotonic() + settings.HIS.get("admission_wait_timeout", 50)
+    last_heartbeat = time.monotonic()
+
+    try:
+        while True:
+            free_slots = get_free_slots()
+
+            if get_queue_position(ticket) < len(free_slots):
+                slot = claim_slot(owner, free_slots)
+                if slot is not None:
+                    return slot
+
+            if time.monotonic() > deadline:
+                raise AdmissionError("Error: Timed out waiting for an update slot.", retry_after)
+
+            time.sleep(poll_interval)
+
+            if time.monotonic() - last_heartbeat > heartbeat_interval:
+                UpdateTicket.objects.filter(id=ticket.id).update(heartbeat=timezone.now())
+                last_heartbeat = time.monotonic()
+    finally:
+        ticket.delete()
+
+
+def run_admitted(priority, function, *args, **kwargs):
+    """
+    Runs function(...) once it holds one of the max_concurrent_updates slots shared by all workers.
+
+    Interactive updates are admitted ahead of bulk updates. Raises AdmissionError instead of
+    waiting when the queue is full.
+    """
+
+    if not is_enabled():
+        return function(*args, **kwargs)
+
+    ensure_slots()
+
+    owner = uuid.uuid4().hex
+    labels = {"priority": "bulk" if priority == BULK else "interactive"}
+    start = time.perf_counter()
+
+    try:
+        slot = wait_for_slot(owner, priority)
+    except AdmissionError:
+        metrics.increment("his_admissions_total", dict(labels, result="rejected"))
+        raise
+
+    metrics.increment("his_admissions_total", dict(labels, result="admitted"))
+    metrics.observe("his_admission_wait_seconds", labels, time.perf_counter() - start)
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=keep_slot_alive, args=(slot, owner, stop), daemon=True)
+    heartbeat.start()
+
+    try:
+        return function(*args, **kwargs)
+    finally:
+        stop.set()
+        heartbeat.join()
+        release_slot(slot, owner)
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from hydroshare_his import settings
+from web_services_manager import clients
+from web_services_manager import metrics
+from web_services_manager import circuit
+from web_services_manager import tracing
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_sessions = {}
+_semaphores = {}
+
+
+class Response:
+    """
+    Status and body of a finished backend request, with the attributes of requests.Response the
+    response parsers read.
+    """
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+def get_loop():
+    """
+    Gets the event loop shared by all threads of this process, starting it in a background thread once.
+    """
+
+    global _loop, _loop_pid
+
+    if aiohttp is None:
+        raise ImproperlyConfigured("The asyncio update engine requires aiohttp.")
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _sessions.clear()
+            _semaphores.clear()
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="his-asyncio", daemon=True).start()
+        return _loop
+
+
+def run(coroutine):
+    """
+    Runs a coroutine on the shared event loop inside the caller's trace and span, and waits for its result.
+    """
+
+    loop = get_loop()
+    context = contextvars.copy_context()
+    done = threading.Event()
+    outcome = {}
+
+    def finish(task):
+        try:
+            outcome["result"] = task.result()
+        except BaseException as e:
+            outcome["error"] = e
+        done.set()
+
+    def start():
+        task = context.run(loop.create_task, coroutine)
+        task.add_done_callback(finish)
+
+    loop.call_soon_threadsafe(start)
+    done.wait()
+
+    if "error" in outcome:
+        raise outcome["error"]
+
+    return outcome["result"]
+
+
+async def run_blocking(function, *args, **kwargs):
+    """
+    Runs a blocking call, such as a database query, in the event loop's thread pool inside the current trace and span.
+    """
+
+    call = functools.partial(contextvars.copy_context().run, function, *args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def get_backend_auth(backend):
+    backend_user = settings.HIS.get(f"{backend}_user")
+    backend_pass = settings.HIS.get(f"{backend}_pass")
+
+    if backend_user is None:
+        return None
+
+    return aiohttp.BasicAuth(backend_user, backend_pass)
+
+
+def get_session(backend):
+    """
+    Gets the shared session for a backend, creating it on the event loop once per process.
+    """
+
+    if backend not in clients.BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if backend not in _sessions:
+        connect_timeout, read_timeout = clients.get_timeout()
+        _sessions[backend] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.HIS.get("async_pool_size", 100)),
+            auth=get_backend_auth(backend),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    return _sessions[backend]
+
+
+def get_semaphore(backend):
+    """
+    Gets the semaphore that bounds concurrent calls to a backend, as the threads engine's executors
+    do, sized by the backend's concurrency setting.
+    """
+
+    if backend not in _semaphores:
+        _semaphores[backend] = asyncio.Semaphore(settings.HIS.get(f"{backend}_concurrency", 4))
+
+    return _semaphores[backend]
+
+
+async def close_session_pool():
+    for session in _sessions.values():
+        await session.close()
+    _sessions.clear()
+    _semaphores.clear()
+
+
+def close_sessions():
+    """
+    Closes all pooled connections held by this process.
+    """
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            return
+
+    run(close_session_pool())
+
+
+def get_params(params):
+    """
+    Converts query parameters to strings, as requests does and aiohttp does not.
+    """
+
+    if params is None:
+        return None
+
+    return {key: str(value) for key, value in params.items()}
+
+
+async def send(backend, method, url, params=None, **kwargs):
+    """
+    Sends a request, retrying idempotent requests with backoff after connection errors, timeouts,
+    and gateway errors, as the retry policy of the sync sessions does.
+
+    aiohttp errors are raised as the requests exceptions circuit.UNAVAILABLE_ERRORS expects.
+    """
+
+    retries = settings.HIS.get("http_retries", 3) if method in clients.IDEMPOTENT_METHODS else 0
+    backoff_factor = settings.HIS.get("http_backoff_factor", 0.5)
+    session = get_session(backend)
+
+    for attempt in range(retries + 1):
+        if attempt > 1:
+            await asyncio.sleep(backoff_factor * 2 ** (attempt - 1))
+
+        try:
+            async with session.request(method, url, params=get_params(params), **kwargs) as response:
+                content = await response.read()
+        except asyncio.TimeoutError:
+            error = requests.exceptions.Timeout(f"Request to {url} timed out.")
+        except aiohttp.ClientError as e:
+            error = requests.exceptions.ConnectionError(str(e))
+        else:
+            if response.status not in clients.RETRY_STATUS_CODES or attempt == retries:
+                return Response(response.status, content)
+            continue
+
+        if attempt == retries:
+            raise error
+
+
+async def request(backend, method, url, operation="other", **kwargs):
+    """
+    Sends a request to a backend through its pooled session, recording its status and wall time
+    under the given operation name, as clients.request does.
+
+    Raises circuit.BackendUnavailableError without sending anything while the backend's circuit is open.
+    """
+
+    with tracing.span("http", backend=backend, operation=operation, method=method, url=url) as attributes:
+        probe = await run_blocking(circuit.before_request, backend)
+
+        start = time.perf_counter()
+        status = "error"
+
+        if isinstance(kwargs.get("data"), (str, bytes)):
+            attributes["request_bytes"] = len(kwargs["data"])
+
+        try:
+            response = await send(backend, method, url, **kwargs)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            await run_blocking(circuit.record_failure, backend, probe)
+            raise
+        finally:
+            metrics.record_request(backend, operation, method, status, time.perf_counter() - start)
+
+        if status in clients.RETRY_STATUS_CODES:
+            await run_blocking(circuit.record_failure, backend, probe)
+        elif probe:
+            await run_blocking(circuit.record_success, backend, probe)
+        else:
+            circuit.record_success(backend, probe)
+
+        if tracing.is_tracing():
+            attributes["status"] = status
+            attributes["response_bytes"] = len(response.content)
+
+    return response
+
+
+async def get(backend, url, **kwargs):
+    return await request(backend, "GET", url, **kwargs)
+
+
+async def put(backend, url, **kwargs):
+    return await request(backend, "PUT", url, **kwargs)
+
+
+async def post(backend, url, **kwargs):
+    return await request(backend, "POST", url, **kwargs)
+
+
+async def delete(backend, url, **kwargs):
+    return await request(backend, "DELETE", url, **kwargs)
@@ -0,0 +1,211 @@
+import asyncio
+from web_services_manager import async_clients
+from web_services_manager import async_utilities
+from web_services_manager import backends
+from web_services_manager import circuit
+from web_services_manager import classification
+from web_services_manager import fingerprints
+from web_services_manager import registration
+from web_services_manager import registry
+from web_services_manager import tracing
+from web_services_manager import utilities
+
+
+async def run_bounded(backend, coroutine):
+    """
+    Awaits a backend call under the backend's semaphore, as the threads engine's pools bound them.
+    """
+
+    async with async_clients.get_semaphore(backend.name):
+        return await coroutine
+
+
+async def fetch_inventories(res_id):
+    """
+    Fetches the GeoServer and HydroServer inventories of a resource at once.
+    """
+
+    return tuple(await asyncio.gather(*[
+        run_bounded(backend, backend.fetch_inventory(res_id)) for backend in backends.ASYNC_BACKENDS
+    ]))
+
+
+async def create_container(backend, res_id, backend_inventory):
+    try:
+        with tracing.span(backend.create_container_span):
+            await backend.create_container(res_id)
+    except circuit.UNAVAILABLE_ERRORS:
+        backend_inventory.available = False
+        return
+    backend.reset_inventory(backend_inventory)
+
+
+async def register_layer(backend, res_id, db, backend_inventory):
+    """
+    Registers a layer and removes it again if registration fails, as registration.register_layer does.
+    """
+
+    if not backend_inventory.available:
+        return backend.get_unavailable_info(db)
+
+    with tracing.span(f"register_{backend.name}_layer", **backend.get_span_attributes(db)) as attributes:
+        db_info = await async_clients.run_blocking(backend.check, db)
+
+        if db_info is not None:
+            attributes["success"] = False
+            return db_info
+
+        try:
+            db_info = await backend.register(res_id, db)
+        except circuit.UNAVAILABLE_ERRORS:
+            db_info = backend.get_unavailable_info(db)
+        else:
+            if db_info["success"] is False:
+                try:
+                    await backend.unregister(res_id, db)
+                except circuit.UNAVAILABLE_ERRORS:
+                    pass
+            else:
+                backend.add_layer(backend_inventory, db)
+
+        attributes["success"] = db_info["success"]
+
+    return db_info
+
+
+async def unregister_layer(backend, res_id, db, backend_inventory):
+    """
+    Removes a layer. Returns False if it may still exist.
+    """
+
+    with tracing.span(f"unregister_{backend.name}_layer", **backend.get_span_attributes(db)):
+        try:
+            removed = registration.is_removed(await backend.unregister(res_id, db))
+        except circuit.UNAVAILABLE_ERRORS:
+            return False
+
+    if removed:
+        backend.remove_layer(backend_inventory, db)
+
+    return removed
+
+
+async def remove_resource_services(backend, res_id):
+    """
+    Removes a resource's whole workspace or network from a backend. Returns False if the backend
+    is unavailable.
+    """
+
+    try:
+        await backend.remove_all(res_id)
+    except circuit.UNAVAILABLE_ERRORS:
+        return False
+
+    return True
+
+
+async def run_registration(res_id, db_list, inventories, progress=None):
+    """
+    Follows the plan of registration.run_registration on the event loop.
+
+    Calls to each backend are bounded by its semaphore instead of a thread pool. Registry and raster
+    statistics cache queries and progress calls run in the event loop's thread pool.
+    """
+
+    container_plan = registration.get_container_plan(db_list, backends.ASYNC_BACKENDS, inventories)
+
+    await asyncio.gather(*[
+        run_bounded(backend, create_container(backend, res_id, backend_inventory))
+        for backend, backend_inventory in container_plan
+    ])
+
+    await async_clients.run_blocking(registration.clear_created_containers, res_id, container_plan)
+
+    unregister_plan = registration.get_layer_plan(db_list, backends.ASYNC_BACKENDS, inventories, "unregister")
+
+    removed = await asyncio.gather(*[
+        run_bounded(backend, unregister_layer(backend, res_id, db, backend_inventory))
+        for backend, db, backend_inventory in unregister_plan
+    ])
+
+    await async_clients.run_blocking(registration.remove_layers, res_id, unregister_plan, removed)
+    await async_clients.run_blocking(registration.load_raster_stats, db_list)
+
+    register_plan = registration.get_layer_plan(db_list, backends.ASYNC_BACKENDS, inventories, "register")
+
+    register_tasks = [
+        asyncio.ensure_future(run_bounded(backend, register_layer(backend, res_id, db, backend_inventory)))
+        for backend, db, backend_inventory in register_plan
+    ]
+
+    if progress is not None:
+        await async_clients.run_blocking(progress, 0, len(register_tasks))
+        for completed, task in enumerate(asyncio.as_completed(register_tasks), start=1):
+            await task
+            await async_clients.run_blocking(progress, completed, len(register_tasks))
+
+    results = await asyncio.gather(*register_tasks)
+
+    return await async_clients.run_blocking(registration.record_registration, res_id, db_list, register_plan, results)
+
+
+async def publish_resource_services_async(res_id, progress, force):
+    """
+    Runs pipeline.publish_resource_services on the event loop and returns (outcome, response,
+    registered services).
+    """
+
+    file_list = await async_utilities.get_file_list(res_id)
+
+    if file_list is None:
+
+        await async_clients.run_blocking(fingerprints.clear_response, res_id)
+
+        unavailable = []
+        for backend in backends.ASYNC_BACKENDS:
+            if await remove_resource_services(backend, res_id):
+                await async_clients.run_blocking(registry.clear_backend, res_id, backend.name)
+            else:
+                unavailable.append(backend.name)
+
+        return "unpublished", registration.finish_unpublish(unavailable), None
+
+    with tracing.span("file_list") as attributes:
+        fingerprint = utilities.FileListFingerprint()
+        layers = []
+        async for page in file_list:
+            layers.extend(classification.classify_files(fingerprint.track(page)))
+        attributes["files"] = fingerprint.count
+        attributes["layers"] = len(layers)
+
+    if not force:
+        response = await async_clients.run_blocking(registration.get_cached_response, res_id, fingerprint)
+        if response is not None:
+            return "cached", response, None
+
+    with tracing.span("fetch_inventories"):
+        inventories = await fetch_inventories(res_id)
+
+    db_list_response = await async_clients.run_blocking(registration.reconcile, res_id, layers, inventories)
+
+    with tracing.span("registration"):
+        registered_services = await run_registration(res_id, db_list_response, inventories, progress=progress)
+
+    for backend in registration.get_empty_backends(backends.ASYNC_BACKENDS, inventories):
+        if await remove_resource_services(backend, res_id):
+            await async_clients.run_blocking(registry.clear_backend, res_id, backend.name)
+
+    outcome, response = await async_clients.run_blocking(
+        registration.finish_update, res_id, fingerprint, registered_services, inventories
+    )
+
+    return outcome, response, registered_services
+
+
+def publish_resource_services(res_id, progress, force):
+    """
+    Runs publish_resource_services_async on the event loop shared by this process, so backend calls of
+    updates running in different threads overlap, and waits for its result.
+    """
+
+    return async_clients.run(publish_resource_services_async(res_id, progress, force))
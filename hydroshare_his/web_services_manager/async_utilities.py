@@ -0,0 +1,396 @@
+import asyncio
+import json
+import requests
+import weakref
+from hydroshare_his import settings
+from web_services_manager import async_clients
+from web_services_manager import circuit
+from web_services_manager import styles
+from web_services_manager import tiff
+from web_services_manager import tracing
+from web_services_manager import utilities
+
+
+_style_locks = weakref.WeakValueDictionary()
+
+
+async def get_file_list(res_id):
+    """
+    Gets an async iterator over the pages of a resource's HydroShare file list, or None if the
+    resource is not publicly accessible.
+
+    Each page is a list of file list entries. Pages are fetched one at a time, following pagination
+    links, as the iterator is consumed.
+    """
+
+    hydroshare_url = settings.HIS.get("hydroshare_url")
+    rest_url = f"{hydroshare_url}/resource/{res_id}/file_list/"
+    response = await async_clients.get("hydroshare", rest_url, operation="list")
+
+    if response.status_code != 200:
+        return None
+
+    return iter_file_list_pages(response)
+
+
+async def iter_file_list_pages(response):
+    """
+    Yields the results of a first page response and of every page linked after it, as
+    utilities.iter_file_list_pages does.
+    """
+
+    while True:
+        page = json.loads(response.content.decode('utf-8'))
+        next_url = page.get("next")
+        response = None
+
+        yield page["results"]
+
+        page = None
+
+        if not next_url:
+            return
+
+        try:
+            response = await async_clients.get("hydroshare", next_url, operation="list")
+        except requests.exceptions.RequestException:
+            raise circuit.BackendUnavailableError("hydroshare")
+
+        if response.status_code != 200:
+            raise circuit.BackendUnavailableError("hydroshare")
+
+
+async def fetch_geoserver_inventory(geoserver_inventory):
+    """
+    Lists a GeoServer inventory's workspace, as GeoServerInventory.fetch does, with the listings sent at once.
+    """
+
+    if settings.HIS.get("geoserver_url") is None:
+        return geoserver_inventory
+
+    headers = {
+        "content-type": "application/json"
+    }
+
+    try:
+        responses = await asyncio.gather(*[
+            async_clients.get("geoserver", rest_url, headers=headers, operation="list")
+            for rest_url in geoserver_inventory.get_listing_urls()
+        ])
+    except circuit.UNAVAILABLE_ERRORS:
+        geoserver_inventory.available = False
+        return geoserver_inventory
+
+    return geoserver_inventory.load(*responses)
+
+
+async def fetch_hydroserver_inventory(hydroserver_inventory):
+    """
+    Lists a HydroServer inventory's network, as HydroServerInventory.fetch does.
+    """
+
+    if settings.HIS.get("hydroserver_url") is None:
+        return hydroserver_inventory
+
+    try:
+        response = await async_clients.get("hydroserver", hydroserver_inventory.get_listing_url(), operation="list")
+    except circuit.UNAVAILABLE_ERRORS:
+        hydroserver_inventory.available = False
+        return hydroserver_inventory
+
+    return hydroserver_inventory.load(response)
+
+
+async def register_geoserver_workspace(res_id):
+    """
+    Add GeoServer workspace.
+    """
+
+    geoserver_namespace = settings.HIS.get("geoserver_ns")
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    workspace_id = f"{geoserver_namespace}-{res_id}"
+
+    headers = {
+        "content-type": "application/json"
+    }
+
+    data = json.dumps({"workspace": {"name": workspace_id}})
+    rest_url = f"{geoserver_url}/workspaces"
+    await async_clients.post("geoserver", rest_url, headers=headers, data=data, operation="create_workspace")
+
+    return workspace_id
+
+
+async def register_hydroserver_network(res_id):
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
+
+    rest_url = f"{hydroserver_url}/manage/networks/"
+
+    data = {
+        "network_id": res_id
+    }
+
+    return await async_clients.post("hydroserver", rest_url, data=data, operation="create_network")
+
+
+async def unregister_geoserver_databases(res_id):
+    """
+    Removes a GeoServer network and associated databases.
+    """
+
+    geoserver_namespace = settings.HIS.get("geoserver_ns")
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    if geoserver_url is None:
+        return None
+
+    headers = {
+        "content-type": "application/json"
+    }
+
+    params = {
+        "update": "overwrite", "recurse": True
+    }
+
+    rest_url = f"{geoserver_url}/workspaces/{geoserver_namespace}-{res_id}"
+
+    return await async_clients.delete("geoserver", rest_url, params=params, headers=headers, operation="delete")
+
+
+async def unregister_hydroserver_databases(res_id):
+    """
+    Removes a HydroServer network and associated databases.
+    """
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
+
+    if hydroserver_url is None:
+        return None
+
+    rest_url = f"{hydroserver_url}/manage/network/{res_id}/"
+
+    return await async_clients.delete("hydroserver", rest_url, operation="delete")
+
+
+async def get_raster_statistics(db):
+    """
+    Reads (maximum, minimum, nodata) from a raster layer's VRT file on HydroShare.
+    Returns None if the VRT file does not define them.
+    """
+
+    response = await async_clients.get("hydroshare", utilities.get_vrt_url(db), operation="read_vrt")
+    if response.status_code != 200:
+        return None
+
+    return utilities.parse_raster_statistics(response.content)
+
+
+def get_style_lock(key):
+    """
+    Gets the event loop lock that serializes uploads of a style, as styles.get_style_lock does.
+    """
+
+    lock = _style_locks.get(key)
+
+    if lock is None:
+        lock = _style_locks[key] = asyncio.Lock()
+
+    return lock
+
+
+async def style_exists(style_workspace, name):
+    response = await async_clients.get("geoserver", f"{styles.get_styles_url(style_workspace)}/{name}.json", operation="style")
+
+    return response.status_code == 200
+
+
+async def ensure_style(style_workspace, name, body):
+    """
+    Uploads a style unless GeoServer already has one with this name. Returns True if the style exists.
+
+    Shares the known styles of styles.ensure_style, so neither engine uploads a style the other has.
+    """
+
+    if styles.is_known_style(style_workspace, name):
+        return True
+
+    async with get_style_lock((style_workspace, name)):
+        if styles.is_known_style(style_workspace, name):
+            return True
+
+        exists = await style_exists(style_workspace, name)
+
+        if not exists:
+            headers = {"content-type": "application/vnd.ogc.sld+xml"}
+            response = await async_clients.post("geoserver", styles.get_styles_url(style_workspace), params={"name": name}, data=body, headers=headers, operation="style")
+            exists = response.status_code == 201 or await style_exists(style_workspace, name)
+
+        if exists:
+            styles.add_known_style(style_workspace, name)
+
+    return exists
+
+
+async def set_default_style(workspace_id, layer_name, style_workspace, name):
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    rest_url = f"{geoserver_url}/layers/{workspace_id}:{layer_name}"
+    headers = {"content-type": "application/json"}
+    default_style = {"name": name}
+
+    if style_workspace is not None:
+        default_style["workspace"] = style_workspace
+
+    response = await async_clients.put("geoserver", rest_url, data=json.dumps({"layer": {"defaultStyle": default_style}}), headers=headers, operation="style")
+
+    return response.status_code == 200
+
+
+async def apply_raster_style(workspace_id, layer_name, max_value, min_value, ndv_value):
+    """
+    Sets a raster layer's default style, reusing a stored style with the same statistics if there is one.
+
+    Returns False if the style could not be stored or assigned.
+    """
+
+    style_workspace = styles.get_style_workspace(workspace_id)
+    name = styles.get_raster_style_name(max_value, min_value, ndv_value)
+    body = styles.render_raster_style(max_value, min_value, ndv_value, name)
+
+    with tracing.span("apply_raster_style", style=name, style_bytes=len(body)):
+        for _ in range(2):
+            if not await ensure_style(style_workspace, name, body):
+                return False
+            if await set_default_style(workspace_id, layer_name, style_workspace, name):
+                return True
+            styles.forget_style(style_workspace, name)
+
+    return False
+
+
+async def register_geoserver_db(res_id, db):
+    """
+    Attempts to register a GeoServer layer, as utilities.register_geoserver_db does.
+
+    Local GeoTIFF statistics are computed in the event loop's thread pool.
+    """
+
+    geoserver_namespace = settings.HIS.get("geoserver_ns")
+    geoserver_url = settings.HIS.get("geoserver_url")
+    geoserver_directory = settings.HIS.get("geoserver_data_dir")
+
+    workspace_id = f"{geoserver_namespace}-{res_id}"
+
+    headers = {
+        "content-type": "application/json"
+    }
+
+    if any(i in db['layer_name'] for i in [".", ","]):
+        return utilities.get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
+
+    layer_name = db["layer_name"].replace("/", " ")
+    store_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{layer_name}"
+
+    rest_url = f"{store_url}/external.{db['file_type']}"
+    data = f"file://{geoserver_directory}/{db['hs_path']}"
+    response = await async_clients.put("geoserver", rest_url, params={"configure": "none"}, data=data, headers=headers, operation="create_store")
+
+    if response.status_code != 201:
+        return utilities.get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
+
+    rest_url = f"{store_url}/{db['layer_group']}"
+    response = await async_clients.post("geoserver", rest_url, data=utilities.get_layer_definition(db, layer_name), headers=headers, operation="create_layer")
+
+    if response.status_code != 201:
+        return utilities.get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
+
+    if db.get("local_bbox") is not None:
+        bbox = db["local_bbox"]
+    else:
+        rest_url = f"{store_url}/{db['layer_group']}/{layer_name}.json"
+        response = await async_clients.get("geoserver", rest_url, headers=headers, operation="verify")
+        bbox = utilities.parse_layer_bbox(response, db)
+
+    if bbox is None:
+        return utilities.get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
+
+    if db["layer_type"] == "GeographicRaster":
+        try:
+            if db.get("raster_stats") is None:
+                try:
+                    with tracing.span("vrt_statistics"):
+                        db["raster_stats"] = await get_raster_statistics(db)
+                except:
+                    db["raster_stats"] = None
+
+            if db["raster_stats"] is None:
+                with tracing.span("tiff_statistics", hs_path=db["hs_path"]):
+                    db["raster_stats"] = await async_clients.run_blocking(tiff.get_local_statistics, db)
+
+            if db["raster_stats"] is None:
+                return utilities.get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+
+            layer_max, layer_min, layer_ndv = db["raster_stats"]
+
+            if not await apply_raster_style(workspace_id, layer_name, layer_max, layer_min, layer_ndv):
+                return utilities.get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+        except circuit.BackendUnavailableError:
+            raise
+        except:
+            return utilities.get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+
+    db["bbox"] = bbox
+
+    return utilities.get_geoserver_layer_info(db, utilities.get_wms_preview_url(workspace_id, layer_name, bbox), success=True)
+
+
+async def unregister_geoserver_db(res_id, db):
+    """
+    Removes a GeoServer layer
+    """
+
+    geoserver_namespace = settings.HIS.get("geoserver_ns")
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    if geoserver_url is None:
+        return None
+
+    headers = {
+        "content-type": "application/json"
+    }
+
+    params = {
+        "update": "overwrite", "recurse": True
+    }
+
+    rest_url = f"{geoserver_url}/workspaces/{geoserver_namespace}-{res_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}"
+
+    return await async_clients.delete("geoserver", rest_url, params=params, headers=headers, operation="delete")
+
+
+async def register_hydroserver_db(res_id, db):
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
+
+    rest_url = f"{hydroserver_url}/manage/network/{res_id}/databases/"
+
+    response = await async_clients.post("hydroserver", rest_url, data=utilities.get_database_definition(res_id, db), operation="create_database")
+
+    return utilities.get_hydroserver_database_info(res_id, db, response)
+
+
+async def unregister_hydroserver_db(res_id, db):
+    """
+    Removes a HydroServer database.
+    """
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
+
+    if hydroserver_url is None:
+        return None
+
+    rest_url = f"{hydroserver_url}/manage/network/{res_id}/database/{db['database_name']}/"
+
+    return await async_clients.delete("hydroserver", rest_url, operation="delete")
@@ -0,0 +1,162 @@
+from web_services_manager import async_utilities
+from web_services_manager import circuit
+from web_services_manager import inventory
+from web_services_manager import preflight
+from web_services_manager import registry
+from web_services_manager import styles
+from web_services_manager import utilities
+
+
+class GeoServerBackend:
+    """
+    GeoServer calls made by the threads update engine, and the bookkeeping both engines share.
+    """
+
+    name = "geoserver"
+    create_container_key = "create_workspace"
+    create_container_span = "create_geoserver_workspace"
+
+    def create_container(self, res_id):
+        return utilities.register_geoserver_workspace(res_id)
+
+    def register(self, res_id, db):
+        return utilities.register_geoserver_db(res_id, db)
+
+    def unregister(self, res_id, db):
+        return utilities.unregister_geoserver_db(res_id, db)
+
+    def remove_all(self, res_id):
+        return utilities.unregister_geoserver_databases(res_id)
+
+    def fetch_inventory(self, res_id):
+        return inventory.GeoServerInventory(res_id).fetch()
+
+    def check(self, db):
+        return preflight.check_geoserver_layer(db)
+
+    def get_span_attributes(self, db):
+        return {"layer_name": db["layer_name"], "layer_type": db["layer_type"]}
+
+    def get_layer_name(self, db):
+        return db["layer_name"].replace("/", " ")
+
+    def get_unavailable_info(self, db):
+        message = f"Error: {circuit.BACKEND_NAMES[self.name]} is unavailable."
+
+        return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": message}
+
+    def reset_inventory(self, geoserver_inventory):
+        geoserver_inventory.reset(workspace_exists=True)
+        styles.forget_workspace_styles(geoserver_inventory.workspace_id)
+
+    def add_layer(self, geoserver_inventory, db):
+        geoserver_inventory.add_layer(db)
+
+    def remove_layer(self, geoserver_inventory, db):
+        geoserver_inventory.remove_layer(db)
+
+    def is_empty(self, geoserver_inventory):
+        return geoserver_inventory.workspace_exists and not geoserver_inventory.get_layer_list()
+
+    def record_layer(self, res_id, db, db_info):
+        registry.record_geoserver_layer(res_id, db, db["bbox"], db_info["message"])
+
+
+class HydroServerBackend:
+    """
+    HydroServer calls made by the threads update engine, and the bookkeeping both engines share.
+    """
+
+    name = "hydroserver"
+    create_container_key = "create_network"
+    create_container_span = "create_hydroserver_network"
+
+    def create_container(self, res_id):
+        return utilities.register_hydroserver_network(res_id)
+
+    def register(self, res_id, db):
+        return utilities.register_hydroserver_db(res_id, db)
+
+    def unregister(self, res_id, db):
+        return utilities.unregister_hydroserver_db(res_id, db)
+
+    def remove_all(self, res_id):
+        return utilities.unregister_hydroserver_databases(res_id)
+
+    def fetch_inventory(self, res_id):
+        return inventory.HydroServerInventory(res_id).fetch()
+
+    def check(self, db):
+        return preflight.check_hydroserver_database(db)
+
+    def get_span_attributes(self, db):
+        return {"database_name": db["database_name"]}
+
+    def get_layer_name(self, db):
+        return db["database_name"]
+
+    def get_unavailable_info(self, db):
+        message = f"Error: {circuit.BACKEND_NAMES[self.name]} is unavailable."
+
+        return {"success": False, "type": "Timeseries", "message": message}
+
+    def reset_inventory(self, hydroserver_inventory):
+        hydroserver_inventory.reset(network_exists=True)
+
+    def add_layer(self, hydroserver_inventory, db):
+        hydroserver_inventory.add_database(db)
+
+    def remove_layer(self, hydroserver_inventory, db):
+        hydroserver_inventory.remove_database(db)
+
+    def is_empty(self, hydroserver_inventory):
+        return hydroserver_inventory.network_exists and not hydroserver_inventory.get_database_list()
+
+    def record_layer(self, res_id, db, db_info):
+        registry.record_hydroserver_database(res_id, db, db_info["message"])
+
+
+class AsyncGeoServerBackend(GeoServerBackend):
+    """
+    GeoServer calls made by the asyncio update engine.
+    """
+
+    async def create_container(self, res_id):
+        return await async_utilities.register_geoserver_workspace(res_id)
+
+    async def register(self, res_id, db):
+        return await async_utilities.register_geoserver_db(res_id, db)
+
+    async def unregister(self, res_id, db):
+        return await async_utilities.unregister_geoserver_db(res_id, db)
+
+    async def remove_all(self, res_id):
+        return await async_utilities.unregister_geoserver_databases(res_id)
+
+    async def fetch_inventory(self, res_id):
+        return await async_utilities.fetch_geoserver_inventory(inventory.GeoServerInventory(res_id))
+
+
+class AsyncHydroServerBackend(HydroServerBackend):
+    """
+    HydroServer calls made by the asyncio update engine.
+    """
+
+    async def create_container(self, res_id):
+        return await async_utilities.register_hydroserver_network(res_id)
+
+    async def register(self, res_id, db):
+        return await async_utilities.register_hydroserver_db(res_id, db)
+
+    async def unregister(self, res_id, db):
+        return await async_utilities.unregister_hydroserver_db(res_id, db)
+
+    async def remove_all(self, res_id):
+        return await async_utilities.unregister_hydroserver_databases(res_id)
+
+    async def fetch_inventory(self, res_id):
+        return await async_utilities.fetch_hydroserver_inventory(inventory.HydroServerInventory(res_id))
+
+
+BACKENDS = (GeoServerBackend(), HydroServerBackend())
+ASYNC_BACKENDS = (AsyncGeoServerBackend(), AsyncHydroServerBackend())
@@ -0,0 +1,419 @@
+import json
+import random
+import re
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hydroshare_his import settings
+from web_services_manager import clients
+from web_services_manager import async_clients
+
+
+VRT_TEMPLATE = """<VRTDataset rasterXSize="10" rasterYSize="10">
+  <VRTRasterBand dataType="Float32" band="1">
+    <Metadata>
+      <MDI key="STATISTICS_MAXIMUM">{maximum}</MDI>
+      <MDI key="STATISTICS_MINIMUM">{minimum}</MDI>
+    </Metadata>
+    <NoDataValue>-9999</NoDataValue>
+  </VRTRasterBand>
+</VRTDataset>"""
+
+BOUNDING_BOX = {"minx": -111.9, "miny": 41.7, "maxx": -111.8, "maxy": 41.8, "crs": "EPSG:4326"}
+
+
+class FakeBackend:
+    """
+    In-memory stand-in for the REST API of one backend, with configurable latency and failure rate.
+
+    Subclasses implement route(method, path, query, body) and return (status, body).
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.server = None
+
+    def handle(self, method, raw_path, body):
+        url = urllib.parse.urlparse(raw_path)
+        path = urllib.parse.unquote(url.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests[method] += 1
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                return 503, ""
+            return self.route(method, path, query, body)
+
+    def route(self, method, path, query, body):
+        raise NotImplementedError
+
+    def start(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8") if length else ""
+                status, content = backend.handle(self.command, self.path, body)
+                if not isinstance(content, str):
+                    content = json.dumps(content, separators=(",", ":"))
+                content = content.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_PUT = do_POST = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # The asyncio engine opens many connections at once; the default backlog of 5 drops them.
+            request_queue_size = 128
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def take_request_count(self):
+        with self.lock:
+            count = sum(self.requests.values())
+            self.requests.clear()
+        return count
+
+
+class FakeGeoServer(FakeBackend):
+    """
+    Implements the GeoServer REST endpoints used to publish workspaces, stores, layers, and styles.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.workspaces = {}
+        self.styles = set()
+
+    def route(self, method, path, query, body):
+        path = path[len("/geoserver/rest"):]
+
+        if path == "/workspaces" and method == "POST":
+            name = json.loads(body)["workspace"]["name"]
+            self.workspaces.setdefault(name, {"stores": {}, "layers": {}, "styles": set()})
+            return 201, ""
+
+        match = re.match(r"^(?:/workspaces/([^/]+))?/styles(?:/([^/]+)\.json)?$", path)
+        if match:
+            workspace_id, name = match.groups()
+            styles = self.styles if workspace_id is None else self.workspaces.get(workspace_id, {}).get("styles")
+            if styles is None:
+                return 404, ""
+            if method == "POST":
+                styles.add(query.get("name") or re.search(r"<UserStyle>\s*<Name>([^<]+)</Name>", body).group(1))
+                return 201, ""
+            return (200, {"style": {"name": name}}) if name in styles else (404, "")
+
+        match = re.match(r"^/layers/([^:]+):(.+)$", path)
+        if match:
+            workspace = self.workspaces.get(match.group(1))
+            return (200, "") if workspace and match.group(2) in workspace["layers"] else (404, "")
+
+        match = re.match(r"^/workspaces/([^/]+)(.*)$", path)
+        if not match:
+            return 404, ""
+
+        workspace_id, rest = match.groups()
+        workspace = self.workspaces.get(workspace_id)
+
+        if rest in ("", ".json"):
+            if method == "DELETE":
+                return (200, "") if self.workspaces.pop(workspace_id, None) is not None else (404, "")
+            return (200, {"workspace": {"name": workspace_id}}) if workspace else (404, "")
+
+        if workspace is None:
+            return 404, ""
+
+        listings = {
+            "/datastores.json": ("dataStores", "dataStore", "datastores", "stores"),
+            "/coveragestores.json": ("coverageStores", "coverageStore", "coveragestores", "stores"),
+            "/coverages.json": ("coverages", "coverage", "coveragestores", "layers"),
+            "/featuretypes.json": ("featureTypes", "featureType", "datastores", "layers"),
+        }
+        if rest in listings:
+            collection, item, store_type, source = listings[rest]
+            if source == "stores":
+                names = [name for name, kind in workspace["stores"].items() if kind == store_type]
+            else:
+                names = [name for name, layer in workspace["layers"].items() if layer[0] == store_type]
+            return 200, {collection: {item: [{"name": name} for name in names]} if names else ""}
+
+        match = re.match(r"^/(datastores|coveragestores)/([^/]+)(.*)$", rest)
+        if not match:
+            return 404, ""
+
+        store_type, store, tail = match.groups()
+
+        if tail.startswith("/external.") and method == "PUT":
+            workspace["stores"][store] = store_type
+            native_name = body.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            if query.get("configure") != "none":
+                workspace["layers"][native_name] = (store_type, store)
+            return 201, ""
+
+        if tail == "" and method == "DELETE":
+            if workspace["stores"].pop(store, None) is None:
+                return 404, ""
+            for name in [name for name, layer in workspace["layers"].items() if layer[1] == store]:
+                del workspace["layers"][name]
+            return 200, ""
+
+        match = re.match(r"^/(coverages|featuretypes)(?:/([^/]+)\.json)?$", tail)
+        if not match:
+            return 404, ""
+
+        layer_group, layer_name = match.groups()
+        verification = "coverage" if layer_group == "coverages" else "featureType"
+
+        if method == "POST":
+            workspace["layers"][json.loads(body)[verification]["name"]] = (store_type, store)
+            return 201, ""
+        if layer_name not in workspace["layers"]:
+            return 404, ""
+        if method == "GET":
+            return 200, {verification: {"name": layer_name, "enabled": True, "nativeBoundingBox": BOUNDING_BOX}}
+        if method == "PUT":
+            workspace["layers"][json.loads(body)[verification]["name"]] = workspace["layers"].pop(layer_name)
+            return 200, ""
+
+        return 404, ""
+
+
+class FakeHydroServer(FakeBackend):
+    """
+    Implements the HydroServer network and database management endpoints.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.networks = {}
+
+    def route(self, method, path, query, body):
+        path = path[len("/wds"):]
+        form = dict(urllib.parse.parse_qsl(body))
+
+        if path == "/manage/networks/" and method == "POST":
+            self.networks.setdefault(form["network_id"], set())
+            return 201, ""
+
+        match = re.match(r"^/manage/network/([^/]+)/$", path)
+        if match and method == "DELETE":
+            return (200, "") if self.networks.pop(match.group(1), None) is not None else (404, "")
+
+        match = re.match(r"^/manage/network/([^/]+)/databases/$", path)
+        if match:
+            network = self.networks.get(match.group(1))
+            if network is None:
+                return 404, ""
+            if method == "POST":
+                network.add(form["database_id"])
+                return 201, ""
+            return 200, [{"database_id": database} for database in sorted(network)]
+
+        match = re.match(r"^/manage/network/([^/]+)/database/([^/]+)/$", path)
+        if match and method == "DELETE":
+            network = self.networks.get(match.group(1), set())
+            if match.group(2) not in network:
+                return 404, ""
+            network.discard(match.group(2))
+            return 200, ""
+
+        return 404, ""
+
+
+class FakeHydroShare(FakeBackend):
+    """
+    Serves paginated resource file lists and raster VRT files.
+    """
+
+    def __init__(self, page_size=100, **kwargs):
+        super().__init__(**kwargs)
+        self.page_size = page_size
+        self.resources = {}
+        self.base_url = None
+
+    def start(self):
+        self.base_url = super().start()
+        return self.base_url
+
+    def add_resource(self, res_id, layer_count):
+        """
+        Adds a resource with layer_count publishable files: rasters, shapefiles, and time series in a 3:1:1 mix.
+        """
+
+        files = []
+        contents = f"{self.base_url}/resource/{res_id}/data/contents"
+
+        for i in range(layer_count):
+            folder = f"layer_{i}"
+            kind = i % 5
+            if kind < 3:
+                entries = [
+                    (f"{folder}/{folder}.tif", "image/tiff", "GeoRasterLogicalFile"),
+                    (f"{folder}/{folder}.vrt", "application/xml", "GeoRasterLogicalFile")
+                ]
+            elif kind == 3:
+                entries = [
+                    (f"{folder}/{folder}.{extension}", content_type, "GeoFeatureLogicalFile")
+                    for extension, content_type in (("shp", "application/x-qgis"), ("shx", "application/x-qgis"), ("dbf", "application/x-dbf"))
+                ]
+            else:
+                entries = [(f"{folder}/{folder}.sqlite", "application/x-sqlite3", "TimeSeriesLogicalFile")]
+            for path, content_type, logical_file_type in entries:
+                files.append({
+                    "url": f"{contents}/{path}",
+                    "content_type": content_type,
+                    "logical_file_type": logical_file_type,
+                    "size": 1024,
+                    "checksum": f"{res_id}-{path}",
+                    "modified_time": "2020-01-01T00:00:00Z"
+                })
+
+        with self.lock:
+            self.resources[res_id] = files
+
+    def route(self, method, path, query, body):
+        match = re.match(r"^/hsapi/resource/([^/]+)/file_list/$", path)
+        if match:
+            files = self.resources.get(match.group(1))
+            if files is None:
+                return 404, ""
+            page = int(query.get("page", 1))
+            start = (page - 1) * self.page_size
+            next_url = None
+            if start + self.page_size < len(files):
+                next_url = f"{self.base_url}/hsapi/resource/{match.group(1)}/file_list/?page={page + 1}"
+            return 200, {"count": len(files), "next": next_url, "results": files[start:start + self.page_size]}
+
+        if path.endswith(".vrt"):
+            return 200, VRT_TEMPLATE.format(maximum=100 + len(path) % 7, minimum=len(path) % 3)
+
+        return 404, ""
+
+
+def get_percentile(values, percentile):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_benchmark(post_update, sizes, repeat, latency=0.0, failure_rate=0.0, engine=None, write=print):
+    """
+    Starts fake backends, points the HIS settings at them, and times post_update(res_id) for new
+    resources of each size on the given update engine, or the configured one. Returns one result
+    dict per size.
+    """
+
+    backends = {
+        "hydroshare": FakeHydroShare(latency=latency, failure_rate=failure_rate),
+        "geoserver": FakeGeoServer(latency=latency, failure_rate=failure_rate, seed=1),
+        "hydroserver": FakeHydroServer(latency=latency, failure_rate=failure_rate, seed=2)
+    }
+    urls = {backend: fake.start() for backend, fake in backends.items()}
+    original_settings = dict(settings.HIS)
+
+    settings.HIS.update({
+        "hydroshare_url": f"{urls['hydroshare']}/hsapi",
+        "geoserver_url": f"{urls['geoserver']}/geoserver/rest",
+        "geoserver_ns": "HS",
+        "geoserver_data_dir": "/benchmark",
+        "hydroserver_url": f"{urls['hydroserver']}/wds",
+        "hydroserver_data_dir": "/benchmark",
+        "geoserver_user": None,
+        "hydroserver_user": None,
+        "hydroshare_user": None,
+        "metrics_dir": None,
+        "update_engine": engine or original_settings.get("update_engine", "threads")
+    })
+
+    clients.close_sessions()
+    async_clients.close_sessions()
+
+    results = []
+
+    try:
+        for size in sizes:
+            timings = []
+            failures = 0
+            counts = Counter()
+
+            for i in range(repeat + 1):
+                res_id = f"benchmark-{settings.HIS['update_engine']}-{size}-{i}"
+                backends["hydroshare"].add_resource(res_id, size)
+                for fake in backends.values():
+                    fake.take_request_count()
+
+                measure_memory = i == repeat
+                if measure_memory:
+                    tracemalloc.start()
+
+                start = time.perf_counter()
+                status, response = post_update(res_id)
+                elapsed = time.perf_counter() - start
+
+                if measure_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    continue
+
+                timings.append(elapsed)
+                failures += status >= 300 or not all(item["success"] for item in response.get("content", []))
+                for backend, fake in backends.items():
+                    counts[backend] += fake.take_request_count()
+
+            result = {
+                "engine": settings.HIS["update_engine"],
+                "layers": size,
+                "updates": repeat,
+                "failed": failures,
+                "p50": get_percentile(timings, 50),
+                "p90": get_percentile(timings, 90),
+                "p99": get_percentile(timings, 99),
+                "requests": {backend: counts[backend] / repeat for backend in backends},
+                "peak_memory": peak
+            }
+            results.append(result)
+            write(
+                f"{result['engine']}, {size} layers: p50 {result['p50'] * 1000:.1f} ms, p90 {result['p90'] * 1000:.1f} ms, "
+                f"p99 {result['p99'] * 1000:.1f} ms, failed {failures}/{repeat}, requests per update "
+                + ", ".join(f"{backend} {count:.0f}" for backend, count in result["requests"].items())
+                + f", peak memory {peak / 1e6:.1f} MB"
+            )
+    finally:
+        for fake in backends.values():
+            fake.stop()
+        clients.close_sessions()
+        async_clients.close_sessions()
+        settings.HIS.clear()
+        settings.HIS.update(original_settings)
+
+    return results
@@ -0,0 +1,147 @@
+import functools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.db import connection
+from hydroshare_his import settings
+from web_services_manager import pipeline
+from web_services_manager import coalesce
+from web_services_manager import admission
+
+
+# Matches the resource ids accepted by the single-resource routes in urls.py.
+RESOURCE_ID_PATTERN = re.compile(r"[\w\-]+")
+
+
+def parse_resource_ids(lines):
+    """
+    Reads resource ids from lines of text, skipping blank lines, comments, and repeated ids. Invalid
+    ids are passed on, so run_bounded reports each of them as a failed result.
+
+    Every distinct id read is kept to recognise repeats, so memory grows with the number of distinct
+    ids, a few hundred bytes each, even though the lines themselves are streamed.
+    """
+
+    seen = set()
+
+    for line in lines:
+        res_id = line.split("#", 1)[0].strip()
+        if res_id and res_id not in seen:
+            seen.add(res_id)
+            yield res_id
+
+
+def check_resource_id(res_id):
+    """
+    Gets a failed result for a resource id that is not safe to put in a backend URL, or None if it is.
+    """
+
+    if RESOURCE_ID_PATTERN.fullmatch(res_id):
+        return None
+
+    return {
+        "resource_id": res_id,
+        "success": False,
+        "message": "Error: Invalid resource id."
+    }
+
+
+def get_bulk_workers(requested=None):
+    """
+    Gets the worker pool size for a bulk update, capped by bulk_max_workers.
+    """
+
+    workers = requested or settings.HIS.get("bulk_workers", 4)
+
+    return max(1, min(workers, settings.HIS.get("bulk_max_workers", 16)))
+
+
+def update_resource(res_id, force):
+    """
+    Updates one resource of a bulk update and reports its outcome instead of raising. Bulk updates
+    are admitted after waiting interactive updates.
+    """
+
+    try:
+        response = coalesce.run_coalesced(
+            res_id,
+            functools.partial(admission.run_admitted, admission.BULK, pipeline.update_resource_services),
+            force=force
+        )
+    except (admission.AdmissionError, coalesce.CoalescedUpdateError) as e:
+        return {
+            "resource_id": res_id,
+            "success": False,
+            "message": str(e)
+        }
+    except Exception as e:
+        return {
+            "resource_id": res_id,
+            "success": False,
+            "message": f"Error: Unable to update web services ({type(e).__name__})."
+        }
+    finally:
+        connection.close()
+
+    return {
+        "resource_id": res_id,
+        "success": all(i["success"] for i in response.get("content", [])),
+        "response": response
+    }
+
+
+def run_bounded(function, resource_ids, workers, *args):
+    """
+    Calls function(res_id, *args) for many resources in a pool of workers threads and yields each
+    result as it finishes.
+
+    At most two resources per worker are queued at a time, so results are streamed out as ids are
+    read and only a bounded number of updates is in flight. Invalid ids are reported as failed results
+    without calling function.
+    """
+
+    resource_ids = iter(resource_ids)
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="his-bulk") as executor:
+        while True:
+            for res_id in resource_ids:
+                invalid = check_resource_id(res_id)
+                if invalid is not None:
+                    yield invalid
+                    continue
+                pending.add(executor.submit(function, res_id, *args))
+                if len(pending) >= workers * 2:
+                    break
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield future.result()
+
+
+def run_bulk_update(resource_ids, workers=None, force=False):
+    """
+    Updates many resources in a bounded worker pool and yields each result as it finishes.
+    """
+
+    yield from run_bounded(update_resource, resource_ids, get_bulk_workers(workers), force)
+
+
+def stream_bulk_update(resource_ids, workers=None, force=False):
+    """
+    Yields bulk update results as newline-delimited JSON, followed by a summary line.
+    """
+
+    total = 0
+    failed = 0
+
+    for result in run_bulk_update(resource_ids, workers=workers, force=force):
+        total += 1
+        failed += not result["success"]
+        yield json.dumps(result) + "\n"
+
+    yield json.dumps({"summary": {"total": total, "succeeded": total - failed, "failed": failed}}) + "\n"
@@ -0,0 +1,878 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import requests
+from django.db import DatabaseError, connection
+from lxml import etree
+from hydroshare_his import settings
+from web_services_manager import bulk
+from web_services_manager import circuit
+from web_services_manager import classification
+from web_services_manager import clients
+from web_services_manager import fingerprints
+from web_services_manager import preflight
+from web_services_manager import raster_stats
+from web_services_manager import registry
+from web_services_manager import shapefile
+from web_services_manager import styles
+from web_services_manager import tiff
+from web_services_manager import tracing
+from web_services_manager import utilities
+
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+
+class CatalogError(Exception):
+    """
+    Raised when a layer cannot be written to the GeoServer catalog directly, or a generated catalog
+    does not read back as it was written.
+    """
+
+
+# Built-in GeoServer styles used as the default style of each shapefile geometry type.
+GEOMETRY_STYLES = {
+    "Point": "point",
+    "MultiPoint": "point",
+    "PolyLine": "line",
+    "Polygon": "polygon",
+    "MultiPatch": "polygon",
+}
+
+# GeoTools sample dimension types by TIFF (sample format, bits per sample).
+SAMPLE_DIMENSION_TYPES = {
+    (1, 1): "UNSIGNED_1BIT",
+    (1, 8): "UNSIGNED_8BITS",
+    (2, 8): "SIGNED_8BITS",
+    (1, 16): "UNSIGNED_16BITS",
+    (2, 16): "SIGNED_16BITS",
+    (1, 32): "UNSIGNED_32BITS",
+    (2, 32): "SIGNED_32BITS",
+    (3, 32): "REAL_32BITS",
+    (3, 64): "REAL_64BITS",
+}
+
+# Points sampled along each edge of a bounding box when it is reprojected to WGS 84.
+EDGE_POINTS = 21
+
+
+def get_catalog_id(kind, *names):
+    """
+    Builds a catalog object id from its kind and names, so a rebuilt catalog keeps the same ids.
+    """
+
+    key = "\0".join(names)
+
+    return f"{kind}-his-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]}"
+
+
+def get_namespace_uri(workspace_id):
+    """
+    Gets the namespace URI GeoServer gives a workspace created through its REST API.
+    """
+
+    return f"http://{workspace_id}"
+
+
+def get_styles_dir(catalog_dir, style_workspace):
+    if style_workspace is None:
+        return os.path.join(catalog_dir, "styles")
+
+    return os.path.join(catalog_dir, "workspaces", style_workspace, "styles")
+
+
+def get_geometry_style(geometry_type):
+    """
+    Gets the built-in style of a shapefile shape type, ignoring Z and M variants.
+    """
+
+    return GEOMETRY_STYLES[geometry_type.rstrip("ZM")]
+
+
+def get_latlon_bbox(bbox, crs):
+    """
+    Reprojects a native bounding box to a WGS 84 (longitude, latitude) bounding box, sampling each
+    edge so curved edges are covered. Only EPSG:4326 boxes can be used without pyproj.
+    """
+
+    if crs == "EPSG:4326":
+        return tuple(bbox)
+
+    if pyproj is None:
+        raise CatalogError(f"{crs} cannot be reprojected without pyproj")
+
+    minx, miny, maxx, maxy = bbox
+    steps = [i / (EDGE_POINTS - 1) for i in range(EDGE_POINTS)]
+    xs = [minx + (maxx - minx) * i for i in steps] * 2 + [minx] * EDGE_POINTS + [maxx] * EDGE_POINTS
+    ys = [miny] * EDGE_POINTS + [maxy] * EDGE_POINTS + [miny + (maxy - miny) * i for i in steps] * 2
+
+    try:
+        transformer = pyproj.Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+        lons, lats = transformer.transform(xs, ys)
+    except pyproj.exceptions.ProjError:
+        raise CatalogError(f"{crs} cannot be reprojected")
+
+    points = [(lon, lat) for lon, lat in zip(lons, lats) if abs(lon) <= 180 and abs(lat) <= 90]
+
+    if not points:
+        raise CatalogError(f"bounding box cannot be reprojected from {crs}")
+
+    return (
+        min(i[0] for i in points),
+        min(i[1] for i in points),
+        max(i[0] for i in points),
+        max(i[1] for i in points)
+    )
+
+
+def describe_feature_layer(db):
+    """
+    Sets the native bounding box, CRS, and built-in default style of a feature layer from its shapefile.
+    """
+
+    try:
+        summary = shapefile.get_local_summary(db)
+    except shapefile.ShapefileError as e:
+        raise CatalogError(preflight.get_reason(e))
+
+    if summary is None:
+        raise CatalogError("file is not available locally")
+
+    if summary.crs is None:
+        raise CatalogError("CRS cannot be identified locally")
+
+    db["catalog_bbox"] = summary.bbox, summary.crs
+    db["catalog_style"] = None, get_geometry_style(summary.geometry_type), None
+
+
+def describe_raster_layer(db):
+    """
+    Sets the native bounding box, CRS, grid, and band type of a raster layer from its GeoTIFF, and
+    its default style from its statistics.
+    """
+
+    try:
+        header = tiff.get_local_header(db)
+    except tiff.TiffError as e:
+        raise CatalogError(preflight.get_reason(e))
+
+    if header is None:
+        raise CatalogError("file is not available locally")
+
+    if header.crs is None:
+        raise CatalogError("georeferencing cannot be read locally")
+
+    dimension_type = SAMPLE_DIMENSION_TYPES.get((header.sample_format, header.bits_per_sample))
+
+    if dimension_type is None:
+        raise CatalogError("unsupported sample type")
+
+    if db.get("raster_stats") is None:
+        try:
+            with tracing.span("vrt_statistics"):
+                db["raster_stats"] = utilities.get_raster_statistics(db)
+        except (requests.RequestException, circuit.BackendUnavailableError):
+            db["raster_stats"] = None
+        except (etree.XMLSyntaxError, UnicodeDecodeError, ValueError, KeyError) as e:
+            raise CatalogError(f"unreadable VRT statistics ({type(e).__name__}: {e})")
+
+    if db["raster_stats"] is None:
+        with tracing.span("tiff_statistics", hs_path=db["hs_path"]):
+            db["raster_stats"] = tiff.get_local_statistics(db)
+
+    if db["raster_stats"] is None:
+        raise CatalogError("no raster statistics")
+
+    max_value, min_value, ndv_value = db["raster_stats"]
+    name = styles.get_raster_style_name(max_value, min_value, ndv_value)
+
+    db["catalog_bbox"] = header.bbox, header.crs
+    db["raster_grid"] = header.width, header.height, header.samples_per_pixel, dimension_type
+    db["catalog_style"] = (
+        styles.get_style_workspace(db["workspace_id"]),
+        name,
+        styles.render_raster_style(max_value, min_value, ndv_value, name)
+    )
+
+
+def describe_layer(db):
+    """
+    Reads everything the catalog files of a layer need from its files in geoserver_data_dir, and
+    returns the layer as read_workspace describes it. Raises CatalogError with the reason if the
+    layer has to be published through the REST API instead.
+    """
+
+    if any(i in db["layer_name"] for i in [".", ","]):
+        raise CatalogError("invalid layer name")
+
+    if db["layer_type"] == "GeographicFeature":
+        describe_feature_layer(db)
+    else:
+        describe_raster_layer(db)
+
+    bbox, crs = db["catalog_bbox"]
+    db["latlon_bbox"] = get_latlon_bbox(bbox, crs)
+
+    layer = {
+        "type": "VECTOR" if db["layer_type"] == "GeographicFeature" else "RASTER",
+        "store": db["layer_name"].replace("/", " "),
+        "store_type": db["store_type"],
+        "url": f"file://{settings.HIS.get('geoserver_data_dir')}/{db['hs_path']}",
+        "native_name": db["file_name"],
+        "srs": crs,
+        "bbox": tuple(float(i) for i in bbox),
+        "latlon_bbox": tuple(float(i) for i in db["latlon_bbox"]),
+        "style": db["catalog_style"][:2]
+    }
+
+    if "raster_grid" in db:
+        layer["grid"] = db["raster_grid"][:2]
+
+    return layer
+
+
+def add_element(parent, tag, text=None, **attributes):
+    element = etree.SubElement(parent, tag, **attributes)
+
+    if text is not None:
+        element.text = str(text)
+
+    return element
+
+
+def add_reference(parent, tag, catalog_id, **attributes):
+    return add_element(add_element(parent, tag, **attributes), "id", catalog_id).getparent()
+
+
+def add_bbox(parent, tag, bbox, crs):
+    element = add_element(parent, tag)
+
+    for key, value in zip(("minx", "maxx", "miny", "maxy"), (bbox[0], bbox[2], bbox[1], bbox[3])):
+        add_element(element, key, repr(float(value)))
+
+    add_element(element, "crs", crs)
+
+    return element
+
+
+def write_file(path, content):
+    """
+    Writes a catalog file through a temporary file, so GeoServer never reads a partial file.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.his-tmp"
+
+    with open(temporary_path, "wb") as catalog_file:
+        catalog_file.write(content)
+
+    os.replace(temporary_path, path)
+
+
+def write_xml(path, root):
+    write_file(path, etree.tostring(root, pretty_print=True, encoding="UTF-8"))
+
+
+def read_xml(path):
+    try:
+        return etree.parse(path).getroot()
+    except (OSError, etree.XMLSyntaxError) as e:
+        raise CatalogError(f"unreadable catalog file {path} ({e})")
+
+
+class CatalogWriter:
+    """
+    Writes workspaces, stores, layers, and styles into a GeoServer data directory, laid out and
+    named as GeoServer saves objects created through its REST API.
+
+    A staged workspace is written under .his-staging in the data directory, where GeoServer does
+    not look for workspaces, until commit_workspace moves it into place.
+    """
+
+    def __init__(self, catalog_dir):
+        self.catalog_dir = catalog_dir
+        self.staging_dir = os.path.join(catalog_dir, ".his-staging")
+        self.staged = {}
+        self.style_ids = {}
+        self.style_lock = threading.Lock()
+
+    def get_workspace_dir(self, workspace_id):
+        if workspace_id in self.staged:
+            return self.staged[workspace_id]
+
+        return os.path.join(self.catalog_dir, "workspaces", workspace_id)
+
+    def get_styles_dir(self, style_workspace):
+        if style_workspace is None:
+            return get_styles_dir(self.catalog_dir, None)
+
+        return os.path.join(self.get_workspace_dir(style_workspace), "styles")
+
+    def stage_workspace(self, workspace_id):
+        """
+        Starts writing a workspace into an empty staging directory and returns it.
+        """
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.forget_workspace(workspace_id)
+        self.staged[workspace_id] = tempfile.mkdtemp(prefix=f"{workspace_id}.", dir=self.staging_dir)
+
+        return self.staged[workspace_id]
+
+    def discard_workspace(self, workspace_id):
+        shutil.rmtree(self.staged.pop(workspace_id), ignore_errors=True)
+        self.forget_workspace(workspace_id)
+
+    def commit_workspace(self, workspace_id):
+        """
+        Moves a staged workspace into place, replacing the existing one. Returns True if one was replaced.
+        """
+
+        staged_dir = self.staged.pop(workspace_id)
+        workspace_dir = self.get_workspace_dir(workspace_id)
+        replaced = os.path.isdir(workspace_dir)
+
+        if replaced:
+            old_dir = f"{staged_dir}.old"
+            os.rename(workspace_dir, old_dir)
+            os.rename(staged_dir, workspace_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.makedirs(os.path.dirname(workspace_dir), exist_ok=True)
+            os.rename(staged_dir, workspace_dir)
+
+        return replaced
+
+    def forget_workspace(self, workspace_id):
+        """
+        Drops the style ids of a workspace that was removed.
+        """
+
+        with self.style_lock:
+            for key in [i for i in self.style_ids if i[0] == workspace_id]:
+                del self.style_ids[key]
+
+    def write_workspace(self, workspace_id):
+        workspace = etree.Element("workspace")
+        add_element(workspace, "id", get_catalog_id("WorkspaceInfoImpl", workspace_id))
+        add_element(workspace, "name", workspace_id)
+
+        namespace = etree.Element("namespace")
+        add_element(namespace, "id", get_catalog_id("NamespaceInfoImpl", workspace_id))
+        add_element(namespace, "prefix", workspace_id)
+        add_element(namespace, "uri", get_namespace_uri(workspace_id))
+
+        workspace_dir = self.get_workspace_dir(workspace_id)
+        write_xml(os.path.join(workspace_dir, "workspace.xml"), workspace)
+        write_xml(os.path.join(workspace_dir, "namespace.xml"), namespace)
+
+    def get_style_id(self, style_workspace, name, body=None):
+        """
+        Gets the id of a style, writing it first if body is given and the style does not exist.
+        Styles already in the catalog keep their id. Raises CatalogError if a built-in style is missing.
+        """
+
+        key = (style_workspace, name)
+
+        with self.style_lock:
+            if key in self.style_ids:
+                return self.style_ids[key]
+
+            styles_dir = self.get_styles_dir(style_workspace)
+            path = os.path.join(styles_dir, f"{name}.xml")
+
+            if os.path.isfile(path):
+                style_id = read_xml(path).findtext("id")
+            elif body is None:
+                raise CatalogError(f"style {name} is not in the catalog")
+            else:
+                style_id = get_catalog_id("StyleInfoImpl", style_workspace or "", name)
+                style = etree.Element("style")
+                add_element(style, "id", style_id)
+                add_element(style, "name", name)
+                if style_workspace is not None:
+                    add_reference(style, "workspace", get_catalog_id("WorkspaceInfoImpl", style_workspace))
+                add_element(style, "format", "sld")
+                add_element(add_element(style, "languageVersion"), "version", "1.0.0")
+                add_element(style, "filename", f"{name}.sld")
+                write_file(os.path.join(styles_dir, f"{name}.sld"), body.encode("ISO-8859-1"))
+                write_xml(path, style)
+
+            self.style_ids[key] = style_id
+
+        return style_id
+
+    def write_store(self, workspace_id, db, store_name, url):
+        workspace_ref = get_catalog_id("WorkspaceInfoImpl", workspace_id)
+
+        if db["store_type"] == "coveragestores":
+            store = etree.Element("coverageStore")
+            add_element(store, "id", get_catalog_id("CoverageStoreInfoImpl", workspace_id, store_name))
+            add_element(store, "name", store_name)
+            add_element(store, "type", "GeoTIFF")
+            add_element(store, "enabled", "true")
+            add_reference(store, "workspace", workspace_ref)
+            add_element(store, "__default", "false")
+            add_element(store, "url", url)
+            filename = "coveragestore.xml"
+        else:
+            store = etree.Element("dataStore")
+            add_element(store, "id", get_catalog_id("DataStoreInfoImpl", workspace_id, store_name))
+            add_element(store, "name", store_name)
+            add_element(store, "type", "Shapefile")
+            add_element(store, "enabled", "true")
+            add_reference(store, "workspace", workspace_ref)
+            parameters = add_element(store, "connectionParameters")
+            add_element(parameters, "entry", url, key="url")
+            add_element(parameters, "entry", get_namespace_uri(workspace_id), key="namespace")
+            add_element(store, "__default", "false")
+            filename = "datastore.xml"
+
+        write_xml(os.path.join(self.get_workspace_dir(workspace_id), store_name, filename), store)
+
+        return store.findtext("id")
+
+    def write_coverage(self, workspace_id, db, layer, store_id):
+        coverage = etree.Element("coverage")
+        add_element(coverage, "id", get_catalog_id("CoverageInfoImpl", workspace_id, layer["store"]))
+        add_element(coverage, "name", layer["store"])
+        add_element(coverage, "nativeName", layer["native_name"])
+        add_reference(coverage, "namespace", get_catalog_id("NamespaceInfoImpl", workspace_id))
+        add_element(coverage, "title", layer["store"])
+        add_element(coverage, "nativeCRS", layer["srs"])
+        add_element(coverage, "srs", layer["srs"])
+        add_bbox(coverage, "nativeBoundingBox", layer["bbox"], layer["srs"])
+        add_bbox(coverage, "latLonBoundingBox", layer["latlon_bbox"], "EPSG:4326")
+        add_element(coverage, "projectionPolicy", "REPROJECT_TO_DECLARED")
+        add_element(coverage, "enabled", "true")
+        add_reference(coverage, "store", store_id, **{"class": "coverageStore"})
+        add_element(coverage, "nativeFormat", "GeoTIFF")
+
+        width, height, bands, dimension_type = db["raster_grid"]
+        minx, miny, maxx, maxy = layer["bbox"]
+        grid = add_element(coverage, "grid", dimension="2")
+        grid_range = add_element(grid, "range")
+        add_element(grid_range, "low", "0 0")
+        add_element(grid_range, "high", f"{width} {height}")
+        transform = add_element(grid, "transform")
+        add_element(transform, "scaleX", repr((maxx - minx) / width))
+        add_element(transform, "scaleY", repr((miny - maxy) / height))
+        add_element(transform, "shearX", "0.0")
+        add_element(transform, "shearY", "0.0")
+        add_element(transform, "translateX", repr(minx))
+        add_element(transform, "translateY", repr(maxy))
+        add_element(grid, "crs", layer["srs"])
+
+        formats = add_element(coverage, "supportedFormats")
+        for name in ("GEOTIFF", "GIF", "PNG", "JPEG", "TIFF"):
+            add_element(formats, "string", name)
+
+        ndv_value = db["raster_stats"][2]
+        dimensions = add_element(coverage, "dimensions")
+        for band in range(bands):
+            dimension = add_element(dimensions, "coverageDimension")
+            add_element(dimension, "name", "GRAY_INDEX" if bands == 1 else f"Band{band + 1}")
+            add_element(dimension, "description", "GridSampleDimension[-Infinity,Infinity]")
+            value_range = add_element(dimension, "range")
+            add_element(value_range, "min", "-inf")
+            add_element(value_range, "max", "inf")
+            if ndv_value is not None:
+                add_element(add_element(dimension, "nullValues"), "double", repr(float(ndv_value)))
+            add_element(add_element(dimension, "dimensionType"), "name", dimension_type)
+
+        for tag in ("requestSRS", "responseSRS"):
+            add_element(add_element(coverage, tag), "string", layer["srs"])
+
+        add_element(coverage, "nativeCoverageName", layer["native_name"])
+
+        return coverage
+
+    def write_featuretype(self, workspace_id, db, layer, store_id):
+        featuretype = etree.Element("featureType")
+        add_element(featuretype, "id", get_catalog_id("FeatureTypeInfoImpl", workspace_id, layer["store"]))
+        add_element(featuretype, "name", layer["store"])
+        add_element(featuretype, "nativeName", layer["native_name"])
+        add_reference(featuretype, "namespace", get_catalog_id("NamespaceInfoImpl", workspace_id))
+        add_element(featuretype, "title", layer["store"])
+        add_element(featuretype, "srs", layer["srs"])
+        add_bbox(featuretype, "nativeBoundingBox", layer["bbox"], layer["srs"])
+        add_bbox(featuretype, "latLonBoundingBox", layer["latlon_bbox"], "EPSG:4326")
+        add_element(featuretype, "projectionPolicy", "FORCE_DECLARED")
+        add_element(featuretype, "enabled", "true")
+        add_reference(featuretype, "store", store_id, **{"class": "dataStore"})
+        add_element(featuretype, "maxFeatures", "0")
+        add_element(featuretype, "numDecimals", "0")
+
+        return featuretype
+
+    def write_layer(self, workspace_id, db, layer):
+        """
+        Writes a layer's store, coverage or feature type, layer, and default style.
+        """
+
+        style_workspace, style_name, style_body = db["catalog_style"]
+        style_id = self.get_style_id(style_workspace, style_name, style_body)
+        store_id = self.write_store(workspace_id, db, layer["store"], layer["url"])
+
+        if layer["type"] == "RASTER":
+            resource, filename = self.write_coverage(workspace_id, db, layer, store_id), "coverage.xml"
+        else:
+            resource, filename = self.write_featuretype(workspace_id, db, layer, store_id), "featuretype.xml"
+
+        layer_info = etree.Element("layer")
+        add_element(layer_info, "name", layer["store"])
+        add_element(layer_info, "id", get_catalog_id("LayerInfoImpl", workspace_id, layer["store"]))
+        add_element(layer_info, "type", layer["type"])
+        add_reference(layer_info, "defaultStyle", style_id)
+        add_reference(layer_info, "resource", resource.findtext("id"), **{"class": resource.tag})
+        attribution = add_element(layer_info, "attribution")
+        add_element(attribution, "logoWidth", "0")
+        add_element(attribution, "logoHeight", "0")
+
+        resource_dir = os.path.join(self.get_workspace_dir(workspace_id), layer["store"], layer["store"])
+        write_xml(os.path.join(resource_dir, filename), resource)
+        write_xml(os.path.join(resource_dir, "layer.xml"), layer_info)
+
+
+class CatalogReader:
+    """
+    Parses workspaces back from a GeoServer data directory, following the id references between
+    catalog files as GeoServer does when it loads them.
+    """
+
+    def __init__(self, catalog_dir):
+        self.catalog_dir = catalog_dir
+        self.global_styles = None
+        self.style_lock = threading.Lock()
+
+    @staticmethod
+    def read_styles(styles_dir, style_workspace):
+        """
+        Maps the id of each style in a styles directory to (style workspace, name).
+        """
+
+        style_names = {}
+
+        if not os.path.isdir(styles_dir):
+            return style_names
+
+        for filename in os.listdir(styles_dir):
+            if filename.endswith(".xml"):
+                style = read_xml(os.path.join(styles_dir, filename))
+                style_names[style.findtext("id")] = (style_workspace, style.findtext("name"))
+
+        return style_names
+
+    def get_style(self, style_id, workspace_styles):
+        if style_id in workspace_styles:
+            return workspace_styles[style_id]
+
+        with self.style_lock:
+            if self.global_styles is None or style_id not in self.global_styles:
+                self.global_styles = self.read_styles(get_styles_dir(self.catalog_dir, None), None)
+
+            if style_id not in self.global_styles:
+                raise CatalogError(f"missing style {style_id}")
+
+            return self.global_styles[style_id]
+
+    @staticmethod
+    def read_bbox(element):
+        if element is None:
+            raise CatalogError("missing bounding box")
+
+        return tuple(float(element.findtext(key)) for key in ("minx", "miny", "maxx", "maxy"))
+
+    @staticmethod
+    def check_reference(element, tag, catalog_id, path):
+        if element.findtext(f"{tag}/id") != catalog_id:
+            raise CatalogError(f"{path} does not refer to its {tag}")
+
+    def read_resource(self, resource_dir, store, store_id, namespace_id, workspace_styles):
+        for filename in ("coverage.xml", "featuretype.xml"):
+            path = os.path.join(resource_dir, filename)
+            if os.path.isfile(path):
+                break
+        else:
+            return None, None
+
+        resource = read_xml(path)
+        self.check_reference(resource, "store", store_id, path)
+        self.check_reference(resource, "namespace", namespace_id, path)
+
+        layer_path = os.path.join(resource_dir, "layer.xml")
+        layer_info = read_xml(layer_path)
+        self.check_reference(layer_info, "resource", resource.findtext("id"), layer_path)
+
+        layer = {
+            "type": layer_info.findtext("type"),
+            "store": store["name"],
+            "store_type": store["store_type"],
+            "url": store["url"],
+            "native_name": resource.findtext("nativeName"),
+            "srs": resource.findtext("srs"),
+            "bbox": self.read_bbox(resource.find("nativeBoundingBox")),
+            "latlon_bbox": self.read_bbox(resource.find("latLonBoundingBox")),
+            "style": self.get_style(layer_info.findtext("defaultStyle/id"), workspace_styles)
+        }
+
+        if resource.tag == "coverage":
+            layer["grid"] = tuple(int(i) for i in resource.findtext("grid/range/high").split())
+
+        return layer_info.findtext("name"), layer
+
+    def read_workspace(self, workspace_id, workspace_dir=None):
+        """
+        Reads the layers of a workspace as {layer name: layer}, from workspace_dir if it is staged.
+        Raises CatalogError if a file is unreadable or a reference between files is broken.
+        """
+
+        workspace_dir = workspace_dir or os.path.join(self.catalog_dir, "workspaces", workspace_id)
+        workspace = read_xml(os.path.join(workspace_dir, "workspace.xml"))
+        namespace = read_xml(os.path.join(workspace_dir, "namespace.xml"))
+
+        if workspace.findtext("name") != workspace_id or namespace.findtext("prefix") != workspace_id:
+            raise CatalogError(f"workspace {workspace_id} is misnamed")
+
+        workspace_styles = self.read_styles(os.path.join(workspace_dir, "styles"), workspace_id)
+        layers = {}
+
+        for store_name in sorted(os.listdir(workspace_dir)):
+            store_dir = os.path.join(workspace_dir, store_name)
+
+            if os.path.isfile(os.path.join(store_dir, "coveragestore.xml")):
+                path = os.path.join(store_dir, "coveragestore.xml")
+                store_info = read_xml(path)
+                store = {"name": store_info.findtext("name"), "store_type": "coveragestores", "url": store_info.findtext("url")}
+            elif os.path.isfile(os.path.join(store_dir, "datastore.xml")):
+                path = os.path.join(store_dir, "datastore.xml")
+                store_info = read_xml(path)
+                store = {
+                    "name": store_info.findtext("name"),
+                    "store_type": "datastores",
+                    "url": store_info.findtext("connectionParameters/entry[@key='url']")
+                }
+            else:
+                continue
+
+            self.check_reference(store_info, "workspace", workspace.findtext("id"), path)
+
+            for resource_name in sorted(os.listdir(store_dir)):
+                resource_dir = os.path.join(store_dir, resource_name)
+                if not os.path.isdir(resource_dir):
+                    continue
+                layer_name, layer = self.read_resource(
+                    resource_dir, store, store_info.findtext("id"), namespace.findtext("id"), workspace_styles
+                )
+                if layer_name is not None:
+                    layers[layer_name] = layer
+
+        return layers
+
+
+def generate_resource(res_id, writer, reader, overwrite=False, pending=None):
+    """
+    Writes the GeoServer layers of one resource into the catalog and reads them back.
+
+    Layers that cannot be described from their local files are skipped with the reason, to be
+    published through the REST API. An existing workspace is left alone unless overwrite is set,
+    in which case it is replaced once the new one has been written and read back, and only if no
+    layer is skipped. If pending is a list, the resource's stored response is dropped and the
+    written layers are added to pending, to be recorded by record_resources once GeoServer has
+    reloaded the catalog.
+    """
+
+    workspace_id = f"{settings.HIS.get('geoserver_ns')}-{res_id}"
+    result = {"resource_id": res_id, "success": True, "layers": [], "skipped": []}
+
+    with tracing.span("file_list"):
+        file_list = utilities.get_file_list(res_id)
+
+        if file_list is None:
+            result.update(success=False, message="Error: Resource is not publicly accessible.")
+            return result
+
+        dbs = [
+            classification.get_register_info(layer)
+            for layer in classification.classify_files(file_list) if layer.backend == "geoserver"
+        ]
+
+    workspace_dir = writer.get_workspace_dir(workspace_id)
+
+    if os.path.isdir(workspace_dir) and not overwrite:
+        result["skipped"] = [
+            {"layer_name": db["layer_name"], "message": "Workspace already exists in the GeoServer catalog."}
+            for db in dbs
+        ]
+        return result
+
+    raster_stats.load_cached_stats(dbs)
+
+    described = []
+    expected = {}
+
+    for db in dbs:
+        db["workspace_id"] = workspace_id
+        with tracing.span("describe_layer", layer_name=db["layer_name"], layer_type=db["layer_type"]) as attributes:
+            try:
+                layer = describe_layer(db)
+            except CatalogError as e:
+                attributes["skipped"] = str(e)
+                result["skipped"].append({
+                    "layer_name": db["layer_name"],
+                    "message": f"Error: Unable to write GeoServer layer to the catalog ({e})."
+                })
+                continue
+        described.append((db, layer))
+        expected[layer["store"]] = layer
+
+    if not described:
+        return result
+
+    if os.path.isdir(workspace_dir) and result["skipped"]:
+        result["skipped"] += [
+            {
+                "layer_name": db["layer_name"],
+                "message": "Workspace kept because other layers cannot be written to the GeoServer catalog."
+            }
+            for db, layer in described
+        ]
+        return result
+
+    staged_dir = writer.stage_workspace(workspace_id)
+
+    try:
+        with tracing.span("write_catalog", layers=len(described)):
+            writer.write_workspace(workspace_id)
+            for db, layer in described:
+                writer.write_layer(workspace_id, db, layer)
+
+        with tracing.span("read_catalog"):
+            try:
+                generated = reader.read_workspace(workspace_id, staged_dir)
+            except CatalogError as e:
+                generated = str(e)
+    except Exception:
+        writer.discard_workspace(workspace_id)
+        raise
+
+    if generated != expected:
+        writer.discard_workspace(workspace_id)
+        result.update(success=False, message="Error: Generated GeoServer catalog does not read back as written.")
+        return result
+
+    replaced = writer.commit_workspace(workspace_id)
+
+    if replaced:
+        styles.forget_workspace_styles(workspace_id)
+
+    if pending is not None:
+        fingerprints.clear_response(res_id)
+        pending.append((res_id, workspace_id, replaced, described))
+
+    result["layers"] = [db["layer_name"] for db, layer in described]
+
+    return result
+
+
+def generate_resource_catalog(res_id, writer, reader, overwrite, pending):
+    """
+    Generates one resource of a bulk rebuild and reports HydroShare, file, and database errors as
+    its outcome instead of raising.
+    """
+
+    try:
+        return generate_resource(res_id, writer, reader, overwrite=overwrite, pending=pending)
+    except (CatalogError, OSError, DatabaseError) + circuit.UNAVAILABLE_ERRORS as e:
+        return {
+            "resource_id": res_id,
+            "success": False,
+            "message": f"Error: Unable to generate GeoServer catalog ({e})."
+        }
+    finally:
+        connection.close()
+
+
+def record_resources(pending):
+    """
+    Records the layers of generated workspaces in the registry of published services and caches
+    their raster statistics, once GeoServer serves them.
+    """
+
+    for res_id, workspace_id, replaced, described in pending:
+        if replaced:
+            registry.clear_backend(res_id, "geoserver")
+        raster_stats.save_stats([db for db, layer in described])
+        for db, layer in described:
+            bbox = dict(zip(("minx", "miny", "maxx", "maxy"), layer["bbox"]), crs=layer["srs"])
+            service_url = utilities.get_wms_preview_url(workspace_id, layer["store"], bbox)
+            registry.record_geoserver_layer(res_id, db, bbox, service_url)
+
+
+def reload_catalog():
+    """
+    Asks GeoServer to reload its whole catalog from its data directory. Returns True if it did.
+    """
+
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    try:
+        response = clients.post("geoserver", f"{geoserver_url}/reload", operation="reload")
+    except circuit.UNAVAILABLE_ERRORS:
+        return False
+
+    return response.status_code == 200
+
+
+def stream_catalog_generation(resource_ids, catalog_dir=None, workers=None, overwrite=False, reload=True, publish_skipped=False):
+    """
+    Writes the GeoServer layers of many resources straight into GeoServer's data directory, then
+    reloads GeoServer's catalog once. Yields one JSON result per resource as newline-delimited
+    JSON, followed by a summary line.
+
+    Written layers are recorded in the registry only once the reload succeeds. Without reload, only
+    the files are written and checked, e.g. into a temporary directory; nothing is recorded. With publish_skipped, resources with skipped layers are then
+    updated through the REST API, and their results are streamed before the summary.
+    """
+
+    catalog_dir = catalog_dir or settings.HIS.get("geoserver_catalog_dir")
+
+    if catalog_dir is None:
+        raise CatalogError("No GeoServer catalog directory is configured.")
+
+    writer = CatalogWriter(catalog_dir)
+    reader = CatalogReader(catalog_dir)
+    summary = {"total": 0, "succeeded": 0, "failed": 0, "layers": 0, "skipped": 0}
+    skipped_resources = []
+    pending = [] if reload else None
+
+    results = bulk.run_bounded(
+        generate_resource_catalog, resource_ids, bulk.get_bulk_workers(workers), writer, reader, overwrite, pending
+    )
+
+    for result in results:
+        summary["total"] += 1
+        summary["succeeded" if result["success"] else "failed"] += 1
+        summary["layers"] += len(result.get("layers", []))
+        summary["skipped"] += len(result.get("skipped", []))
+        if result.get("skipped"):
+            skipped_resources.append(result["resource_id"])
+        yield json.dumps(result) + "\n"
+
+    if reload:
+        summary["reloaded"] = reload_catalog()
+        if summary["reloaded"]:
+            record_resources(pending)
+
+    if publish_skipped and summary.get("reloaded"):
+        summary["published"] = 0
+        for result in bulk.run_bulk_update(skipped_resources, workers=workers, force=True):
+            summary["published"] += result["success"]
+            yield json.dumps(result) + "\n"
+
+    yield json.dumps({"summary": summary}) + "\n"
@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import timedelta
+import requests
+from django.db import IntegrityError
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager.models import BackendCircuit
+
+
+BACKEND_NAMES = {
+    "geoserver": "GeoServer",
+    "hydroserver": "HydroServer",
+    "hydroshare": "HydroShare"
+}
+
+_circuits = {}
+_failures = {}
+_lock = threading.Lock()
+
+
+class BackendUnavailableError(Exception):
+    """
+    Raised instead of sending a request to a backend whose circuit is open.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        super().__init__(f"{BACKEND_NAMES.get(backend, backend)} is unavailable.")
+
+
+# Errors that leave a backend's layers unregistered while the other backend carries on.
+UNAVAILABLE_ERRORS = (BackendUnavailableError, requests.exceptions.RequestException)
+
+
+def is_enabled():
+    return settings.HIS.get("circuit_failure_threshold") is not None
+
+
+def get_reset_timeout():
+    return timedelta(seconds=settings.HIS.get("circuit_reset_timeout", 30))
+
+
+def get_circuit(backend, refresh=False):
+    """
+    Gets (state, opened_at) of a backend's shared circuit, read from the database at most once per
+    circuit_refresh_interval by each process.
+    """
+
+    now = time.monotonic()
+
+    with _lock:
+        cached = _circuits.get(backend)
+        if not refresh and cached is not None and now - cached[2] < settings.HIS.get("circuit_refresh_interval", 1):
+            return cached[0], cached[1]
+
+    circuit = BackendCircuit.objects.filter(backend=backend).values_list("state", "opened_at").first()
+
+    if circuit is None:
+        circuit = (BackendCircuit.CLOSED, None)
+
+    with _lock:
+        _circuits[backend] = (circuit[0], circuit[1], now)
+
+    return circuit
+
+
+def set_circuit(backend, state, opened_at, **filters):
+    """
+    Moves a backend's circuit to a new state if it matches filters. Returns True if it was changed.
+    """
+
+    updated = BackendCircuit.objects.filter(backend=backend, **filters).update(state=state, opened_at=opened_at)
+
+    if not updated and not filters:
+        try:
+            BackendCircuit.objects.create(backend=backend, state=state, opened_at=opened_at)
+            updated = 1
+        except IntegrityError:
+            updated = BackendCircuit.objects.filter(backend=backend).update(state=state, opened_at=opened_at)
+
+    get_circuit(backend, refresh=True)
+
+    return bool(updated)
+
+
+def before_request(backend):
+    """
+    Checks a backend's circuit before a request is sent.
+
+    Raises BackendUnavailableError while the circuit is open. Once circuit_reset_timeout has passed,
+    one request across all workers is let through as a probe; returns True for that request.
+    """
+
+    if not is_enabled():
+        return False
+
+    state, opened_at = get_circuit(backend)
+
+    if state == BackendCircuit.CLOSED:
+        return False
+
+    now = timezone.now()
+
+    if opened_at is not None and now - opened_at < get_reset_timeout():
+        raise BackendUnavailableError(backend)
+
+    probe = set_circuit(
+        backend, BackendCircuit.HALF_OPEN, now,
+        state__in=(BackendCircuit.OPEN, BackendCircuit.HALF_OPEN),
+        opened_at__lte=now - get_reset_timeout()
+    )
+
+    if not probe:
+        raise BackendUnavailableError(backend)
+
+    return True
+
+
+def record_failure(backend, probe):
+    """
+    Counts a failed request, opening the circuit after circuit_failure_threshold consecutive failures
+    in this process or when a probe fails.
+    """
+
+    if not is_enabled():
+        return
+
+    with _lock:
+        failures = _failures[backend] = _failures.get(backend, 0) + 1
+
+    if probe or failures >= settings.HIS.get("circuit_failure_threshold"):
+        with _lock:
+            _failures[backend] = 0
+        set_circuit(backend, BackendCircuit.OPEN, timezone.now())
+
+
+def record_success(backend, probe):
+    """
+    Resets the failure count, closing the circuit if this request was its probe.
+    """
+
+    if not is_enabled():
+        return
+
+    with _lock:
+        _failures[backend] = 0
+
+    if probe:
+        set_circuit(backend, BackendCircuit.CLOSED, None)
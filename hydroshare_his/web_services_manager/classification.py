@@ -0,0 +1,207 @@
+import hashlib
+from collections import namedtuple
+from hydroshare_his import settings
+
+
+FileRecord = namedtuple("FileRecord", (
+    "hs_path",
+    "folder",
+    "file_name",
+    "extension",
+    "content_type",
+    "logical_file_type",
+    "size",
+    "checksum",
+    "modified_time"
+))
+
+LayerRule = namedtuple("LayerRule", (
+    "backend",
+    "layer_type",
+    "file_type",
+    "store_type",
+    "layer_group",
+    "verification"
+))
+
+LayerRecord = namedtuple("LayerRecord", (
+    "backend",
+    "registered_name",
+    "rule",
+    "file"
+))
+
+
+# Maps (logical_file_type, content_type, extension) to how a file is published.
+# A content_type of None matches any content type.
+LAYER_RULES = {
+    ("GeoRasterLogicalFile", "image/tiff", "tif"): LayerRule(
+        "geoserver", "GeographicRaster", "geotiff", "coveragestores", "coverages", "coverage"
+    ),
+    ("GeoFeatureLogicalFile", "application/x-qgis", "shp"): LayerRule(
+        "geoserver", "GeographicFeature", "shp", "datastores", "featuretypes", "featureType"
+    ),
+    ("TimeSeriesLogicalFile", None, "sqlite"): LayerRule(
+        "hydroserver", "Timeseries", None, None, None, None
+    ),
+    ("TimeSeriesLogicalFile", None, "db"): LayerRule(
+        "hydroserver", "Timeseries", None, None, None, None
+    ),
+}
+
+
+def parse_file(result):
+    """
+    Parses a HydroShare file list entry into a compact record, splitting its URL once.
+
+    URLs look like {host}/resource/{res_id}/data/contents/{folder}/{file_name}.{extension}.
+    """
+
+    url_parts = result["url"].split("/")
+    file_name, _, extension = url_parts[-1].rpartition(".")
+
+    return FileRecord(
+        "/".join(url_parts[4:]),
+        "/".join(url_parts[7:-1]),
+        file_name,
+        extension,
+        result.get("content_type"),
+        result.get("logical_file_type"),
+        result.get("size"),
+        result.get("checksum"),
+        result.get("modified_time")
+    )
+
+
+def get_layer_rule(record):
+    return (
+        LAYER_RULES.get((record.logical_file_type, record.content_type, record.extension)) or
+        LAYER_RULES.get((record.logical_file_type, None, record.extension))
+    )
+
+
+def classify_files(file_list):
+    """
+    Yields a LayerRecord for each file that can be published on a configured backend.
+    """
+
+    enabled_backends = {
+        backend for backend in ("geoserver", "hydroserver")
+        if settings.HIS.get(f"{backend}_url") is not None
+    }
+
+    for result in file_list:
+        record = parse_file(result)
+        rule = get_layer_rule(record)
+
+        if rule is None or rule.backend not in enabled_backends:
+            continue
+
+        if rule.backend == "geoserver":
+            registered_name = record.folder.replace("/", " ")
+        else:
+            registered_name = record.folder
+
+        yield LayerRecord(rule.backend, registered_name, rule, record)
+
+
+def get_file_version(record):
+    """
+    Identifies the content of a layer's file, or returns "" if HydroShare reported neither a checksum
+    nor a modified time for it.
+    """
+
+    if not record.checksum and not record.modified_time:
+        return ""
+
+    key = "\0".join((record.hs_path, str(record.checksum or ""), str(record.modified_time or ""), str(record.size or "")))
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_register_info(layer):
+    """
+    Builds the layer description passed to register_geoserver_db or register_hydroserver_db.
+    """
+
+    if layer.backend == "geoserver":
+        return {
+            "layer_name": layer.file.folder,
+            "layer_type": layer.rule.layer_type,
+            "file_name": layer.file.file_name,
+            "file_type": layer.rule.file_type,
+            "hs_path": layer.file.hs_path,
+            "store_type": layer.rule.store_type,
+            "layer_group": layer.rule.layer_group,
+            "verification": layer.rule.verification,
+            "checksum": layer.file.checksum,
+            "modified_time": layer.file.modified_time,
+            "file_version": get_file_version(layer.file)
+        }
+
+    return {
+        "database_name": layer.file.folder,
+        "hs_path": layer.file.hs_path,
+        "layer_title": layer.file.file_name,
+        "file_version": get_file_version(layer.file)
+    }
+
+
+def reconcile(layers, geoserver_list, hydroserver_list, file_versions=None):
+    """
+    Compares classified layers with what each backend already publishes.
+
+    file_versions, if given, maps (backend, registered name) to the file version recorded when a
+    layer was published. Published layers whose file has a different version since are unregistered
+    and registered again; layers without a recorded version are left alone.
+
+    Returns (geoserver register, geoserver unregister, hydroserver register, hydroserver unregister)
+    lists in linear time.
+    """
+
+    geoserver_names = {i[0] for i in geoserver_list}
+    hydroserver_names = set(hydroserver_list)
+    file_versions = file_versions or {}
+    registered_names = set()
+    changed_names = set()
+
+    geoserver_register = []
+    hydroserver_register = []
+
+    for layer in layers:
+        registered_names.add(layer.registered_name)
+
+        if layer.backend == "geoserver":
+            published = layer.registered_name in geoserver_names
+        else:
+            published = layer.registered_name in hydroserver_names
+
+        if published:
+            recorded_version = file_versions.get((layer.backend, layer.registered_name))
+            if not recorded_version or recorded_version == get_file_version(layer.file):
+                continue
+            changed_names.add((layer.backend, layer.registered_name))
+
+        if layer.backend == "geoserver":
+            geoserver_register.append(get_register_info(layer))
+        else:
+            hydroserver_register.append(get_register_info(layer))
+
+    geoserver_unregister = [
+        {
+            "layer_name": layer[0],
+            "store_type": layer[1]
+        }
+        for layer in geoserver_list
+        if layer[0] not in registered_names or ("geoserver", layer[0]) in changed_names
+    ]
+
+    hydroserver_unregister = [
+        {
+            "database_name": database
+        }
+        for database in hydroserver_list
+        if database not in registered_names or ("hydroserver", database) in changed_names
+    ]
+
+    return geoserver_register, geoserver_unregister, hydroserver_register, hydroserver_unregister
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from hydroshare_his import settings
+from web_services_manager import metrics
+from web_services_manager import circuit
+from web_services_manager import tracing
+
+
+BACKENDS = ("geoserver", "hydroserver", "hydroshare")
+
+IDEMPOTENT_METHODS = frozenset(["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"])
+
+RETRY_STATUS_CODES = (502, 503, 504)
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+
+def get_backend_auth(backend):
+    """
+    Gets basic auth credentials for a backend, if any are configured.
+    """
+
+    backend_user = settings.HIS.get(f"{backend}_user")
+    backend_pass = settings.HIS.get(f"{backend}_pass")
+
+    if backend_user is None:
+        return None
+
+    return requests.auth.HTTPBasicAuth(
+        backend_user,
+        backend_pass
+    )
+
+
+def get_retry_policy():
+    """
+    Builds a retry policy with backoff that only repeats idempotent requests.
+    """
+
+    retry_options = {
+        "total": settings.HIS.get("http_retries", 3),
+        "backoff_factor": settings.HIS.get("http_backoff_factor", 0.5),
+        "status_forcelist": RETRY_STATUS_CODES,
+        "raise_on_status": False
+    }
+
+    try:
+        return Retry(allowed_methods=IDEMPOTENT_METHODS, **retry_options)
+    except TypeError:
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **retry_options)
+
+
+def build_session(backend):
+    """
+    Creates a keep-alive session with a connection pool for one backend.
+    """
+
+    pool_size = settings.HIS.get("http_pool_size", 10)
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=get_retry_policy()
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.auth = get_backend_auth(backend)
+
+    return session
+
+
+def get_session(backend):
+    """
+    Gets the shared session for a backend, creating it once per process.
+    """
+
+    global _sessions_pid
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        if backend not in _sessions:
+            _sessions[backend] = build_session(backend)
+        return _sessions[backend]
+
+
+def close_sessions():
+    """
+    Closes all pooled connections held by this process.
+    """
+
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_timeout():
+    """
+    Gets the default (connect, read) timeout for outbound requests.
+    """
+
+    return (
+        settings.HIS.get("http_connect_timeout", 5),
+        settings.HIS.get("http_read_timeout", 120)
+    )
+
+
+def request(backend, method, url, operation="other", **kwargs):
+    """
+    Sends a request to a backend through its pooled session, recording its status and wall time
+    under the given operation name.
+
+    Raises circuit.BackendUnavailableError without sending anything while the backend's circuit is open.
+    Connection errors, timeouts, and gateway errors count as failures of the backend.
+    """
+
+    with tracing.span("http", backend=backend, operation=operation, method=method, url=url) as attributes:
+        probe = circuit.before_request(backend)
+
+        kwargs.setdefault("timeout", get_timeout())
+        start = time.perf_counter()
+        status = "error"
+
+        if isinstance(kwargs.get("data"), (str, bytes)):
+            attributes["request_bytes"] = len(kwargs["data"])
+
+        try:
+            response = get_session(backend).request(method, url, **kwargs)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            circuit.record_failure(backend, probe)
+            raise
+        finally:
+            metrics.record_request(backend, operation, method, status, time.perf_counter() - start)
+
+        if status in RETRY_STATUS_CODES:
+            circuit.record_failure(backend, probe)
+        else:
+            circuit.record_success(backend, probe)
+
+        if tracing.is_tracing():
+            attributes["status"] = status
+            attributes["response_bytes"] = len(response.content)
+
+    return response
+
+
+def get(backend, url, **kwargs):
+    return request(backend, "GET", url, **kwargs)
+
+
+def put(backend, url, **kwargs):
+    return request(backend, "PUT", url, **kwargs)
+
+
+def post(backend, url, **kwargs):
+    return request(backend, "POST", url, **kwargs)
+
+
+def delete(backend, url, **kwargs):
+    return request(backend, "DELETE", url, **kwargs)
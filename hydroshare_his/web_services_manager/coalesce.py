@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager.models import ResourceUpdate
+
+
+class CoalescedUpdateError(Exception):
+    """
+    Raised when the update run covering a request failed or did not finish in time.
+    """
+
+
+class UpdateNotStartedError(Exception):
+    """
+    Raised by a leader's function when it gave up before updating anything, e.g. when it was not
+    admitted. The requests it covers stay pending, so another caller can lead the next run.
+    """
+
+
+def request_update(res_id, force=False):
+    """
+    Records an update request for a resource and returns its request number. A forced request is
+    also recorded in force_requested, so the run that covers it is forced too.
+    """
+
+    ResourceUpdate.objects.get_or_create(resource_id=res_id)
+
+    # The update locks the row until the transaction ends, so the number read back is this
+    # request's own and force_requested cannot be lowered by an earlier request.
+    with transaction.atomic():
+        ResourceUpdate.objects.filter(resource_id=res_id).update(
+            requested=F("requested") + 1,
+            last_requested=timezone.now()
+        )
+
+        ticket = ResourceUpdate.objects.values_list("requested", flat=True).get(resource_id=res_id)
+
+        if force:
+            ResourceUpdate.objects.filter(resource_id=res_id).update(force_requested=ticket)
+
+    return ticket
+
+
+def acquire_lock(res_id, owner):
+    """
+    Takes the update lock for a resource if it is free or its holder stopped responding.
+    """
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.HIS.get("update_lock_timeout", 600))
+
+    acquired = ResourceUpdate.objects.filter(resource_id=res_id).filter(
+        Q(owner="") | Q(heartbeat__lt=stale)
+    ).update(owner=owner, heartbeat=now)
+
+    return acquired == 1
+
+
+def release_lock(res_id, owner):
+    ResourceUpdate.objects.filter(resource_id=res_id, owner=owner).update(owner="")
+
+
+def keep_lock_alive(res_id, owner, stop):
+    """
+    Refreshes the lock heartbeat until stop is set.
+    """
+
+    interval = settings.HIS.get("update_lock_timeout", 600) / 3
+
+    try:
+        while not stop.wait(interval):
+            ResourceUpdate.objects.filter(resource_id=res_id, owner=owner).update(heartbeat=timezone.now())
+    finally:
+        connection.close()
+
+
+def wait_for_quiet_period(res_id):
+    """
+    Waits until no new request has arrived for the configured debounce window.
+    """
+
+    window = settings.HIS.get("update_debounce_window", 0)
+
+    while window > 0:
+        last_requested = ResourceUpdate.objects.values_list("last_requested", flat=True).get(resource_id=res_id)
+        quiet = (timezone.now() - last_requested).total_seconds()
+        if quiet >= window:
+            break
+        time.sleep(window - quiet)
+
+
+def get_completed_result(update):
+    """
+    Gets the response stored by the run that covered a request.
+    """
+
+    if update.error:
+        raise CoalescedUpdateError(update.error)
+
+    return json.loads(update.result)
+
+
+def run_as_leader(res_id, owner, function, *args, **kwargs):
+    """
+    Runs one update covering every request received before it started. The run is forced if any
+    request it covers asked for force.
+
+    UpdateNotStartedError is raised without recording a result, and the lock is released so a
+    waiting caller can take over.
+    """
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=keep_lock_alive, args=(res_id, owner, stop), daemon=True)
+    heartbeat.start()
+
+    try:
+        wait_for_quiet_period(res_id)
+
+        target, completed, force_requested = ResourceUpdate.objects.values_list(
+            "requested", "completed", "force_requested"
+        ).get(resource_id=res_id)
+
+        if force_requested > completed:
+            kwargs["force"] = True
+
+        try:
+            response = function(res_id, *args, **kwargs)
+        except UpdateNotStartedError:
+            raise
+        except Exception as e:
+            ResourceUpdate.objects.filter(resource_id=res_id).update(
+                completed=target,
+                result="",
+                error=f"Error: Unable to update web services ({type(e).__name__})."
+            )
+            raise
+
+        ResourceUpdate.objects.filter(resource_id=res_id).update(
+            completed=target,
+            result=json.dumps(response),
+            error=""
+        )
+
+        return response
+
+    finally:
+        stop.set()
+        heartbeat.join()
+        release_lock(res_id, owner)
+
+
+def run_coalesced(res_id, function, *args, **kwargs):
+    """
+    Runs function(res_id, ...) so that at most one update per resource runs at a time across workers.
+
+    Callers arriving while an update is in flight wait for the next run and share its result
+    instead of starting their own. A caller passing force=True only shares the result of a forced run.
+    Only the caller leading a run calls function, so waiting for admission inside function does not
+    hold an update slot for the callers waiting on it.
+    """
+
+    owner = uuid.uuid4().hex
+    ticket = request_update(res_id, force=kwargs.get("force", False))
+    poll_interval = settings.HIS.get("update_poll_interval", 0.5)
+    deadline = time.monotonic() + settings.HIS.get("update_wait_timeout", 900)
+
+    while True:
+        update = ResourceUpdate.objects.get(resource_id=res_id)
+
+        if update.completed >= ticket:
+            return get_completed_result(update)
+
+        if acquire_lock(res_id, owner):
+            update = ResourceUpdate.objects.get(resource_id=res_id)
+            if update.completed >= ticket:
+                release_lock(res_id, owner)
+                return get_completed_result(update)
+            return run_as_leader(res_id, owner, function, *args, **kwargs)
+
+        if time.monotonic() > deadline:
+            raise CoalescedUpdateError("Error: Timed out waiting for an update of this resource.")
+
+        time.sleep(poll_interval)
@@ -0,0 +1,48 @@
+import json
+from datetime import timedelta
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager.models import ResourceFingerprint
+
+
+def get_cached_response(res_id, fingerprint):
+    """
+    Gets the stored response for a resource if its file list has not changed since the last update.
+    """
+
+    cached = ResourceFingerprint.objects.filter(resource_id=res_id, fingerprint=fingerprint)
+
+    max_age = settings.HIS.get("reconcile_cache_ttl")
+    if max_age is not None:
+        cached = cached.filter(updated__gte=timezone.now() - timedelta(seconds=max_age))
+
+    cached = cached.first()
+
+    if cached is None:
+        return None
+
+    return json.loads(cached.response)
+
+
+def save_response(res_id, fingerprint, response):
+    """
+    Stores the response for a resource's file list. Writes without a read lock so concurrent
+    updates of other resources do not deadlock on SQLite.
+    """
+
+    updated = ResourceFingerprint.objects.filter(resource_id=res_id).update(
+        fingerprint=fingerprint,
+        response=json.dumps(response),
+        updated=timezone.now()
+    )
+
+    if not updated:
+        ResourceFingerprint.objects.create(
+            resource_id=res_id,
+            fingerprint=fingerprint,
+            response=json.dumps(response)
+        )
+
+
+def clear_response(res_id):
+    ResourceFingerprint.objects.filter(resource_id=res_id).delete()
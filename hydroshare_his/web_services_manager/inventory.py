@@ -0,0 +1,211 @@
+import json
+import threading
+from hydroshare_his import settings
+from web_services_manager import clients
+from web_services_manager import circuit
+
+
+def get_json_items(response, collection, item):
+    """
+    Gets the list of items from a GeoServer REST listing, which is an empty string when there are none.
+    """
+
+    if response.status_code != 200:
+        return []
+
+    content = json.loads(response.content)
+
+    if not content.get(collection):
+        return []
+
+    return content[collection][item]
+
+
+class GeoServerInventory:
+    """
+    In-memory snapshot of the stores, coverages, and feature types in a resource's GeoServer workspace.
+
+    The snapshot is fetched once per update and then kept current as layers are registered and removed,
+    so the update does not have to list the workspace again. available is False if GeoServer's circuit
+    was open or it could not be reached, in which case the snapshot is empty.
+    """
+
+    def __init__(self, res_id):
+        self.res_id = res_id
+        self.workspace_id = f"{settings.HIS.get('geoserver_ns')}-{res_id}"
+        self.available = True
+        self.workspace_exists = False
+        self.stores = {}
+        self.coverages = {}
+        self.featuretypes = {}
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        """
+        Lists the workspace's data stores, coverages, and feature types.
+        """
+
+        if settings.HIS.get("geoserver_url") is None:
+            return self
+
+        headers = {
+            "content-type": "application/json"
+        }
+
+        try:
+            responses = [
+                clients.get("geoserver", rest_url, headers=headers, operation="list")
+                for rest_url in self.get_listing_urls()
+            ]
+        except circuit.UNAVAILABLE_ERRORS:
+            self.available = False
+            return self
+
+        return self.load(*responses)
+
+    def get_listing_urls(self):
+        """
+        Gets the URLs listing the workspace's data stores, coverages, and feature types.
+        """
+
+        workspace_url = f"{settings.HIS.get('geoserver_url')}/workspaces/{self.workspace_id}"
+
+        return [
+            f"{workspace_url}/datastores.json",
+            f"{workspace_url}/coverages.json",
+            f"{workspace_url}/featuretypes.json"
+        ]
+
+    def load(self, ds_response, cv_response, ft_response):
+        """
+        Replaces the snapshot with the responses to the listings from get_listing_urls. A server
+        error leaves the snapshot empty and marks GeoServer unavailable, since the workspace's
+        contents are unknown.
+        """
+
+        if any(response.status_code >= 500 for response in (ds_response, cv_response, ft_response)):
+            self.available = False
+            return self
+
+        with self.lock:
+            self.workspace_exists = ds_response.status_code == 200
+            self.stores = {
+                datastore["name"]: "datastores"
+                for datastore in get_json_items(ds_response, "dataStores", "dataStore")
+            }
+            self.coverages = dict.fromkeys(
+                coverage["name"]
+                for coverage in get_json_items(cv_response, "coverages", "coverage")
+            )
+            self.featuretypes = dict.fromkeys(
+                featuretype["name"]
+                for featuretype in get_json_items(ft_response, "featureTypes", "featureType")
+            )
+
+        return self
+
+    def get_layer_list(self):
+        """
+        Gets (name, store type) pairs for data stores and published coverages, as get_geoserver_list does.
+        """
+
+        with self.lock:
+            layer_list = [
+                (name, store_type) for name, store_type in self.stores.items()
+                if store_type == "datastores"
+            ]
+            layer_list += [(name, "coveragestores") for name in self.coverages]
+
+        return layer_list
+
+    def add_layer(self, db):
+        layer_name = db["layer_name"].replace("/", " ")
+        with self.lock:
+            self.workspace_exists = True
+            self.stores[layer_name] = db["store_type"]
+            if db["store_type"] == "coveragestores":
+                self.coverages[layer_name] = None
+            else:
+                self.featuretypes[layer_name] = None
+
+    def remove_layer(self, db):
+        layer_name = db["layer_name"].replace("/", " ")
+        with self.lock:
+            self.stores.pop(layer_name, None)
+            self.coverages.pop(layer_name, None)
+            self.featuretypes.pop(layer_name, None)
+
+    def reset(self, workspace_exists):
+        with self.lock:
+            self.workspace_exists = workspace_exists
+            self.stores = {}
+            self.coverages = {}
+            self.featuretypes = {}
+
+
+class HydroServerInventory:
+    """
+    In-memory snapshot of the databases in a resource's HydroServer network. available is False if
+    HydroServer's circuit was open or it could not be reached.
+    """
+
+    def __init__(self, res_id):
+        self.res_id = res_id
+        self.available = True
+        self.network_exists = False
+        self.databases = {}
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        """
+        Lists the network's databases.
+        """
+
+        if settings.HIS.get("hydroserver_url") is None:
+            return self
+
+        try:
+            response = clients.get("hydroserver", self.get_listing_url(), operation="list")
+        except circuit.UNAVAILABLE_ERRORS:
+            self.available = False
+            return self
+
+        return self.load(response)
+
+    def get_listing_url(self):
+        return f"{settings.HIS.get('hydroserver_url')}/manage/network/{self.res_id}/databases/"
+
+    def load(self, response):
+        """
+        Replaces the snapshot with the response to the listing from get_listing_url. A server error
+        marks HydroServer unavailable, as for GeoServerInventory.load.
+        """
+
+        if response.status_code >= 500:
+            self.available = False
+            return self
+
+        with self.lock:
+            self.network_exists = response.status_code == 200
+            if response.status_code == 200:
+                self.databases = dict.fromkeys(database["database_id"] for database in json.loads(response.content))
+
+        return self
+
+    def get_database_list(self):
+        with self.lock:
+            return list(self.databases)
+
+    def add_database(self, db):
+        with self.lock:
+            self.network_exists = True
+            self.databases[db["database_name"]] = None
+
+    def remove_database(self, db):
+        with self.lock:
+            self.databases.pop(db["database_name"], None)
+
+    def reset(self, network_exists):
+        with self.lock:
+            self.network_exists = network_exists
+            self.databases = {}
@@ -0,0 +1,273 @@
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager import admission
+from web_services_manager import pipeline
+from web_services_manager import coalesce
+from web_services_manager.models import UpdateJob
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_watcher_pid = None
+_submitted = set()
+
+
+def get_job_executor():
+    """
+    Gets the local worker pool that runs queued update jobs in this process.
+    """
+
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.HIS.get("job_workers", 2),
+                thread_name_prefix="his-jobs"
+            )
+            _executor_pid = os.getpid()
+            _submitted.clear()
+        return _executor
+
+
+def submit_job(job_id):
+    """
+    Starts a queued job in the local worker pool, unless this process already started it.
+    """
+
+    executor = get_job_executor()
+
+    with _executor_lock:
+        if job_id in _submitted:
+            return
+        _submitted.add(job_id)
+
+    executor.submit(run_update_job, job_id)
+
+
+def submit_update_job(res_id, force=False):
+    """
+    Queues a service update for a resource and starts it in the local worker pool.
+    """
+
+    job = UpdateJob.objects.create(resource_id=res_id, force=force)
+    submit_job(job.job_id)
+
+    return job
+
+
+def claim_job(job_id):
+    """
+    Marks a queued job as running. Returns False if another worker already claimed it.
+    """
+
+    now = timezone.now()
+    claimed = UpdateJob.objects.filter(job_id=job_id, status=UpdateJob.QUEUED).update(
+        status=UpdateJob.RUNNING,
+        started=now,
+        heartbeat=now
+    )
+
+    return claimed == 1
+
+
+def keep_job_alive(job_id, stop):
+    """
+    Refreshes the job heartbeat until stop is set.
+    """
+
+    interval = settings.HIS.get("job_heartbeat_timeout", 60) / 3
+
+    try:
+        while not stop.wait(interval):
+            UpdateJob.objects.filter(job_id=job_id, status=UpdateJob.RUNNING).update(heartbeat=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_admitted_update(job, progress):
+    """
+    Runs a job's update through admission control as a bulk update, behind synchronous updates. A
+    job turned away because the queue is full or no slot came free waits Retry-After seconds and
+    tries again, for at most job_admission_timeout seconds before the AdmissionError is raised.
+    """
+
+    deadline = time.monotonic() + settings.HIS.get("job_admission_timeout", 600)
+
+    while True:
+        try:
+            return coalesce.run_coalesced(
+                job.resource_id,
+                functools.partial(admission.run_admitted, admission.BULK, pipeline.update_resource_services),
+                progress=progress,
+                force=job.force
+            )
+        except admission.AdmissionError as e:
+            if time.monotonic() + e.retry_after > deadline:
+                raise
+            time.sleep(e.retry_after)
+
+
+def run_update_job(job_id):
+    """
+    Runs a queued update job and stores its progress and final response.
+    """
+
+    try:
+        if not claim_job(job_id):
+            return
+
+        job = UpdateJob.objects.get(job_id=job_id)
+
+        def progress(completed, total):
+            UpdateJob.objects.filter(job_id=job_id).update(
+                layers_completed=completed,
+                layers_total=total
+            )
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_job_alive, args=(job_id, stop), daemon=True)
+        heartbeat.start()
+
+        try:
+            response = run_admitted_update(job, progress)
+        except admission.AdmissionError as e:
+            UpdateJob.objects.filter(job_id=job_id).update(
+                status=UpdateJob.FAILED,
+                error=str(e),
+                finished=timezone.now()
+            )
+        except Exception as e:
+            UpdateJob.objects.filter(job_id=job_id).update(
+                status=UpdateJob.FAILED,
+                error=f"Error: Unable to update web services ({type(e).__name__}).",
+                finished=timezone.now()
+            )
+        else:
+            UpdateJob.objects.filter(job_id=job_id).update(
+                status=UpdateJob.SUCCEEDED,
+                result=json.dumps(response),
+                finished=timezone.now()
+            )
+        finally:
+            stop.set()
+            heartbeat.join()
+    finally:
+        with _executor_lock:
+            _submitted.discard(job_id)
+        connection.close()
+
+
+def requeue_stale_jobs():
+    """
+    Puts running jobs whose worker stopped refreshing their heartbeat for job_heartbeat_timeout
+    seconds back in the queue. Returns the number of jobs requeued.
+    """
+
+    stale = timezone.now() - timedelta(seconds=settings.HIS.get("job_heartbeat_timeout", 60))
+
+    return UpdateJob.objects.filter(status=UpdateJob.RUNNING).filter(
+        Q(heartbeat__lt=stale) | Q(heartbeat__isnull=True, started__lt=stale)
+    ).update(status=UpdateJob.QUEUED, layers_completed=0, layers_total=0)
+
+
+def get_queued_job_ids():
+    """
+    Requeues jobs left running by a worker that stopped, then lists queued jobs, oldest first.
+    """
+
+    requeue_stale_jobs()
+
+    return list(
+        UpdateJob.objects.filter(status=UpdateJob.QUEUED).order_by("created").values_list("job_id", flat=True)
+    )
+
+
+def process_queued_jobs():
+    """
+    Runs every job still waiting in the queue, and every job left running by a worker that stopped,
+    e.g. after a worker restart.
+    """
+
+    job_ids = get_queued_job_ids()
+
+    for job_id in job_ids:
+        run_update_job(job_id)
+
+    return job_ids
+
+
+def resume_jobs():
+    """
+    Starts every queued job, and every job left running by a worker that stopped, in the local
+    worker pool, skipping jobs this process already started. Workers that resume the same job at
+    once run it only once, since a job is claimed before it runs. Returns the ids of queued jobs.
+    """
+
+    job_ids = get_queued_job_ids()
+
+    for job_id in job_ids:
+        submit_job(job_id)
+
+    return job_ids
+
+
+def watch_jobs():
+    """
+    Resumes orphaned and queued jobs now and then every job_heartbeat_timeout seconds.
+    """
+
+    while True:
+        try:
+            resume_jobs()
+        except DatabaseError:
+            pass
+        finally:
+            connection.close()
+        time.sleep(settings.HIS.get("job_heartbeat_timeout", 60))
+
+
+def start_job_pool():
+    """
+    Starts resuming jobs left by restarted or stopped workers, once per worker process.
+    """
+
+    global _watcher_pid
+
+    with _executor_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+
+    threading.Thread(target=watch_jobs, name="his-jobs-watcher", daemon=True).start()
+
+
+def get_job_status(job):
+    """
+    Builds the status payload returned for a job.
+    """
+
+    return {
+        "job_id": str(job.job_id),
+        "resource_id": job.resource_id,
+        "status": job.status,
+        "progress": {
+            "completed": job.layers_completed,
+            "total": job.layers_total
+        },
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error or None,
+        "created": job.created,
+        "started": job.started,
+        "finished": job.finished
+    }
@@ -0,0 +1,92 @@
+import time
+from django.core.management.base import BaseCommand
+from hydroshare_his import settings
+from web_services_manager import classification
+
+
+def build_synthetic_resource(file_count, res_id="benchmark"):
+    """
+    Builds a synthetic HydroShare file list and the layers GeoServer and HydroServer already publish.
+
+    Every fifth file is a raster, a shapefile, or a time series database. Half of those are treated
+    as already published, and a few stale layers are added that should be unregistered.
+    """
+
+    base_url = f"https://www.hydroshare.org/resource/{res_id}/data/contents"
+    file_list = []
+    geoserver_list = []
+    hydroserver_list = []
+
+    for i in range(file_count):
+        kind = i % 5
+        folder = f"folder_{i}"
+        if kind == 0:
+            url, content_type, logical_file_type = f"{base_url}/{folder}/raster.tif", "image/tiff", "GeoRasterLogicalFile"
+            if i % 2 == 0:
+                geoserver_list.append((folder, "coveragestores"))
+        elif kind == 1:
+            url, content_type, logical_file_type = f"{base_url}/{folder}/raster.vrt", "application/xml", "GeoRasterLogicalFile"
+        elif kind == 2:
+            url, content_type, logical_file_type = f"{base_url}/{folder}/feature.shp", "application/x-qgis", "GeoFeatureLogicalFile"
+            if i % 2 == 0:
+                geoserver_list.append((folder, "datastores"))
+        elif kind == 3:
+            url, content_type, logical_file_type = f"{base_url}/{folder}/series.sqlite", "application/x-sqlite3", "TimeSeriesLogicalFile"
+            if i % 2 == 0:
+                hydroserver_list.append(folder)
+        else:
+            url, content_type, logical_file_type = f"{base_url}/{folder}/readme.txt", "text/plain", "GenericLogicalFile"
+
+        file_list.append({
+            "url": url,
+            "content_type": content_type,
+            "logical_file_type": logical_file_type,
+            "size": 1024,
+            "checksum": f"{i:032x}"
+        })
+
+    for i in range(file_count // 100):
+        geoserver_list.append((f"stale_{i}", "coveragestores"))
+        hydroserver_list.append(f"stale_{i}")
+
+    return file_list, geoserver_list, hydroserver_list
+
+
+def time_reconcile(file_list, geoserver_list, hydroserver_list, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        layers = classification.classify_files(file_list)
+        plan = classification.reconcile(layers, geoserver_list, hydroserver_list)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, plan
+
+
+class Command(BaseCommand):
+    help = "Times file classification and reconcile against published layers on synthetic file lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=50000, help="Number of files in the largest synthetic resource.")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per size; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        settings.HIS["geoserver_url"] = settings.HIS.get("geoserver_url") or "http://geoserver.invalid/geoserver/rest"
+        settings.HIS["hydroserver_url"] = settings.HIS.get("hydroserver_url") or "http://hydroserver.invalid/wds"
+
+        results = []
+
+        for file_count in (options["files"] // 10, options["files"]):
+            file_list, geoserver_list, hydroserver_list = build_synthetic_resource(file_count)
+            elapsed, plan = time_reconcile(file_list, geoserver_list, hydroserver_list, options["repeat"])
+            results.append((file_count, elapsed))
+            self.stdout.write(
+                f"{file_count} files, {len(geoserver_list) + len(hydroserver_list)} published layers: "
+                f"{elapsed * 1000:.1f} ms ({elapsed / file_count * 1e6:.2f} us/file), "
+                f"register {len(plan[0]) + len(plan[2])}, unregister {len(plan[1]) + len(plan[3])}"
+            )
+
+        (small_count, small_time), (large_count, large_time) = results
+        self.stdout.write(
+            f"Scaling: {large_count / small_count:.0f}x files took {large_time / small_time:.1f}x time."
+        )
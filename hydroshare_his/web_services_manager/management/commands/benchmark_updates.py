@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from web_services_manager import benchmark
+
+
+class Command(BaseCommand):
+    help = "Times post_update_services against local fake GeoServer, HydroServer, and HydroShare servers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,50,1000", help="Comma-separated layer counts per resource.")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of timed updates per size.")
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds each fake server waits before responding.")
+        parser.add_argument("--engines", default=None, help="Comma-separated update engines to compare (threads, asyncio). Defaults to update_engine.")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of fake server requests answered with 503.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        engines = [engine.strip() for engine in (options["engines"] or "").split(",") if engine.strip()] or [None]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            client = APIClient()
+            client.force_authenticate(User.objects.create_superuser("benchmark", "benchmark@localhost", "benchmark"))
+
+            def post_update(res_id):
+                response = client.post(f"/his/services/update/{res_id}/")
+                return response.status_code, response.json()
+
+            for engine in engines:
+                benchmark.run_benchmark(
+                    post_update,
+                    sizes,
+                    options["repeat"],
+                    latency=options["latency"],
+                    failure_rate=options["failure_rate"],
+                    engine=engine,
+                    write=self.stdout.write
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
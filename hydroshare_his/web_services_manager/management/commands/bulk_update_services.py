@@ -0,0 +1,33 @@
+import itertools
+import sys
+from django.core.management.base import BaseCommand
+from web_services_manager import bulk
+
+
+class Command(BaseCommand):
+    help = "Updates web services for many resources and writes one JSON result per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource_ids", nargs="*", help="Resources to update.")
+        parser.add_argument("--file", default=None, help="File with one resource id per line, or - for stdin.")
+        parser.add_argument("--workers", type=int, default=None, help="Number of resources updated at once.")
+        parser.add_argument("--force", action="store_true", help="Reconcile resources even if their files are unchanged.")
+
+    def handle(self, *args, **options):
+        lines = options["resource_ids"]
+
+        if options["file"] == "-":
+            lines = itertools.chain(lines, sys.stdin)
+        elif options["file"]:
+            with open(options["file"]) as id_file:
+                lines = lines + id_file.readlines()
+
+        results = bulk.stream_bulk_update(
+            bulk.parse_resource_ids(lines),
+            workers=options["workers"],
+            force=options["force"]
+        )
+
+        for line in results:
+            self.stdout.write(line, ending="")
+            self.stdout.flush()
@@ -0,0 +1,50 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from web_services_manager import registry
+from web_services_manager import coalesce
+from web_services_manager import pipeline
+from web_services_manager.models import PublishedResource
+
+
+class Command(BaseCommand):
+    help = "Compares the registry of published services with GeoServer and HydroServer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource_ids", nargs="*", help="Resources to check. Defaults to every recorded resource.")
+        parser.add_argument("--interval", type=int, default=None, help="Repeat the check every INTERVAL seconds.")
+        parser.add_argument("--repair", action="store_true", help="Re-publish resources whose backends have drifted.")
+
+    def check(self, resource_ids, repair):
+        if not resource_ids:
+            resource_ids = list(PublishedResource.objects.values_list("resource_id", flat=True))
+
+        drifted = 0
+
+        for res_id in resource_ids:
+            try:
+                drift, unknown = registry.check_drift(res_id)
+            except PublishedResource.DoesNotExist:
+                self.stderr.write(f"{res_id}: not recorded")
+                continue
+
+            if unknown:
+                self.stderr.write(f"{res_id}: unknown on {', '.join(unknown)}")
+
+            if not drift:
+                continue
+
+            drifted += 1
+            self.stdout.write(f"{res_id}: {json.dumps(drift)}")
+
+            if repair:
+                coalesce.run_coalesced(res_id, pipeline.update_resource_services, force=True)
+
+        self.stdout.write(f"Checked {len(resource_ids)} resource(s), {drifted} drifted.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.check(options["resource_ids"], options["repair"])
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+import itertools
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from web_services_manager import bulk
+from web_services_manager import catalog
+
+
+class Command(BaseCommand):
+    help = "Writes GeoServer layers of many resources straight into GeoServer's data directory and reloads its catalog once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource_ids", nargs="*", help="Resources to write.")
+        parser.add_argument("--file", default=None, help="File with one resource id per line, or - for stdin.")
+        parser.add_argument("--catalog-dir", default=None, help="GeoServer data directory. Defaults to geoserver_catalog_dir.")
+        parser.add_argument("--workers", type=int, default=None, help="Number of resources written at once.")
+        parser.add_argument("--overwrite", action="store_true", help="Replace workspaces that already exist.")
+        parser.add_argument("--no-reload", action="store_true", help="Only write and check the files, without recording or reloading anything.")
+        parser.add_argument("--publish-skipped", action="store_true", help="Update resources with skipped layers through the REST API after reloading.")
+
+    def handle(self, *args, **options):
+        lines = options["resource_ids"]
+
+        if options["file"] == "-":
+            lines = itertools.chain(lines, sys.stdin)
+        elif options["file"]:
+            with open(options["file"]) as id_file:
+                lines = lines + id_file.readlines()
+
+        results = catalog.stream_catalog_generation(
+            bulk.parse_resource_ids(lines),
+            catalog_dir=options["catalog_dir"],
+            workers=options["workers"],
+            overwrite=options["overwrite"],
+            reload=not options["no_reload"],
+            publish_skipped=options["publish_skipped"]
+        )
+
+        try:
+            for line in results:
+                self.stdout.write(line, ending="")
+                self.stdout.flush()
+        except catalog.CatalogError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from web_services_manager import jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued asynchronous service update jobs, and jobs left running by a stopped worker."
+
+    def handle(self, *args, **options):
+        job_ids = jobs.process_queued_jobs()
+        self.stdout.write(f"Processed {len(job_ids)} queued update job(s).")
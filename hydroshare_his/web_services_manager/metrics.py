@@ -0,0 +1,237 @@
+import glob
+import json
+import os
+import threading
+import time
+from hydroshare_his import settings
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Metric name: (type, help text)
+METRICS = {
+    "his_backend_requests_total": (
+        "counter", "Outbound requests by backend, operation, method, and status code."
+    ),
+    "his_backend_request_duration_seconds": (
+        "histogram", "Outbound request wall time by backend and operation."
+    ),
+    "his_updates_total": (
+        "counter", "Resource updates by outcome."
+    ),
+    "his_update_duration_seconds": (
+        "histogram", "Resource update wall time by outcome."
+    ),
+    "his_update_layers_total": (
+        "counter", "Layers registered or failed by resource updates, by backend."
+    ),
+    "his_admissions_total": (
+        "counter", "Updates admitted or rejected by admission control, by priority."
+    ),
+    "his_admission_wait_seconds": (
+        "histogram", "Time admitted updates waited for an update slot, by priority."
+    ),
+}
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_pid = None
+_last_flush = 0.0
+
+
+def reset_if_forked():
+    """
+    Starts empty metrics in a new worker process, which must not report its parent's values as its own.
+    """
+
+    global _pid, _last_flush
+
+    if _pid != os.getpid():
+        _counters.clear()
+        _histograms.clear()
+        _pid = os.getpid()
+        _last_flush = 0.0
+
+
+def get_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, labels, value=1):
+    with _lock:
+        reset_if_forked()
+        key = get_key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+    flush(force=False)
+
+
+def observe(name, labels, value):
+    with _lock:
+        reset_if_forked()
+        key = get_key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[0][i] += 1
+                break
+        else:
+            histogram[0][-1] += 1
+        histogram[1] += value
+        histogram[2] += 1
+    flush(force=False)
+
+
+def record_request(backend, operation, method, status, duration):
+    """
+    Records one outbound request to a backend.
+    """
+
+    labels = {"backend": backend, "operation": operation}
+    increment("his_backend_requests_total", dict(labels, method=method, status=str(status)))
+    observe("his_backend_request_duration_seconds", labels, duration)
+
+
+def record_update(outcome, duration, registered_services=None):
+    """
+    Records the outcome, wall time, and layer results of one resource update.
+    """
+
+    increment("his_updates_total", {"outcome": outcome})
+    observe("his_update_duration_seconds", {"outcome": outcome}, duration)
+
+    for backend, results in (registered_services or {}).items():
+        registered = sum(1 for i in results if i["success"] is True)
+        if registered:
+            increment("his_update_layers_total", {"backend": backend, "result": "registered"}, registered)
+        if len(results) - registered:
+            increment("his_update_layers_total", {"backend": backend, "result": "failed"}, len(results) - registered)
+
+    flush()
+
+
+def get_snapshot():
+    with _lock:
+        reset_if_forked()
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [
+                [name, labels, buckets, total, count]
+                for (name, labels), (buckets, total, count) in _histograms.items()
+            ]
+        }
+
+
+def flush(force=True):
+    """
+    Writes this process's metrics to metrics_dir, at most once per metrics_flush_interval unless forced.
+    """
+
+    global _last_flush
+
+    metrics_dir = settings.HIS.get("metrics_dir")
+
+    if metrics_dir is None:
+        return
+
+    now = time.monotonic()
+
+    with _lock:
+        if not force and now - _last_flush < settings.HIS.get("metrics_flush_interval", 1):
+            return
+        _last_flush = now
+
+    snapshot = get_snapshot()
+    path = os.path.join(metrics_dir, f"{os.getpid()}.json")
+    temporary_path = f"{path}.{threading.get_ident()}.tmp"
+
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+def load_snapshots():
+    """
+    Reads the metrics of every worker process, including this one's current values.
+    """
+
+    metrics_dir = settings.HIS.get("metrics_dir")
+
+    if metrics_dir is None:
+        return [get_snapshot()]
+
+    flush()
+    snapshots = []
+
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            with open(path) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (OSError, ValueError):
+            continue
+
+    return snapshots
+
+
+def merge_snapshots(snapshots):
+    counters = {}
+    histograms = {}
+
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(i) for i in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = (name, tuple(tuple(i) for i in labels))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+
+    return counters, histograms
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + "}"
+
+
+def render_metrics():
+    """
+    Renders the metrics of all worker processes in the Prometheus text exposition format.
+    """
+
+    counters, histograms = merge_snapshots(load_snapshots())
+    lines = []
+
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+        for (key_name, labels), value in sorted(counters.items()):
+            if key_name == name:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (key_name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.5 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceUpdate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.CharField(max_length=255, unique=True)),
+                ('requested', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('last_requested', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.CharField(blank=True, default='', max_length=64)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('result', models.TextField(blank=True, default='')),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
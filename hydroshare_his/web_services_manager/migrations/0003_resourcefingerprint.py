@@ -0,0 +1,28 @@
+# Generated by Django 2.1.5 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0002_resourceupdate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.CharField(max_length=255, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('response', models.TextField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='updatejob',
+            name='force',
+            field=models.BooleanField(default=False),
+        ),
+    ]
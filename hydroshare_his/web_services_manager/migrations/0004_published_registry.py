@@ -0,0 +1,48 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0003_resourcefingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.CharField(max_length=255, unique=True)),
+                ('workspace_id', models.CharField(blank=True, default='', max_length=255)),
+                ('network_id', models.CharField(blank=True, default='', max_length=255)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('drift_checked', models.DateTimeField(blank=True, null=True)),
+                ('drift', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PublishedLayer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backend', models.CharField(choices=[('geoserver', 'GeoServer'), ('hydroserver', 'HydroServer')], max_length=16)),
+                ('layer_name', models.CharField(max_length=255)),
+                ('layer_type', models.CharField(max_length=32)),
+                ('store_type', models.CharField(blank=True, default='', max_length=32)),
+                ('min_x', models.FloatField(blank=True, null=True)),
+                ('min_y', models.FloatField(blank=True, null=True)),
+                ('max_x', models.FloatField(blank=True, null=True)),
+                ('max_y', models.FloatField(blank=True, null=True)),
+                ('crs', models.CharField(blank=True, default='', max_length=255)),
+                ('service_url', models.TextField()),
+                ('registered', models.DateTimeField(auto_now=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='layers', to='web_services_manager.PublishedResource')),
+            ],
+            options={
+                'ordering': ('id',),
+                'unique_together': {('resource', 'backend', 'layer_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.5 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0004_published_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RasterStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('hs_path', models.TextField()),
+                ('maximum', models.CharField(max_length=64)),
+                ('minimum', models.CharField(max_length=64)),
+                ('nodata', models.CharField(max_length=64)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
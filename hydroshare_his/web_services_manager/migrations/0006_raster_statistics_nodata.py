@@ -0,0 +1,18 @@
+# Generated by Django 2.1.5 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0005_raster_statistics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rasterstatistics',
+            name='nodata',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0006_raster_statistics_nodata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackendCircuit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backend', models.CharField(max_length=16, unique=True)),
+                ('state', models.CharField(choices=[('closed', 'Closed'), ('open', 'Open'), ('half_open', 'Half open')], default='closed', max_length=16)),
+                ('opened_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
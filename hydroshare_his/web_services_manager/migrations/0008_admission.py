@@ -0,0 +1,31 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0007_backend_circuit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpdateSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.IntegerField(unique=True)),
+                ('owner', models.CharField(blank=True, default='', max_length=64)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UpdateTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.IntegerField(choices=[(0, 'Interactive'), (1, 'Bulk')], default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0008_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishedlayer',
+            name='file_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.5 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0009_published_layer_file_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updatejob',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.5 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_services_manager', '0010_updatejob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourceupdate',
+            name='force_requested',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,210 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import uuid
 from django.db import models
 
-# Create your models here.
+
+class UpdateJob(models.Model):
+    """
+    Tracks an asynchronous service update for a HydroShare resource.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    resource_id = models.CharField(max_length=255, db_index=True)
+    force = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    layers_total = models.IntegerField(default=0)
+    layers_completed = models.IntegerField(default=0)
+    result = models.TextField(blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"{self.resource_id} ({self.status})"
+
+
+class ResourceUpdate(models.Model):
+    """
+    Coordinates service updates for a resource across worker processes.
+
+    requested counts update requests received, completed is the highest request number
+    covered by a finished run, force_requested is the number of the latest request that asked for a
+    forced run, and owner identifies the caller currently running an update.
+    """
+
+    resource_id = models.CharField(max_length=255, unique=True)
+    requested = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    force_requested = models.IntegerField(default=0)
+    last_requested = models.DateTimeField(null=True, blank=True)
+    owner = models.CharField(max_length=64, blank=True, default="")
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    result = models.TextField(blank=True, default="")
+    error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return self.resource_id
+
+
+class ResourceFingerprint(models.Model):
+    """
+    Stores the file list fingerprint and response of a resource's last successful update.
+    """
+
+    resource_id = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    response = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.resource_id
+
+
+class PublishedResource(models.Model):
+    """
+    A HydroShare resource with web services published on GeoServer or HydroServer.
+    """
+
+    resource_id = models.CharField(max_length=255, unique=True)
+    workspace_id = models.CharField(max_length=255, blank=True, default="")
+    network_id = models.CharField(max_length=255, blank=True, default="")
+    updated = models.DateTimeField(auto_now=True)
+    drift_checked = models.DateTimeField(null=True, blank=True)
+    drift = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return self.resource_id
+
+
+class PublishedLayer(models.Model):
+    """
+    A layer or database registered for a resource, as recorded when it was published.
+
+    file_version identifies the content of the published file, so a changed file is published again.
+    """
+
+    GEOSERVER = "geoserver"
+    HYDROSERVER = "hydroserver"
+
+    BACKEND_CHOICES = (
+        (GEOSERVER, "GeoServer"),
+        (HYDROSERVER, "HydroServer"),
+    )
+
+    resource = models.ForeignKey(PublishedResource, related_name="layers", on_delete=models.CASCADE)
+    backend = models.CharField(max_length=16, choices=BACKEND_CHOICES)
+    layer_name = models.CharField(max_length=255)
+    layer_type = models.CharField(max_length=32)
+    store_type = models.CharField(max_length=32, blank=True, default="")
+    min_x = models.FloatField(null=True, blank=True)
+    min_y = models.FloatField(null=True, blank=True)
+    max_x = models.FloatField(null=True, blank=True)
+    max_y = models.FloatField(null=True, blank=True)
+    crs = models.CharField(max_length=255, blank=True, default="")
+    service_url = models.TextField()
+    file_version = models.CharField(max_length=64, blank=True, default="")
+    registered = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("resource", "backend", "layer_name")
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"{self.resource.resource_id}: {self.layer_name}"
+
+
+class RasterStatistics(models.Model):
+    """
+    Caches the statistics read from a raster's VRT sidecar, keyed by the raster's path, checksum, and
+    modified time so a changed file is never served stale statistics.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    hs_path = models.TextField()
+    maximum = models.CharField(max_length=64)
+    minimum = models.CharField(max_length=64)
+    nodata = models.CharField(max_length=64, null=True, blank=True)
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.hs_path
+
+
+class BackendCircuit(models.Model):
+    """
+    The circuit breaker state of a backend, shared by all worker processes.
+
+    opened_at is when the circuit was opened, or when its half-open probe was sent.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    STATE_CHOICES = (
+        (CLOSED, "Closed"),
+        (OPEN, "Open"),
+        (HALF_OPEN, "Half open"),
+    )
+
+    backend = models.CharField(max_length=16, unique=True)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=CLOSED)
+    opened_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.backend} ({self.state})"
+
+
+class UpdateSlot(models.Model):
+    """
+    One of the max_concurrent_updates slots an update must hold while it runs, shared by all
+    worker processes. owner is empty while the slot is free.
+    """
+
+    slot = models.IntegerField(unique=True)
+    owner = models.CharField(max_length=64, blank=True, default="")
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return str(self.slot)
+
+
+class UpdateTicket(models.Model):
+    """
+    An update request waiting for a free update slot. Lower priorities are admitted first, then
+    older tickets.
+    """
+
+    INTERACTIVE = 0
+    BULK = 1
+
+    PRIORITY_CHOICES = (
+        (INTERACTIVE, "Interactive"),
+        (BULK, "Bulk"),
+    )
+
+    priority = models.IntegerField(choices=PRIORITY_CHOICES, default=INTERACTIVE)
+    created = models.DateTimeField(auto_now_add=True)
+    heartbeat = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.get_priority_display()})"
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import urllib.parse
+from collections import OrderedDict
+from hydroshare_his import settings
+
+
+class ODM2Error(Exception):
+    """
+    Raised when a time series database cannot be served by HydroServer.
+    """
+
+
+SQLITE_HEADER = b"SQLite format 3\0"
+
+# Tables and columns HydroServer reads from an ODM2 database.
+REQUIRED_COLUMNS = {
+    "SamplingFeatures": ("SamplingFeatureID", "SamplingFeatureCode"),
+    "Sites": ("SamplingFeatureID", "Latitude", "Longitude"),
+    "Variables": ("VariableID", "VariableCode"),
+    "Units": ("UnitsID",),
+    "Methods": ("MethodID",),
+    "ProcessingLevels": ("ProcessingLevelID",),
+    "Actions": ("ActionID", "MethodID"),
+    "FeatureActions": ("FeatureActionID", "SamplingFeatureID", "ActionID"),
+    "Results": ("ResultID", "FeatureActionID", "VariableID", "UnitsID", "ProcessingLevelID"),
+    "TimeSeriesResults": ("ResultID",),
+    "TimeSeriesResultValues": ("ResultID", "DataValue", "ValueDateTime"),
+}
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def connect(path):
+    """
+    Opens a database read-only in immutable mode, so no lock or journal file is touched on the
+    shared data directory.
+    """
+
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro&immutable=1"
+
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def check_schema(connection):
+    """
+    Checks that every table and column in REQUIRED_COLUMNS exists, ignoring case as SQLite does.
+    """
+
+    tables = {
+        name.lower(): name
+        for name, in connection.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")
+    }
+
+    for table, columns in REQUIRED_COLUMNS.items():
+        if table.lower() not in tables:
+            raise ODM2Error(f"missing ODM2 table {table}")
+        found = {row[1].lower() for row in connection.execute(f'PRAGMA table_info("{tables[table.lower()]}")')}
+        for column in columns:
+            if column.lower() not in found:
+                raise ODM2Error(f"missing column {table}.{column}")
+
+
+def read_summary(path):
+    """
+    Validates an ODM2 SQLite database and counts its sites, variables, and time series results.
+
+    Raises ODM2Error if the file is not an ODM2 database or has no time series to serve.
+    """
+
+    try:
+        with open(path, "rb") as database_file:
+            if database_file.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+                raise ODM2Error("not a SQLite database")
+    except OSError as e:
+        raise ODM2Error(f"unreadable file ({e.strerror})")
+
+    try:
+        connection = connect(path)
+        try:
+            check_schema(connection)
+            summary = {
+                "sites": connection.execute("SELECT COUNT(*) FROM Sites").fetchone()[0],
+                "variables": connection.execute("SELECT COUNT(*) FROM Variables").fetchone()[0],
+                "results": connection.execute("SELECT COUNT(*) FROM TimeSeriesResults").fetchone()[0]
+            }
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        raise ODM2Error(f"unreadable database ({e})")
+
+    if not summary["sites"] or not summary["results"]:
+        raise ODM2Error("no time series")
+
+    return summary
+
+
+def get_summary(path):
+    """
+    Gets the summary of a database from read_summary, cached in this process by path, modified time,
+    and size. Failures are cached too, so a broken database is not opened again until it changes.
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ODM2Error(f"unreadable file ({e.strerror})")
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            summary, error = _summaries[key]
+            if error is not None:
+                raise ODM2Error(error)
+            return dict(summary)
+
+    try:
+        summary, error = read_summary(path), None
+    except ODM2Error as e:
+        summary, error = None, str(e)
+
+    with _summaries_lock:
+        _summaries[key] = (summary, error)
+        while len(_summaries) > settings.HIS.get("odm2_summary_cache_size", 10000):
+            _summaries.popitem(last=False)
+
+    if error is not None:
+        raise ODM2Error(error)
+
+    return dict(summary)
+
+
+def get_local_summary(db):
+    """
+    Summarizes a time series database in hydroserver_data_dir, or returns None if the file is not
+    available locally.
+    """
+
+    hydroserver_data_dir = settings.HIS.get("hydroserver_data_dir")
+
+    if hydroserver_data_dir is None:
+        return None
+
+    path = os.path.join(hydroserver_data_dir, db["hs_path"])
+
+    if not os.path.isfile(path):
+        return None
+
+    return get_summary(path)
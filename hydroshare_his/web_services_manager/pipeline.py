@@ -0,0 +1,108 @@
+import time
+from django.core.exceptions import ImproperlyConfigured
+from hydroshare_his import settings
+from web_services_manager import utilities
+from web_services_manager import registration
+from web_services_manager import fingerprints
+from web_services_manager import classification
+from web_services_manager import registry
+from web_services_manager import metrics
+from web_services_manager import tracing
+from web_services_manager import async_pipeline
+from web_services_manager import backends
+
+
+def update_resource_services(res_id, progress=None, force=False, trace=False):
+    """
+    Checks HydroShare resource for data that can be exposed via WMS, WFS, WCS, or WOF web services,
+    publishes those services, then builds the response returned to HydroShare.
+
+    If the resource's file list is unchanged since the last fully successful update, the stored
+    response is returned without contacting GeoServer or HydroServer, unless force is set.
+
+    progress, if given, is called with (completed, total) as layers finish registering. With trace
+    set, or trace_updates enabled, a trace of the update is saved to trace_dir. The update runs on
+    the engine selected by update_engine.
+    """
+
+    start = time.perf_counter()
+    publish = get_publish_function()
+
+    try:
+        if trace or settings.HIS.get("trace_updates", False):
+            result = tracing.run_traced(res_id, publish, res_id, progress, force)
+        else:
+            result = publish(res_id, progress, force)
+        outcome, response, registered_services = result
+    except Exception:
+        metrics.record_update("error", time.perf_counter() - start)
+        raise
+
+    metrics.record_update(outcome, time.perf_counter() - start, registered_services)
+
+    return response
+
+
+def get_publish_function():
+    """
+    Gets the publish_resource_services implementation of the configured update engine: "threads"
+    runs backend calls in per-backend thread pools, "asyncio" on an event loop shared by the process.
+    """
+
+    engine = settings.HIS.get("update_engine", "threads")
+
+    if engine == "threads":
+        return publish_resource_services
+
+    if engine == "asyncio":
+        return async_pipeline.publish_resource_services
+
+    raise ImproperlyConfigured(f"Unknown update engine: {engine}")
+
+
+def publish_resource_services(res_id, progress, force):
+    """
+    Runs update_resource_services and returns (outcome, response, registered services).
+    """
+
+    file_list = utilities.get_file_list(res_id)
+
+    if file_list is None:
+
+        fingerprints.clear_response(res_id)
+
+        unavailable = []
+        for backend in backends.BACKENDS:
+            if registration.remove_resource_services(backend, res_id):
+                registry.clear_backend(res_id, backend.name)
+            else:
+                unavailable.append(backend.name)
+
+        return "unpublished", registration.finish_unpublish(unavailable), None
+
+    with tracing.span("file_list") as attributes:
+        fingerprint = utilities.FileListFingerprint()
+        layers = list(classification.classify_files(fingerprint.track(file_list)))
+        attributes["files"] = fingerprint.count
+        attributes["layers"] = len(layers)
+
+    if not force:
+        response = registration.get_cached_response(res_id, fingerprint)
+        if response is not None:
+            return "cached", response, None
+
+    with tracing.span("fetch_inventories"):
+        inventories = registration.fetch_inventories(res_id)
+
+    db_list_response = registration.reconcile(res_id, layers, inventories)
+
+    with tracing.span("registration"):
+        registered_services = registration.run_registration(res_id, db_list_response, inventories, progress=progress)
+
+    for backend in registration.get_empty_backends(backends.BACKENDS, inventories):
+        if registration.remove_resource_services(backend, res_id):
+            registry.clear_backend(res_id, backend.name)
+
+    outcome, response = registration.finish_update(res_id, fingerprint, registered_services, inventories)
+
+    return outcome, response, registered_services
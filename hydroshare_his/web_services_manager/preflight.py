@@ -0,0 +1,117 @@
+from hydroshare_his import settings
+from web_services_manager import odm2
+from web_services_manager import shapefile
+from web_services_manager import tiff
+from web_services_manager import tracing
+from web_services_manager import utilities
+
+
+def get_reason(error):
+    """
+    Gets the reason a file failed a check from its error, to be put in parentheses in a message.
+    """
+
+    return str(error).rstrip(".")
+
+
+def get_rejection_message(target, error):
+    return f"Error: Unable to register {target} ({get_reason(error)})."
+
+
+def check_geoserver_layer(db):
+    """
+    Checks a GeoServer layer's files in geoserver_data_dir before anything is sent to GeoServer.
+
+    Returns the failed registration result of a layer that cannot be published, or None. When the
+    files describe the layer's native bounding box, it is stored in db["local_bbox"] so
+    register_geoserver_db does not have to read it back from GeoServer. Layers whose files are not
+    available locally are left for GeoServer to check.
+    """
+
+    if not settings.HIS.get("geoserver_preflight", True):
+        return None
+
+    if db["layer_type"] == "GeographicFeature":
+        return check_shapefile(db)
+
+    if db["layer_type"] == "GeographicRaster":
+        return check_geotiff(db)
+
+    return None
+
+
+def check_shapefile(db):
+    with tracing.span("shapefile_preflight", hs_path=db["hs_path"]) as attributes:
+        try:
+            summary = shapefile.get_local_summary(db)
+        except shapefile.ShapefileError as e:
+            attributes["rejected"] = get_reason(e)
+            return utilities.get_geoserver_layer_info(db, get_rejection_message("GeoServer layer", e))
+
+        if summary is None:
+            return None
+
+        attributes["geometry_type"] = summary.geometry_type
+        attributes["features"] = summary.feature_count
+
+    if summary.crs is not None:
+        minx, miny, maxx, maxy = summary.bbox
+        db["local_bbox"] = {"minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy, "crs": summary.crs}
+
+    return None
+
+
+def check_geotiff(db):
+    """
+    Rejects GeoTIFFs GeoServer cannot import, and stores warnings about layouts that render slowly
+    in db["warnings"].
+    """
+
+    with tracing.span("geotiff_preflight", hs_path=db["hs_path"]) as attributes:
+        try:
+            header = tiff.get_local_header(db)
+        except tiff.TiffError as e:
+            attributes["rejected"] = get_reason(e)
+            return utilities.get_geoserver_layer_info(db, get_rejection_message("GeoServer layer", e))
+
+        if header is None:
+            return None
+
+        attributes["compression"] = header.compression
+        attributes["tiled"] = header.tiled
+        attributes["overviews"] = header.overviews
+
+    if header.warnings:
+        db["warnings"] = header.warnings
+
+    if header.crs is not None:
+        minx, miny, maxx, maxy = header.bbox
+        db["local_bbox"] = {"minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy, "crs": header.crs}
+
+    return None
+
+
+def check_hydroserver_database(db):
+    """
+    Checks a time series database in hydroserver_data_dir before it is sent to HydroServer.
+
+    Returns the failed registration result of a database that cannot be served, or None. The
+    database's catalog summary is stored in db["catalog"]. Databases that are not available locally
+    are left for HydroServer to check.
+    """
+
+    if not settings.HIS.get("hydroserver_preflight", True):
+        return None
+
+    with tracing.span("odm2_preflight", hs_path=db["hs_path"]) as attributes:
+        try:
+            summary = odm2.get_local_summary(db)
+        except odm2.ODM2Error as e:
+            attributes["rejected"] = get_reason(e)
+            return {"success": False, "type": "Timeseries", "message": get_rejection_message("Water Data Server database", e)}
+
+        if summary is not None:
+            attributes.update(summary)
+            db["catalog"] = summary
+
+    return None
@@ -0,0 +1,108 @@
+import hashlib
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager.models import RasterStatistics
+
+
+# Keeps key__in and id__in lookups below SQLite's limit on query parameters.
+QUERY_BATCH_SIZE = 500
+
+
+def get_batches(items, size=QUERY_BATCH_SIZE):
+    items = list(items)
+
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_stats_key(db):
+    """
+    Gets the cache key of a raster layer, or None if HydroShare did not report a checksum for it.
+    """
+
+    if not db.get("checksum"):
+        return None
+
+    key = "\0".join((db["hs_path"], db["checksum"], str(db.get("modified_time") or "")))
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_cached_stats(db_list):
+    """
+    Sets db["raster_stats"] to the cached (maximum, minimum, nodata) of each raster layer that has them.
+    """
+
+    keys = {}
+
+    for db in db_list:
+        key = get_stats_key(db)
+        if key is not None:
+            keys.setdefault(key, []).append(db)
+
+    if not keys:
+        return
+
+    now = timezone.now()
+
+    for batch in get_batches(keys):
+        cached = RasterStatistics.objects.filter(key__in=batch).values_list("key", "maximum", "minimum", "nodata")
+        hits = []
+
+        for key, maximum, minimum, nodata in cached:
+            hits.append(key)
+            for db in keys[key]:
+                db["raster_stats"] = (maximum, minimum, nodata)
+                db["raster_stats_cached"] = True
+
+        if hits:
+            RasterStatistics.objects.filter(key__in=hits).update(last_used=now)
+
+
+def save_stats(db_list):
+    """
+    Caches statistics read from VRT files during registration, replacing any kept for an older
+    version of the same raster, then evicts the least recently used entries beyond raster_stats_cache_size.
+    """
+
+    now = timezone.now()
+    saved = 0
+
+    for db in db_list:
+        key = get_stats_key(db)
+        if key is None or db.get("raster_stats") is None or db.get("raster_stats_cached"):
+            continue
+
+        maximum, minimum, nodata = db["raster_stats"]
+        RasterStatistics.objects.filter(hs_path=db["hs_path"]).exclude(key=key).delete()
+        updated = RasterStatistics.objects.filter(key=key).update(last_used=now)
+        if not updated:
+            RasterStatistics.objects.create(
+                key=key,
+                hs_path=db["hs_path"],
+                maximum=maximum,
+                minimum=minimum,
+                nodata=nodata,
+                last_used=now
+            )
+        db["raster_stats_cached"] = True
+        saved += 1
+
+    if saved:
+        evict_stats(settings.HIS.get("raster_stats_cache_size", 100000))
+
+
+def evict_stats(max_entries):
+    """
+    Removes the least recently used statistics beyond max_entries.
+    """
+
+    if max_entries is None:
+        return
+
+    evicted = list(
+        RasterStatistics.objects.order_by("-last_used", "-id").values_list("id", flat=True)[max_entries:]
+    )
+
+    for batch in get_batches(evicted):
+        RasterStatistics.objects.filter(id__in=batch).delete()
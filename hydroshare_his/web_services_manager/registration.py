@@ -0,0 +1,332 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hydroshare_his import settings
+from web_services_manager import backends
+from web_services_manager import circuit
+from web_services_manager import fingerprints
+from web_services_manager import raster_stats
+from web_services_manager import registry
+from web_services_manager import tracing
+from web_services_manager import utilities
+
+
+_executors = {}
+_executors_pid = None
+_executors_lock = threading.Lock()
+
+
+def get_executor(backend):
+    """
+    Gets the shared executor that bounds concurrent calls to a backend.
+    """
+
+    global _executors_pid
+
+    with _executors_lock:
+        if _executors_pid != os.getpid():
+            _executors.clear()
+            _executors_pid = os.getpid()
+        if backend not in _executors:
+            _executors[backend] = ThreadPoolExecutor(
+                max_workers=settings.HIS.get(f"{backend}_concurrency", 4),
+                thread_name_prefix=f"his-{backend}"
+            )
+        return _executors[backend]
+
+
+def is_removed(response):
+    """
+    Checks whether a DELETE left nothing behind on the backend.
+    """
+
+    return response is None or response.status_code in (200, 404)
+
+
+# The registration plan. Both update engines follow it, each making the backend calls it lists
+# through its own backends (see backends.BACKENDS and backends.ASYNC_BACKENDS). These functions
+# make no backend calls; the asyncio engine runs them in the event loop's thread pool.
+
+
+def get_cached_response(res_id, fingerprint):
+    """
+    Gets the stored response of an unchanged file list, or None.
+    """
+
+    with tracing.span("cached_response") as attributes:
+        response = fingerprints.get_cached_response(res_id, fingerprint.hexdigest())
+        attributes["hit"] = response is not None
+
+    return response
+
+
+def reconcile(res_id, layers, inventories):
+    """
+    Lists the containers to create and the layers to register and unregister on each backend.
+    """
+
+    with tracing.span("reconcile") as attributes:
+        db_list = utilities.get_database_list(res_id, layers, *inventories)
+        for backend in ("geoserver", "hydroserver"):
+            attributes[f"{backend}_register"] = len(db_list[backend]["register"])
+            attributes[f"{backend}_unregister"] = len(db_list[backend]["unregister"])
+
+    return db_list
+
+
+def get_container_plan(db_list, backend_list, inventories):
+    """
+    Lists (backend, inventory) for every workspace or network to create.
+    """
+
+    return [
+        (backend, backend_inventory) for backend, backend_inventory in zip(backend_list, inventories)
+        if db_list[backend.name][backend.create_container_key]
+    ]
+
+
+def get_layer_plan(db_list, backend_list, inventories, action):
+    """
+    Lists (backend, db, inventory) for every layer to "register" or "unregister", in db_list order.
+    """
+
+    return [
+        (backend, db, backend_inventory) for backend, backend_inventory in zip(backend_list, inventories)
+        for db in db_list[backend.name][action]
+    ]
+
+
+def clear_created_containers(res_id, container_plan):
+    """
+    Drops registry records of containers that were just created, since nothing is in them yet.
+    """
+
+    for backend, backend_inventory in container_plan:
+        if backend_inventory.available:
+            registry.clear_backend(res_id, backend.name)
+
+
+def remove_layers(res_id, unregister_plan, removed):
+    """
+    Drops registry records of unregistered layers that are gone from their backend.
+    """
+
+    for (backend, db, backend_inventory), is_layer_removed in zip(unregister_plan, removed):
+        if is_layer_removed:
+            registry.remove_layer(res_id, backend.name, backend.get_layer_name(db))
+
+
+def load_raster_stats(db_list):
+    with tracing.span("raster_stats.load", layers=len(db_list["geoserver"]["register"])):
+        raster_stats.load_cached_stats(db_list["geoserver"]["register"])
+
+
+def record_registration(res_id, db_list, register_plan, results):
+    """
+    Caches raster statistics, records registered layers in the registry of published services,
+    and returns the results by backend, in the order of the register lists in db_list.
+    """
+
+    with tracing.span("raster_stats.save"):
+        raster_stats.save_stats(db_list["geoserver"]["register"])
+
+    registered_services = {"geoserver": [], "hydroserver": []}
+
+    with tracing.span("registry.record"):
+        for (backend, db, backend_inventory), db_info in zip(register_plan, results):
+            if db_info["success"] is True:
+                backend.record_layer(res_id, db, db_info)
+            registered_services[backend.name].append(db_info)
+
+    return registered_services
+
+
+def get_empty_backends(backend_list, inventories):
+    """
+    Lists backends whose workspace or network exists but no longer holds any layer.
+    """
+
+    return [
+        backend for backend, backend_inventory in zip(backend_list, inventories)
+        if backend.is_empty(backend_inventory)
+    ]
+
+
+def finish_update(res_id, fingerprint, registered_services, inventories):
+    """
+    Builds the response returned to HydroShare and stores it if every layer was published.
+    Returns (outcome, response).
+    """
+
+    geoserver_inventory, hydroserver_inventory = inventories
+
+    response = utilities.build_hydroshare_response(
+        res_id, registered_services, geoserver_inventory.get_layer_list(), hydroserver_inventory.get_database_list()
+    )
+
+    if all(i["success"] for i in response["content"]):
+        fingerprints.save_response(res_id, fingerprint.hexdigest(), response)
+        return "succeeded", response
+
+    fingerprints.clear_response(res_id)
+
+    return "partial", response
+
+
+def finish_unpublish(unavailable):
+    """
+    Builds the response of a resource that is no longer public, once its services are removed.
+    Raises circuit.BackendUnavailableError if a backend could not be cleared.
+    """
+
+    if unavailable:
+        raise circuit.BackendUnavailableError(unavailable[0])
+
+    return {
+        "resource": {},
+        "content": []
+    }
+
+
+# The threads engine: backend calls block, and layers run in per-backend thread pools.
+
+
+def fetch_inventories(res_id):
+    """
+    Fetches the GeoServer and HydroServer inventories of a resource in parallel.
+    """
+
+    return tuple(wait_for([
+        tracing.submit(get_executor(backend.name), backend.fetch_inventory, res_id)
+        for backend in backends.BACKENDS
+    ]))
+
+
+def create_container(backend, res_id, backend_inventory):
+    try:
+        with tracing.span(backend.create_container_span):
+            backend.create_container(res_id)
+    except circuit.UNAVAILABLE_ERRORS:
+        backend_inventory.available = False
+        return
+    backend.reset_inventory(backend_inventory)
+
+
+def register_layer(backend, res_id, db, backend_inventory):
+    """
+    Registers a layer and removes it again if registration fails.
+
+    Fails immediately if the backend is unavailable, or without contacting it if the layer's files
+    fail the local preflight checks.
+    """
+
+    if not backend_inventory.available:
+        return backend.get_unavailable_info(db)
+
+    with tracing.span(f"register_{backend.name}_layer", **backend.get_span_attributes(db)) as attributes:
+        db_info = backend.check(db)
+
+        if db_info is not None:
+            attributes["success"] = False
+            return db_info
+
+        try:
+            db_info = backend.register(res_id, db)
+        except circuit.UNAVAILABLE_ERRORS:
+            db_info = backend.get_unavailable_info(db)
+        else:
+            if db_info["success"] is False:
+                try:
+                    backend.unregister(res_id, db)
+                except circuit.UNAVAILABLE_ERRORS:
+                    pass
+            else:
+                backend.add_layer(backend_inventory, db)
+
+        attributes["success"] = db_info["success"]
+
+    return db_info
+
+
+def unregister_layer(backend, res_id, db, backend_inventory):
+    """
+    Removes a layer. Returns False if it may still exist.
+    """
+
+    with tracing.span(f"unregister_{backend.name}_layer", **backend.get_span_attributes(db)):
+        try:
+            removed = is_removed(backend.unregister(res_id, db))
+        except circuit.UNAVAILABLE_ERRORS:
+            return False
+
+    if removed:
+        backend.remove_layer(backend_inventory, db)
+
+    return removed
+
+
+def remove_resource_services(backend, res_id):
+    """
+    Removes a resource's whole workspace or network from a backend. Returns False if the backend
+    is unavailable.
+    """
+
+    try:
+        backend.remove_all(res_id)
+    except circuit.UNAVAILABLE_ERRORS:
+        return False
+
+    return True
+
+
+def wait_for(futures):
+    """
+    Waits for submitted operations, re-raising the first error.
+    """
+
+    return [future.result() for future in futures]
+
+
+def run_registration(res_id, db_list, inventories, progress=None):
+    """
+    Creates containers, then unregisters and registers layers in parallel on each backend.
+
+    The inventories and the registry of published services are kept in step with every change
+    made. A backend that is unavailable fails its own layers without stopping the other backend.
+    Registry writes and raster statistics cache lookups happen on the calling thread. Results keep
+    the order of the register lists in db_list. progress, if given, is called from the calling
+    thread with (completed, total) each time a layer finishes.
+    """
+
+    container_plan = get_container_plan(db_list, backends.BACKENDS, inventories)
+
+    wait_for([
+        tracing.submit(get_executor(backend.name), create_container, backend, res_id, backend_inventory)
+        for backend, backend_inventory in container_plan
+    ])
+
+    clear_created_containers(res_id, container_plan)
+
+    unregister_plan = get_layer_plan(db_list, backends.BACKENDS, inventories, "unregister")
+
+    removed = wait_for([
+        tracing.submit(get_executor(backend.name), unregister_layer, backend, res_id, db, backend_inventory)
+        for backend, db, backend_inventory in unregister_plan
+    ])
+
+    remove_layers(res_id, unregister_plan, removed)
+    load_raster_stats(db_list)
+
+    register_plan = get_layer_plan(db_list, backends.BACKENDS, inventories, "register")
+
+    register_futures = [
+        tracing.submit(get_executor(backend.name), register_layer, backend, res_id, db, backend_inventory)
+        for backend, db, backend_inventory in register_plan
+    ]
+
+    if progress is not None:
+        progress(0, len(register_futures))
+        for completed, future in enumerate(as_completed(register_futures), start=1):
+            progress(completed, len(register_futures))
+
+    return record_registration(res_id, db_list, register_plan, wait_for(register_futures))
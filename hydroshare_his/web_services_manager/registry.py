@@ -0,0 +1,210 @@
+import json
+from django.utils import timezone
+from hydroshare_his import settings
+from web_services_manager import inventory
+from web_services_manager.models import PublishedResource, PublishedLayer
+
+
+def get_crs_name(crs):
+    """
+    Gets a CRS identifier from a GeoServer bounding box, which is either a string or a {"$": ...} object.
+    """
+
+    if isinstance(crs, dict):
+        return crs.get("$", "")
+
+    return str(crs or "")
+
+
+def get_resource(res_id):
+    return PublishedResource.objects.get_or_create(resource_id=res_id)[0]
+
+
+def save_layer(resource, backend, layer_name, **fields):
+    """
+    Updates or inserts a recorded layer without holding a read lock, which SQLite cannot upgrade
+    while other workers write. Only the update leader of a resource writes its layers.
+    """
+
+    updated = PublishedLayer.objects.filter(resource=resource, backend=backend, layer_name=layer_name).update(**fields)
+
+    if not updated:
+        PublishedLayer.objects.create(resource=resource, backend=backend, layer_name=layer_name, **fields)
+
+
+def record_geoserver_layer(res_id, db, bbox, service_url):
+    """
+    Records a GeoServer layer registered by register_geoserver_db.
+    """
+
+    resource = get_resource(res_id)
+    workspace_id = f"{settings.HIS.get('geoserver_ns')}-{res_id}"
+
+    if resource.workspace_id != workspace_id:
+        PublishedResource.objects.filter(pk=resource.pk).update(workspace_id=workspace_id)
+
+    save_layer(
+        resource,
+        PublishedLayer.GEOSERVER,
+        db["layer_name"].replace("/", " "),
+        layer_type=db["layer_type"],
+        store_type=db["store_type"],
+        min_x=bbox.get("minx"),
+        min_y=bbox.get("miny"),
+        max_x=bbox.get("maxx"),
+        max_y=bbox.get("maxy"),
+        crs=get_crs_name(bbox.get("crs")),
+        service_url=service_url,
+        file_version=db.get("file_version", "")
+    )
+
+
+def record_hydroserver_database(res_id, db, service_url):
+    """
+    Records a HydroServer database registered by register_hydroserver_db.
+    """
+
+    resource = get_resource(res_id)
+
+    if resource.network_id != str(res_id):
+        PublishedResource.objects.filter(pk=resource.pk).update(network_id=str(res_id))
+
+    save_layer(
+        resource,
+        PublishedLayer.HYDROSERVER,
+        db["database_name"],
+        layer_type="Timeseries",
+        service_url=service_url,
+        file_version=db.get("file_version", "")
+    )
+
+
+def get_file_versions(res_id):
+    """
+    Gets the recorded file version of each published layer of a resource, keyed by (backend, layer name).
+    """
+
+    layers = PublishedLayer.objects.filter(resource__resource_id=res_id).values_list("backend", "layer_name", "file_version")
+
+    return {(backend, layer_name): file_version for backend, layer_name, file_version in layers}
+
+
+def remove_layer(res_id, backend, layer_name):
+    PublishedLayer.objects.filter(
+        resource__resource_id=res_id,
+        backend=backend,
+        layer_name=layer_name
+    ).delete()
+
+
+def clear_backend(res_id, backend):
+    """
+    Removes every recorded layer of a resource on one backend, and the resource once nothing is left.
+    """
+
+    PublishedLayer.objects.filter(resource__resource_id=res_id, backend=backend).delete()
+    PublishedResource.objects.filter(resource_id=res_id, layers__isnull=True).delete()
+
+
+def get_registered_services(res_id):
+    """
+    Gets (registered services, GeoServer layer list, HydroServer database list) for a resource from
+    the registry, in the form build_hydroshare_response takes, or None if nothing is recorded.
+    """
+
+    try:
+        resource = PublishedResource.objects.get(resource_id=res_id)
+    except PublishedResource.DoesNotExist:
+        return None
+
+    registered_services = {
+        "geoserver": [],
+        "hydroserver": []
+    }
+    geoserver_list = []
+    hydroserver_list = []
+
+    for layer in resource.layers.all():
+        if layer.backend == PublishedLayer.GEOSERVER:
+            geoserver_list.append((layer.layer_name, layer.store_type))
+            registered_services["geoserver"].append({
+                "success": True,
+                "type": layer.layer_type,
+                "layer_name": layer.layer_name,
+                "message": layer.service_url
+            })
+        else:
+            hydroserver_list.append(layer.layer_name)
+            registered_services["hydroserver"].append({
+                "success": True,
+                "type": layer.layer_type,
+                "message": layer.service_url
+            })
+
+    return registered_services, geoserver_list, hydroserver_list
+
+
+def check_drift(res_id):
+    """
+    Compares the registry with what GeoServer and HydroServer currently publish for a resource.
+
+    Returns (drift, unknown). drift has, per backend, layers recorded but missing from the backend
+    and layers published but not recorded. unknown lists backends that are not configured or could
+    not be listed, e.g. while their circuit is open. They are never reported as drift, and the drift
+    recorded for them by an earlier check is kept.
+    """
+
+    resource = PublishedResource.objects.get(resource_id=res_id)
+
+    recorded = {
+        PublishedLayer.GEOSERVER: set(),
+        PublishedLayer.HYDROSERVER: set()
+    }
+
+    for backend, layer_name in resource.layers.values_list("backend", "layer_name"):
+        recorded[backend].add(layer_name)
+
+    published = {}
+    unknown = []
+
+    if settings.HIS.get("geoserver_url") is None:
+        unknown.append(PublishedLayer.GEOSERVER)
+    else:
+        geoserver_inventory = inventory.GeoServerInventory(res_id).fetch()
+        if geoserver_inventory.available:
+            published[PublishedLayer.GEOSERVER] = {i[0] for i in geoserver_inventory.get_layer_list()}
+        else:
+            unknown.append(PublishedLayer.GEOSERVER)
+
+    if settings.HIS.get("hydroserver_url") is None:
+        unknown.append(PublishedLayer.HYDROSERVER)
+    else:
+        hydroserver_inventory = inventory.HydroServerInventory(res_id).fetch()
+        if hydroserver_inventory.available:
+            published[PublishedLayer.HYDROSERVER] = set(hydroserver_inventory.get_database_list())
+        else:
+            unknown.append(PublishedLayer.HYDROSERVER)
+
+    drift = {}
+
+    for backend in published:
+        missing = sorted(recorded[backend] - published[backend])
+        unrecorded = sorted(published[backend] - recorded[backend])
+        if missing or unrecorded:
+            drift[backend] = {
+                "missing": missing,
+                "unrecorded": unrecorded
+            }
+
+    stored_drift = dict(json.loads(resource.drift) if resource.drift else {}, **drift)
+
+    for backend in published:
+        if backend not in drift:
+            stored_drift.pop(backend, None)
+
+    PublishedResource.objects.filter(pk=resource.pk).update(
+        drift=json.dumps(stored_drift) if stored_drift else "",
+        drift_checked=timezone.now()
+    )
+
+    return drift, unknown
@@ -0,0 +1,261 @@
+import math
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+from hydroshare_his import settings
+
+
+class ShapefileError(Exception):
+    """
+    Raised when a shapefile cannot be published.
+    """
+
+
+ShapefileSummary = namedtuple("ShapefileSummary", (
+    "geometry_type",
+    "feature_count",
+    "bbox",
+    "crs"
+))
+
+
+SHAPE_TYPES = {
+    0: "Null",
+    1: "Point",
+    3: "PolyLine",
+    5: "Polygon",
+    8: "MultiPoint",
+    11: "PointZ",
+    13: "PolyLineZ",
+    15: "PolygonZ",
+    18: "MultiPointZ",
+    21: "PointM",
+    23: "PolyLineM",
+    25: "PolygonM",
+    28: "MultiPointM",
+    31: "MultiPatch",
+}
+
+FILE_CODE = 9994
+VERSION = 1000
+HEADER_BYTES = 100
+INDEX_RECORD_BYTES = 8
+
+# ESRI .prj names that carry no AUTHORITY, mapped to EPSG codes.
+ESRI_CRS_NAMES = {
+    "GCS_WGS_1984": 4326,
+    "WGS 84": 4326,
+    "GCS_North_American_1983": 4269,
+    "NAD83": 4269,
+    "GCS_North_American_1927": 4267,
+    "NAD27": 4267,
+    "WGS_1984_Web_Mercator_Auxiliary_Sphere": 3857,
+    "WGS_84_Pseudo_Mercator": 3857,
+    "WGS 84 / Pseudo-Mercator": 3857,
+}
+
+ESRI_UTM_NAMES = (
+    (re.compile(r"^WGS[ _]84[ _/]*UTM[ _]zone[ _](\d+)N$", re.IGNORECASE), 32600),
+    (re.compile(r"^WGS_1984_UTM_Zone_(\d+)N$", re.IGNORECASE), 32600),
+    (re.compile(r"^WGS[ _]84[ _/]*UTM[ _]zone[ _](\d+)S$", re.IGNORECASE), 32700),
+    (re.compile(r"^WGS_1984_UTM_Zone_(\d+)S$", re.IGNORECASE), 32700),
+    (re.compile(r"^NAD(?:_19)?83[ _/]*UTM[ _]zone[ _](\d+)N$", re.IGNORECASE), 26900),
+    (re.compile(r"^NAD(?:_19)?27[ _/]*UTM[ _]zone[ _](\d+)N$", re.IGNORECASE), 26700),
+)
+
+
+def read_header(buffer, name):
+    """
+    Reads (file length in bytes, shape type, bounding box) from a .shp or .shx main file header.
+    """
+
+    if len(buffer) < HEADER_BYTES:
+        raise ShapefileError(f"truncated {name} header")
+
+    file_code, file_length = struct.unpack_from(">i20xi", buffer, 0)
+    version, shape_type, minx, miny, maxx, maxy = struct.unpack_from("<ii4d", buffer, 28)
+
+    if file_code != FILE_CODE or version != VERSION:
+        raise ShapefileError(f"{name} is not a shapefile")
+
+    if shape_type not in SHAPE_TYPES:
+        raise ShapefileError(f"unknown shape type {shape_type}")
+
+    return file_length * 2, shape_type, (minx, miny, maxx, maxy)
+
+
+def check_index(shp, shx, shape_type):
+    """
+    Checks that every .shx record points inside the .shp file, in order, and that the first and last
+    records the index points to are where it says they are. Returns the feature count.
+    """
+
+    index_bytes = len(shx) - HEADER_BYTES
+
+    if index_bytes % INDEX_RECORD_BYTES:
+        raise ShapefileError("truncated .shx index")
+
+    end = HEADER_BYTES
+
+    for offset, length in struct.iter_unpack(">ii", shx[HEADER_BYTES:]):
+        offset *= 2
+        if offset < end or length < 0:
+            raise ShapefileError(".shx index is out of order")
+        end = offset + 8 + length * 2
+        if end > len(shp):
+            raise ShapefileError(".shx index points past the end of the .shp file")
+
+    feature_count = index_bytes // INDEX_RECORD_BYTES
+
+    for record_number in {1, feature_count} if feature_count else ():
+        offset, length = struct.unpack_from(">ii", shx, HEADER_BYTES + (record_number - 1) * INDEX_RECORD_BYTES)
+        number, content_length, record_type = struct.unpack_from(">ii", shp, offset * 2) + struct.unpack_from("<i", shp, offset * 2 + 8)
+        if number != record_number or content_length != length or record_type not in (0, shape_type):
+            raise ShapefileError(f"record {record_number} does not match the .shx index")
+
+    return feature_count
+
+
+def get_outer_authority(wkt):
+    """
+    Gets the EPSG code of a WKT CRS from its outermost AUTHORITY or ID clause, or None if it has none.
+    """
+
+    wkt = wkt.replace("(", "[").replace(")", "]")
+
+    for match in re.finditer(r'(?:AUTHORITY|ID)\[\s*"EPSG"\s*,\s*"?(\d+)"?', wkt, re.IGNORECASE):
+        prefix = wkt[:match.start()]
+        if prefix.count("[") - prefix.count("]") == 1:
+            return int(match.group(1))
+
+    return None
+
+
+def get_epsg_code(wkt):
+    """
+    Identifies the EPSG code of a .prj file's WKT, or returns None if it cannot be identified locally.
+    """
+
+    code = get_outer_authority(wkt)
+
+    if code is not None:
+        return code
+
+    name = re.match(r'\s*\w+\[\s*"([^"]*)"', wkt)
+
+    if name is None:
+        return None
+
+    name = name.group(1).strip()
+
+    if name in ESRI_CRS_NAMES:
+        return ESRI_CRS_NAMES[name]
+
+    for pattern, base in ESRI_UTM_NAMES:
+        match = pattern.match(name)
+        if match and 1 <= int(match.group(1)) <= 60:
+            return base + int(match.group(1))
+
+    return None
+
+
+def map_file(path):
+    """
+    Memory-maps a whole file for reading. Empty files map to an empty bytes object.
+    """
+
+    with open(path, "rb") as mapped_file:
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_prj_file(path):
+    """
+    Reads the WKT of a .prj file, or returns an empty string if there is no readable .prj file.
+    """
+
+    try:
+        with open(path, "rb") as prj_file:
+            return prj_file.read().decode("latin-1").strip()
+    except OSError:
+        return ""
+
+
+def read_shapefile(base_path):
+    """
+    Summarizes the shapefile at base_path (without extension) from its .shp header, .shx index, and
+    .prj file, without reading any geometry.
+
+    Raises ShapefileError if a required part is missing or the file cannot be published. crs is an
+    EPSG identifier, or None if there is no readable .prj file or it does not name one that can be
+    identified locally, in which case GeoServer's declared SRS is used.
+    """
+
+    for extension in ("shx", "dbf"):
+        if not os.path.isfile(f"{base_path}.{extension}"):
+            raise ShapefileError(f"missing .{extension} file")
+
+    shp = shx = b""
+
+    try:
+        shp = map_file(f"{base_path}.shp")
+        shx = map_file(f"{base_path}.shx")
+
+        shp_length, shape_type, bbox = read_header(shp, ".shp")
+        shx_length, shx_shape_type, _ = read_header(shx, ".shx")
+
+        if shp_length != len(shp) or shx_length != len(shx):
+            raise ShapefileError("file length does not match its header")
+
+        if shx_shape_type != shape_type:
+            raise ShapefileError(".shp and .shx shape types differ")
+
+        if shape_type == 0:
+            raise ShapefileError("no geometry")
+
+        feature_count = check_index(shp, shx, shape_type)
+    except OSError as e:
+        raise ShapefileError(f"unreadable file ({e.strerror})")
+    except struct.error:
+        raise ShapefileError("truncated file")
+    finally:
+        for buffer in (shp, shx):
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    if feature_count == 0:
+        raise ShapefileError("no features")
+
+    if not all(math.isfinite(value) for value in bbox) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ShapefileError("invalid bounding box")
+
+    code = get_epsg_code(read_prj_file(f"{base_path}.prj"))
+
+    return ShapefileSummary(
+        SHAPE_TYPES[shape_type],
+        feature_count,
+        bbox,
+        f"EPSG:{code}" if code is not None else None
+    )
+
+
+def get_local_summary(db):
+    """
+    Summarizes a feature layer's shapefile in geoserver_data_dir, or returns None if the file is not
+    available locally.
+    """
+
+    geoserver_directory = settings.HIS.get("geoserver_data_dir")
+
+    if geoserver_directory is None:
+        return None
+
+    path = os.path.join(geoserver_directory, db["hs_path"])
+
+    if not os.path.isfile(path):
+        return None
+
+    return read_shapefile(os.path.splitext(path)[0])
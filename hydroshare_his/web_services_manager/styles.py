@@ -0,0 +1,212 @@
+import hashlib
+import json
+import threading
+import weakref
+from hydroshare_his import settings
+from web_services_manager import clients
+from web_services_manager import tracing
+
+
+RASTER_STYLE_TEMPLATE = """<?xml version="1.0" encoding="ISO-8859-1"?>
+    <StyledLayerDescriptor version="1.0.0" xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc"
+      xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+      xsi:schemaLocation="http://www.opengis.net/sld http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd">
+      <NamedLayer>
+        <Name>simpleraster</Name>
+        <UserStyle>
+          <Name>{name}</Name>
+          <Title>Default raster style</Title>
+          <Abstract>Default greyscale raster style</Abstract>
+          <FeatureTypeStyle>
+            <Rule>
+              <RasterSymbolizer>
+                <Opacity>1.0</Opacity>
+                <ColorMap>
+                  {low_ndv}
+                  <ColorMapEntry color="#000000" quantity="{min_value}" label="values" />
+                  <ColorMapEntry color="#FFFFFF" quantity="{max_value}" label="values" />
+                  {high_ndv}
+                </ColorMap>
+              </RasterSymbolizer>
+            </Rule>
+          </FeatureTypeStyle>
+        </UserStyle>
+      </NamedLayer>
+    </StyledLayerDescriptor>"""
+
+NODATA_ENTRY_TEMPLATE = '<ColorMapEntry color="#000000" quantity="{ndv_value}" label="nodata" opacity="0.0" />'
+
+_known_styles = set()
+_known_styles_lock = threading.Lock()
+_style_locks = weakref.WeakValueDictionary()
+
+
+def render_raster_style(max_value, min_value, ndv_value, name):
+    """
+    Renders the default greyscale raster style.
+    """
+
+    low_ndv = ""
+    high_ndv = ""
+
+    if ndv_value is not None and float(ndv_value) < float(min_value):
+        low_ndv = NODATA_ENTRY_TEMPLATE.format(ndv_value=ndv_value)
+    elif ndv_value is not None and float(ndv_value) > float(max_value):
+        high_ndv = NODATA_ENTRY_TEMPLATE.format(ndv_value=ndv_value)
+
+    return RASTER_STYLE_TEMPLATE.format(
+        name=name,
+        low_ndv=low_ndv,
+        high_ndv=high_ndv,
+        min_value=min_value,
+        max_value=max_value
+    )
+
+
+def get_style_value(value):
+    """
+    Writes a statistic the same way whether it arrived as 100, 100.0, or "100".
+    """
+
+    if value is None:
+        return "None"
+
+    try:
+        return repr(float(value))
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def get_raster_style_name(max_value, min_value, ndv_value):
+    """
+    Names a raster style by a hash of its parameters, so layers with equal statistics share one style.
+    """
+
+    key = "\0".join(("raster", get_style_value(max_value), get_style_value(min_value), get_style_value(ndv_value)))
+
+    return f"his-raster-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]}"
+
+
+def get_style_workspace(workspace_id):
+    """
+    Gets the workspace styles are stored in, or None for global styles.
+    """
+
+    if settings.HIS.get("style_scope", "global") == "workspace":
+        return workspace_id
+
+    return None
+
+
+def get_styles_url(style_workspace):
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    if style_workspace is None:
+        return f"{geoserver_url}/styles"
+
+    return f"{geoserver_url}/workspaces/{style_workspace}/styles"
+
+
+def get_style_lock(key):
+    """
+    Gets the lock that serializes uploads of a style. A lock is dropped once no thread holds or waits for it.
+    """
+
+    with _known_styles_lock:
+        lock = _style_locks.get(key)
+        if lock is None:
+            lock = _style_locks[key] = threading.Lock()
+        return lock
+
+
+def forget_workspace_styles(workspace_id):
+    """
+    Drops known styles of a workspace that was deleted or recreated.
+    """
+
+    with _known_styles_lock:
+        for key in [i for i in _known_styles if i[0] == workspace_id]:
+            _known_styles.discard(key)
+
+
+def forget_style(style_workspace, name):
+    with _known_styles_lock:
+        _known_styles.discard((style_workspace, name))
+
+
+def is_known_style(style_workspace, name):
+    with _known_styles_lock:
+        return (style_workspace, name) in _known_styles
+
+
+def add_known_style(style_workspace, name):
+    with _known_styles_lock:
+        _known_styles.add((style_workspace, name))
+
+
+def style_exists(style_workspace, name):
+    response = clients.get("geoserver", f"{get_styles_url(style_workspace)}/{name}.json", operation="style")
+
+    return response.status_code == 200
+
+
+def ensure_style(style_workspace, name, body):
+    """
+    Uploads a style unless GeoServer already has one with this name. Returns True if the style exists.
+    """
+
+    if is_known_style(style_workspace, name):
+        return True
+
+    with get_style_lock((style_workspace, name)):
+        if is_known_style(style_workspace, name):
+            return True
+
+        exists = style_exists(style_workspace, name)
+
+        if not exists:
+            headers = {"content-type": "application/vnd.ogc.sld+xml"}
+            response = clients.post("geoserver", get_styles_url(style_workspace), params={"name": name}, data=body, headers=headers, operation="style")
+            exists = response.status_code == 201 or style_exists(style_workspace, name)
+
+        if exists:
+            add_known_style(style_workspace, name)
+
+    return exists
+
+
+def set_default_style(workspace_id, layer_name, style_workspace, name):
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    rest_url = f"{geoserver_url}/layers/{workspace_id}:{layer_name}"
+    headers = {"content-type": "application/json"}
+    default_style = {"name": name}
+
+    if style_workspace is not None:
+        default_style["workspace"] = style_workspace
+
+    response = clients.put("geoserver", rest_url, data=json.dumps({"layer": {"defaultStyle": default_style}}), headers=headers, operation="style")
+
+    return response.status_code == 200
+
+
+def apply_raster_style(workspace_id, layer_name, max_value, min_value, ndv_value):
+    """
+    Sets a raster layer's default style, reusing a stored style with the same statistics if there is one.
+
+    Returns False if the style could not be stored or assigned.
+    """
+
+    style_workspace = get_style_workspace(workspace_id)
+    name = get_raster_style_name(max_value, min_value, ndv_value)
+    body = render_raster_style(max_value, min_value, ndv_value, name)
+
+    with tracing.span("apply_raster_style", style=name, style_bytes=len(body)):
+        for _ in range(2):
+            if not ensure_style(style_workspace, name, body):
+                return False
+            if set_default_style(workspace_id, layer_name, style_workspace, name):
+                return True
+            forget_style(style_workspace, name)
+
+    return False
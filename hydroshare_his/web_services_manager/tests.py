@@ -1,6 +1,1125 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from django.test import TestCase
+import http.server
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+import requests
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from hydroshare_his import settings
+from web_services_manager import admission
+from web_services_manager import async_clients
+from web_services_manager import benchmark
+from web_services_manager import bulk
+from web_services_manager import catalog
+from web_services_manager import classification
+from web_services_manager import circuit
+from web_services_manager import clients
+from web_services_manager import coalesce
+from web_services_manager import fingerprints
+from web_services_manager import jobs
+from web_services_manager import metrics
+from web_services_manager import odm2
+from web_services_manager import pipeline
+from web_services_manager import preflight
+from web_services_manager import raster_stats
+from web_services_manager import registration
+from web_services_manager import registry
+from web_services_manager import shapefile
+from web_services_manager import styles
+from web_services_manager import tiff
+from web_services_manager import tracing
+from web_services_manager import utilities
+from web_services_manager.management.commands import benchmark_reconcile
+from web_services_manager.models import BackendCircuit, PublishedLayer, PublishedResource, RasterStatistics, ResourceFingerprint, UpdateJob, UpdateTicket
 
-# Create your tests here.
+
+class UpdateJobTests(TestCase):
+
+    def test_requeue_stale_jobs(self):
+        stale = timezone.now() - timedelta(seconds=600)
+        dead = UpdateJob.objects.create(resource_id="dead", status=UpdateJob.RUNNING, started=stale, heartbeat=stale)
+        legacy = UpdateJob.objects.create(resource_id="legacy", status=UpdateJob.RUNNING, started=stale)
+        alive = UpdateJob.objects.create(
+            resource_id="alive", status=UpdateJob.RUNNING, started=stale, heartbeat=timezone.now()
+        )
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 2)
+
+        statuses = dict(UpdateJob.objects.values_list("resource_id", "status"))
+        self.assertEqual(statuses[dead.resource_id], UpdateJob.QUEUED)
+        self.assertEqual(statuses[legacy.resource_id], UpdateJob.QUEUED)
+        self.assertEqual(statuses[alive.resource_id], UpdateJob.RUNNING)
+
+    def test_job_waits_for_admission(self):
+        job = UpdateJob.objects.create(resource_id="res", force=True)
+        rejected = admission.AdmissionError("Error: Too many updates are queued.", 0)
+
+        with mock.patch.object(admission, "run_admitted", side_effect=[rejected, {"content": []}]) as run_admitted:
+            self.assertEqual(jobs.run_admitted_update(job, None), {"content": []})
+
+        self.assertEqual(run_admitted.call_count, 2)
+        self.assertEqual(run_admitted.call_args[0][0], admission.BULK)
+        self.assertEqual(run_admitted.call_args[0][2], "res")
+        self.assertTrue(run_admitted.call_args[1]["force"])
+
+    def test_job_fails_after_admission_timeout(self):
+        job = UpdateJob.objects.create(resource_id="res")
+        rejected = admission.AdmissionError("Error: Too many updates are queued.", 30)
+
+        with mock.patch.dict(settings.HIS, {"job_admission_timeout": 60}), \
+                mock.patch.object(admission, "run_admitted", side_effect=rejected) as run_admitted, \
+                mock.patch.object(jobs, "time") as clock, \
+                mock.patch.object(jobs.connection, "close"):
+            clock.monotonic.side_effect = [0, 0, 30, 60]
+            jobs.run_update_job(job.job_id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UpdateJob.FAILED)
+        self.assertEqual(job.error, "Error: Too many updates are queued.")
+        self.assertEqual(run_admitted.call_count, 3)
+        self.assertEqual(clock.sleep.call_args_list, [mock.call(30), mock.call(30)])
+
+    def test_resume_jobs_starts_queued_jobs_once(self):
+        stale = timezone.now() - timedelta(seconds=600)
+        queued = UpdateJob.objects.create(resource_id="queued")
+        orphaned = UpdateJob.objects.create(
+            resource_id="orphaned", status=UpdateJob.RUNNING, started=stale, heartbeat=stale
+        )
+        executor = mock.Mock()
+
+        with mock.patch.object(jobs, "get_job_executor", return_value=executor), \
+                mock.patch.object(jobs, "_submitted", set()):
+            self.assertEqual(jobs.resume_jobs(), [queued.job_id, orphaned.job_id])
+            jobs.resume_jobs()
+
+        self.assertEqual(
+            [c[0] for c in executor.submit.call_args_list],
+            [(jobs.run_update_job, queued.job_id), (jobs.run_update_job, orphaned.job_id)]
+        )
+
+
+class CoalesceTests(TestCase):
+
+    def test_requests_get_their_own_tickets(self):
+        self.assertEqual(coalesce.request_update("res", force=True), 1)
+        self.assertEqual(coalesce.request_update("res"), 2)
+        self.assertEqual(coalesce.request_update("res", force=True), 3)
+
+        update = coalesce.ResourceUpdate.objects.get(resource_id="res")
+        self.assertEqual((update.requested, update.force_requested), (3, 3))
+
+    def test_pending_forced_request_forces_run(self):
+        calls = []
+
+        def update(res_id, force=False):
+            calls.append(force)
+            return {"content": []}
+
+        coalesce.request_update("res", force=True)
+
+        self.assertEqual(coalesce.run_coalesced("res", update, force=False), {"content": []})
+        self.assertEqual(calls, [True])
+
+        coalesce.run_coalesced("res", update, force=False)
+        self.assertEqual(calls, [True, False])
+
+    def test_rejected_leader_leaves_requests_pending(self):
+        rejected = admission.AdmissionError("Error: Too many updates are queued.", 0)
+
+        with self.assertRaises(admission.AdmissionError):
+            coalesce.run_coalesced("res", mock.Mock(side_effect=rejected))
+
+        update = coalesce.ResourceUpdate.objects.get(resource_id="res")
+        self.assertEqual((update.requested, update.completed, update.owner, update.error), (1, 0, "", ""))
+
+        self.assertEqual(coalesce.run_coalesced("res", mock.Mock(return_value={"content": []})), {"content": []})
+
+    def test_forced_request_does_not_share_completed_run(self):
+        calls = []
+
+        def update(res_id, force=False):
+            calls.append(force)
+            return {"content": []}
+
+        coalesce.run_coalesced("res", update)
+        coalesce.run_coalesced("res", update, force=True)
+
+        self.assertEqual(calls, [False, True])
+
+
+class BulkUpdateTests(TestCase):
+
+    def test_invalid_resource_ids_fail(self):
+        lines = ["good-id", "../geoserver", "a/b # comment", "good-id", "bad\\id"]
+
+        with mock.patch.object(bulk, "update_resource", side_effect=lambda res_id, force: {
+            "resource_id": res_id, "success": True
+        }) as update_resource:
+            results = [json.loads(line) for line in bulk.stream_bulk_update(bulk.parse_resource_ids(lines))]
+
+        update_resource.assert_called_once_with("good-id", False)
+        self.assertEqual(
+            {result["resource_id"]: result["success"] for result in results[:-1]},
+            {"good-id": True, "../geoserver": False, "a/b": False, "bad\\id": False}
+        )
+        self.assertEqual(results[-1]["summary"], {"total": 4, "succeeded": 1, "failed": 3})
+
+
+def get_page_response(status_code, results=(), next_url=None):
+    return mock.Mock(status_code=status_code, content=json.dumps({"results": list(results), "next": next_url}).encode("utf-8"))
+
+
+class FileListTests(TestCase):
+
+    def test_pages_are_followed(self):
+        first = get_page_response(200, [{"url": "a"}], "http://hydroshare/page/2")
+
+        with mock.patch.object(clients, "get", return_value=get_page_response(200, [{"url": "b"}])):
+            self.assertEqual([i["url"] for i in utilities.iter_file_list_pages(first)], ["a", "b"])
+
+    def test_failed_page_makes_hydroshare_unavailable(self):
+        for failure in (get_page_response(500), requests.exceptions.ConnectionError()):
+            first = get_page_response(200, [{"url": "a"}], "http://hydroshare/page/2")
+            with mock.patch.object(clients, "get", side_effect=[failure]):
+                with self.assertRaises(circuit.BackendUnavailableError):
+                    list(utilities.iter_file_list_pages(first))
+
+
+BACKEND_SETTINGS = {
+    "geoserver_url": "http://geoserver/rest",
+    "geoserver_ns": "HS",
+    "hydroserver_url": "http://hydroserver",
+    "circuit_failure_threshold": None
+}
+
+
+def get_listing_response(url, geoserver_status=200, hydroserver_status=200):
+    """
+    Answers inventory listings for a resource with one coverage on GeoServer and one database on HydroServer.
+    """
+
+    if url.startswith(BACKEND_SETTINGS["hydroserver_url"]):
+        return mock.Mock(status_code=hydroserver_status, content=json.dumps([{"database_id": "timeseries"}]).encode("utf-8"))
+
+    listings = {
+        "datastores.json": {"dataStores": ""},
+        "coverages.json": {"coverages": {"coverage": [{"name": "dem"}]}},
+        "featuretypes.json": {"featureTypes": ""}
+    }
+
+    return mock.Mock(status_code=geoserver_status, content=json.dumps(listings[url.rsplit("/", 1)[1]]).encode("utf-8"))
+
+
+@mock.patch.dict(settings.HIS, BACKEND_SETTINGS)
+class RegistryDriftTests(TestCase):
+
+    def setUp(self):
+        resource = PublishedResource.objects.create(resource_id="res")
+        PublishedLayer.objects.create(resource=resource, backend=PublishedLayer.GEOSERVER, layer_name="dem")
+        PublishedLayer.objects.create(resource=resource, backend=PublishedLayer.GEOSERVER, layer_name="roads")
+        PublishedLayer.objects.create(resource=resource, backend=PublishedLayer.HYDROSERVER, layer_name="timeseries")
+
+    def test_missing_layer_is_drift(self):
+        with mock.patch.object(clients, "get", side_effect=lambda backend, url, **kwargs: get_listing_response(url)):
+            drift, unknown = registry.check_drift("res")
+
+        self.assertEqual(drift, {"geoserver": {"missing": ["roads"], "unrecorded": []}})
+        self.assertEqual(unknown, [])
+        self.assertEqual(json.loads(PublishedResource.objects.get(resource_id="res").drift), drift)
+
+    def test_unavailable_backend_is_unknown(self):
+        def get(backend, url, **kwargs):
+            if backend == "geoserver":
+                raise circuit.BackendUnavailableError(backend)
+            return get_listing_response(url)
+
+        with mock.patch.object(clients, "get", side_effect=get):
+            drift, unknown = registry.check_drift("res")
+
+        self.assertEqual(drift, {})
+        self.assertEqual(unknown, ["geoserver"])
+
+    def test_server_error_is_unknown(self):
+        def get(backend, url, **kwargs):
+            return get_listing_response(url, geoserver_status=502, hydroserver_status=500)
+
+        with mock.patch.object(clients, "get", side_effect=get):
+            drift, unknown = registry.check_drift("res")
+
+        self.assertEqual(drift, {})
+        self.assertEqual(unknown, ["geoserver", "hydroserver"])
+
+    def test_unconfigured_backend_is_unknown(self):
+        with mock.patch.dict(settings.HIS, {"hydroserver_url": None}):
+            with mock.patch.object(clients, "get", side_effect=lambda backend, url, **kwargs: get_listing_response(url)):
+                drift, unknown = registry.check_drift("res")
+
+        self.assertEqual(unknown, ["hydroserver"])
+        self.assertEqual(list(drift), ["geoserver"])
+
+
+class RasterStatsTests(TestCase):
+
+    def test_cached_stats_are_loaded_in_batches(self):
+        db_list = [
+            {"hs_path": f"data/contents/{i}.tif", "checksum": str(i), "modified_time": None}
+            for i in range(raster_stats.QUERY_BATCH_SIZE + 20)
+        ]
+        RasterStatistics.objects.bulk_create([
+            RasterStatistics(
+                key=raster_stats.get_stats_key(db), hs_path=db["hs_path"], maximum=str(i), minimum="0", nodata=None,
+                last_used=timezone.now() - timedelta(days=1)
+            )
+            for i, db in enumerate(db_list)
+        ])
+        db_list.append({"hs_path": "data/contents/new.tif", "checksum": "new", "modified_time": None})
+
+        with self.assertNumQueries(4):
+            raster_stats.load_cached_stats(db_list)
+
+        self.assertEqual([db.get("raster_stats") for db in db_list[:2]], [("0", "0", None), ("1", "0", None)])
+        self.assertTrue(all(db["raster_stats_cached"] for db in db_list[:-1]))
+        self.assertNotIn("raster_stats", db_list[-1])
+        self.assertFalse(RasterStatistics.objects.filter(last_used__lt=timezone.now() - timedelta(hours=1)).exists())
+
+
+def get_catalog_layers():
+    """
+    Gets (db, layer) pairs for a raster and a vector layer as describe_layer leaves them.
+    """
+
+    raster_db = {
+        "layer_name": "elevation",
+        "store_type": "coveragestores",
+        "raster_stats": ("10.5", "-2.0", "-9999"),
+        "raster_grid": (4, 3, 1, "REAL_32BITS"),
+        "catalog_style": (None, "his-raster-style", "<StyledLayerDescriptor/>")
+    }
+    raster_layer = {
+        "type": "RASTER",
+        "store": "elevation",
+        "store_type": "coveragestores",
+        "url": "file:///data/res/data/contents/elevation/dem.tif",
+        "native_name": "dem.tif",
+        "srs": "EPSG:26912",
+        "bbox": (420000.0, 4500000.0, 420400.0, 4500300.0),
+        "latlon_bbox": (-111.9, 40.6, -111.8, 40.7),
+        "style": (None, "his-raster-style"),
+        "grid": (4, 3)
+    }
+    vector_db = {
+        "layer_name": "roads",
+        "store_type": "datastores",
+        "catalog_style": (None, "line", "<StyledLayerDescriptor/>")
+    }
+    vector_layer = {
+        "type": "VECTOR",
+        "store": "roads",
+        "store_type": "datastores",
+        "url": "file:///data/res/data/contents/roads/roads.shp",
+        "native_name": "roads.shp",
+        "srs": "EPSG:4326",
+        "bbox": (-112.0, 40.5, -111.5, 41.0),
+        "latlon_bbox": (-112.0, 40.5, -111.5, 41.0),
+        "style": (None, "line")
+    }
+
+    return [(raster_db, raster_layer), (vector_db, vector_layer)]
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.catalog_dir)
+
+    def test_workspace_reads_back_as_written(self):
+        writer = catalog.CatalogWriter(self.catalog_dir)
+        writer.write_workspace("HS-res")
+        for db, layer in get_catalog_layers():
+            writer.write_layer("HS-res", db, layer)
+
+        layers = catalog.CatalogReader(self.catalog_dir).read_workspace("HS-res")
+
+        self.assertEqual(layers, {layer["store"]: layer for db, layer in get_catalog_layers()})
+
+    @mock.patch.dict(settings.HIS, {"geoserver_ns": "HS"})
+    def test_failed_overwrite_keeps_workspace(self):
+        writer = catalog.CatalogWriter(self.catalog_dir)
+        reader = catalog.CatalogReader(self.catalog_dir)
+        layers = get_catalog_layers()
+        writer.write_workspace("HS-res")
+        writer.write_layer("HS-res", *layers[1])
+
+        def describe_layer(db):
+            db.update(layers[0][0])
+            return layers[0][1]
+
+        with mock.patch.object(utilities, "get_file_list", return_value=[]), \
+                mock.patch.object(catalog.classification, "classify_files", return_value=[mock.Mock(backend="geoserver")]), \
+                mock.patch.object(catalog.classification, "get_register_info", return_value=dict(layers[0][0], layer_type="GeographicRaster")), \
+                mock.patch.object(catalog, "describe_layer", side_effect=describe_layer), \
+                mock.patch.object(catalog.registry, "clear_backend") as clear_backend:
+            with mock.patch.object(reader, "read_workspace", side_effect=catalog.CatalogError("broken")):
+                result = catalog.generate_resource("res", writer, reader, overwrite=True)
+
+            self.assertFalse(result["success"])
+            self.assertEqual(list(reader.read_workspace("HS-res")), ["roads"])
+            self.assertEqual(os.listdir(writer.staging_dir), [])
+
+            result = catalog.generate_resource("res", writer, reader, overwrite=True)
+
+            self.assertTrue(result["success"])
+            self.assertEqual(list(reader.read_workspace("HS-res")), ["elevation"])
+            self.assertEqual(os.listdir(writer.staging_dir), [])
+            clear_backend.assert_not_called()
+
+    @mock.patch.dict(settings.HIS, {"geoserver_ns": "HS"})
+    def test_skipped_layer_keeps_workspace(self):
+        writer = catalog.CatalogWriter(self.catalog_dir)
+        reader = catalog.CatalogReader(self.catalog_dir)
+        layers = get_catalog_layers()
+        writer.write_workspace("HS-res")
+        writer.write_layer("HS-res", *layers[1])
+
+        def describe_layer(db):
+            if db["layer_name"] == "roads":
+                raise catalog.CatalogError("CRS cannot be identified locally")
+            db.update(layers[0][0])
+            return layers[0][1]
+
+        register_info = [dict(db, layer_type="GeographicRaster") for db, layer in layers]
+
+        with mock.patch.object(utilities, "get_file_list", return_value=[]), \
+                mock.patch.object(catalog.classification, "classify_files", return_value=[mock.Mock(backend="geoserver")] * 2), \
+                mock.patch.object(catalog.classification, "get_register_info", side_effect=register_info), \
+                mock.patch.object(catalog, "describe_layer", side_effect=describe_layer):
+            result = catalog.generate_resource("res", writer, reader, overwrite=True)
+
+        self.assertEqual(result["layers"], [])
+        self.assertEqual([i["layer_name"] for i in result["skipped"]], ["roads", "elevation"])
+        self.assertEqual(list(reader.read_workspace("HS-res")), ["roads"])
+
+    def test_unreadable_vrt_statistics_skip_layer(self):
+        header = tiff.TiffHeader(4, 3, 1, 32, 3, 1, False, 0, (420000, 4500000, 420400, 4500300), "EPSG:26912", [])
+        db = {"layer_name": "elevation", "hs_path": "res/data/contents/elevation/dem.tif", "workspace_id": "HS-res"}
+
+        with mock.patch.object(tiff, "get_local_header", return_value=header), \
+                mock.patch.object(utilities, "get_raster_statistics", side_effect=UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")):
+            with self.assertRaisesRegex(catalog.CatalogError, "unreadable VRT statistics \\(UnicodeDecodeError"):
+                catalog.describe_raster_layer(db)
+
+    def test_layers_are_recorded_after_reload(self):
+        def generate_resource(res_id, writer, reader, overwrite=False, pending=None):
+            pending.append((res_id, "HS-res", False, []))
+            return {"resource_id": res_id, "success": True, "layers": ["elevation"], "skipped": []}
+
+        with mock.patch.object(catalog, "generate_resource", side_effect=generate_resource), \
+                mock.patch.object(catalog, "record_resources") as record_resources:
+            with mock.patch.object(catalog, "reload_catalog", return_value=False):
+                lines = list(catalog.stream_catalog_generation(["res"], catalog_dir=self.catalog_dir, workers=1))
+
+            self.assertFalse(json.loads(lines[-1])["summary"]["reloaded"])
+            record_resources.assert_not_called()
+
+            with mock.patch.object(catalog, "reload_catalog", return_value=True):
+                list(catalog.stream_catalog_generation(["res"], catalog_dir=self.catalog_dir, workers=1))
+
+            record_resources.assert_called_once_with([("res", "HS-res", False, [])])
+
+
+def write_geotiff(path, rows, nodata, tiepoint, scale, epsg):
+    """
+    Writes a little-endian, uncompressed, single-strip Float32 GeoTIFF.
+    """
+
+    data = struct.pack(f"<{len(rows) * len(rows[0])}f", *[value for row in rows for value in row])
+    entries = [
+        (tiff.IMAGE_WIDTH, 3, (len(rows[0]),)),
+        (tiff.IMAGE_LENGTH, 3, (len(rows),)),
+        (tiff.BITS_PER_SAMPLE, 3, (32,)),
+        (tiff.COMPRESSION, 3, (tiff.UNCOMPRESSED,)),
+        (tiff.STRIP_OFFSETS, 4, (8,)),
+        (tiff.SAMPLES_PER_PIXEL, 3, (1,)),
+        (tiff.ROWS_PER_STRIP, 3, (len(rows),)),
+        (tiff.STRIP_BYTE_COUNTS, 4, (len(data),)),
+        (tiff.SAMPLE_FORMAT, 3, (3,)),
+        (tiff.MODEL_PIXEL_SCALE, 12, scale),
+        (tiff.MODEL_TIEPOINT, 12, tiepoint),
+        (tiff.GEO_KEY_DIRECTORY, 3, (1, 1, 0, 3, 1024, 0, 1, 1, 1025, 0, 1, 1, tiff.PROJECTED_CS_TYPE, 0, 1, epsg)),
+        (tiff.GDAL_NODATA, 2, f"{nodata}\0".encode("ascii")),
+    ]
+
+    values = b""
+    packed = []
+    values_offset = 8 + len(data)
+
+    for tag, field_type, value in entries:
+        content = value if field_type == 2 else struct.pack(f"<{len(value)}{tiff.FIELD_TYPES[field_type][0]}", *value)
+        if len(content) <= 4:
+            packed.append(struct.pack("<HHI", tag, field_type, len(content) // tiff.FIELD_TYPES[field_type][1]) + content.ljust(4, b"\0"))
+        else:
+            packed.append(struct.pack("<HHII", tag, field_type, len(content) // tiff.FIELD_TYPES[field_type][1], values_offset + len(values)))
+            values += content + b"\0" * (len(content) % 2)
+
+    ifd_offset = values_offset + len(values)
+
+    with open(path, "wb") as tiff_file:
+        tiff_file.write(b"II" + struct.pack("<HI", 42, ifd_offset) + data + values)
+        tiff_file.write(struct.pack("<H", len(packed)) + b"".join(packed) + struct.pack("<I", 0))
+
+
+def write_point_shapefile(base_path, points, wkt):
+    """
+    Writes a point shapefile's .shp, .shx, .dbf, and .prj files.
+    """
+
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    records = b""
+    index = b""
+
+    for number, (x, y) in enumerate(points, 1):
+        index += struct.pack(">ii", (shapefile.HEADER_BYTES + len(records)) // 2, 10)
+        records += struct.pack(">ii", number, 10) + struct.pack("<idd", 1, x, y)
+
+    for extension, content in (("shp", records), ("shx", index)):
+        header = struct.pack(">i20xi", shapefile.FILE_CODE, (shapefile.HEADER_BYTES + len(content)) // 2)
+        header += struct.pack("<ii4d32x", shapefile.VERSION, 1, min(xs), min(ys), max(xs), max(ys))
+        with open(f"{base_path}.{extension}", "wb") as shape_file:
+            shape_file.write(header + content)
+
+    with open(f"{base_path}.dbf", "wb") as dbf_file:
+        dbf_file.write(b"\x03")
+
+    with open(f"{base_path}.prj", "w") as prj_file:
+        prj_file.write(wkt)
+
+
+def write_odm2_database(path, tables=odm2.REQUIRED_COLUMNS):
+    """
+    Writes an SQLite database with the given ODM2 tables and one row in each.
+    """
+
+    with sqlite3.connect(path) as connection:
+        for table, columns in tables.items():
+            connection.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+            connection.execute(f"INSERT INTO {table} VALUES ({', '.join('1' for column in columns)})")
+
+    connection.close()
+
+
+class LocalFileTests(TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def test_geotiff_header(self):
+        path = os.path.join(self.data_dir, "dem.tif")
+        write_geotiff(path, [[1, 2, 3, -9999], [4, 5, 6, 7], [8, 9, 10.5, -9999]], -9999, (0, 0, 0, 420000, 4500300, 0), (100, 100, 0), 26912)
+
+        header = tiff.read_header(path)
+
+        self.assertEqual((header.width, header.height, header.samples_per_pixel), (4, 3, 1))
+        self.assertEqual((header.bits_per_sample, header.sample_format, header.compression), (32, 3, 1))
+        self.assertEqual(header.bbox, (420000, 4500000, 420400, 4500300))
+        self.assertEqual(header.crs, "EPSG:26912")
+
+    @unittest.skipIf(tiff.numpy is None, "numpy is not installed")
+    def test_geotiff_statistics(self):
+        path = os.path.join(self.data_dir, "dem.tif")
+        write_geotiff(path, [[1, 2, 3, -9999], [4, 5, 6, 7], [8, 9, 10.5, -9999]], -9999, (0, 0, 0, 420000, 4500300, 0), (100, 100, 0), 26912)
+
+        self.assertEqual(tiff.get_raster_statistics(path), ("10.5", "1", "-9999"))
+
+    def test_geotiff_errors(self):
+        path = os.path.join(self.data_dir, "dem.tif")
+
+        with open(path, "wb") as tiff_file:
+            tiff_file.write(b"not a tiff")
+
+        with self.assertRaisesMessage(tiff.TiffError, "Not a TIFF file."):
+            tiff.read_header(path)
+
+    def test_preflight_messages(self):
+        db = {"layer_name": "dem", "layer_type": "GeographicRaster", "hs_path": "dem.tif"}
+
+        with mock.patch.object(tiff, "get_local_header", side_effect=tiff.TiffError("Not a TIFF file.")):
+            self.assertEqual(preflight.check_geotiff(db)["message"], "Error: Unable to register GeoServer layer (Not a TIFF file).")
+
+        with mock.patch.object(shapefile, "get_local_summary", side_effect=shapefile.ShapefileError("no features")):
+            self.assertEqual(preflight.check_shapefile(db)["message"], "Error: Unable to register GeoServer layer (no features).")
+
+        with mock.patch.object(odm2, "get_local_summary", side_effect=odm2.ODM2Error("no time series")):
+            self.assertEqual(
+                preflight.check_hydroserver_database(db)["message"],
+                "Error: Unable to register Water Data Server database (no time series)."
+            )
+
+    def test_shapefile_summary(self):
+        base_path = os.path.join(self.data_dir, "wells")
+        write_point_shapefile(base_path, [(-111.9, 41.7), (-111.8, 41.8), (-111.85, 41.75)], 'GEOGCS["GCS_WGS_1984"]')
+
+        summary = shapefile.read_shapefile(base_path)
+
+        self.assertEqual(summary, shapefile.ShapefileSummary("Point", 3, (-111.9, 41.7, -111.8, 41.8), "EPSG:4326"))
+
+        with open(f"{base_path}.prj", "w"):
+            pass
+
+        self.assertIsNone(shapefile.read_shapefile(base_path).crs)
+
+        os.remove(f"{base_path}.prj")
+
+        self.assertEqual(shapefile.read_shapefile(base_path), summary._replace(crs=None))
+
+    def test_shapefile_errors(self):
+        base_path = os.path.join(self.data_dir, "wells")
+        write_point_shapefile(base_path, [(-111.9, 41.7), (-111.8, 41.8)], 'GEOGCS["GCS_WGS_1984"]')
+
+        with open(f"{base_path}.shx", "r+b") as shx_file:
+            shx_file.seek(shapefile.HEADER_BYTES + shapefile.INDEX_RECORD_BYTES)
+            shx_file.write(struct.pack(">i", shapefile.HEADER_BYTES // 2))
+
+        with self.assertRaisesMessage(shapefile.ShapefileError, ".shx index is out of order"):
+            shapefile.read_shapefile(base_path)
+
+        shp = shapefile.map_file(f"{base_path}.shp")
+
+        with mock.patch.object(shapefile, "map_file", side_effect=[shp, PermissionError(13, "Permission denied")]):
+            with self.assertRaisesMessage(shapefile.ShapefileError, "unreadable file (Permission denied)"):
+                shapefile.read_shapefile(base_path)
+
+        self.assertTrue(shp.closed)
+
+        os.remove(f"{base_path}.dbf")
+
+        with self.assertRaisesMessage(shapefile.ShapefileError, "missing .dbf file"):
+            shapefile.read_shapefile(base_path)
+
+    def test_epsg_codes(self):
+        self.assertEqual(shapefile.get_epsg_code('PROJCS["WGS_1984_UTM_Zone_12N",GEOGCS["GCS_WGS_1984"]]'), 32612)
+        self.assertEqual(shapefile.get_epsg_code('PROJCS["x",GEOGCS["y",AUTHORITY["EPSG","4326"]],AUTHORITY["EPSG","26912"]]'), 26912)
+        self.assertIsNone(shapefile.get_epsg_code('PROJCS["Custom_Projection"]'))
+
+    def test_odm2_summary(self):
+        path = os.path.join(self.data_dir, "series.sqlite")
+        write_odm2_database(path)
+
+        self.assertEqual(odm2.read_summary(path), {"sites": 1, "variables": 1, "results": 1})
+
+    def test_odm2_errors(self):
+        path = os.path.join(self.data_dir, "series.sqlite")
+        write_odm2_database(path, {table: columns for table, columns in odm2.REQUIRED_COLUMNS.items() if table != "Variables"})
+
+        with self.assertRaisesMessage(odm2.ODM2Error, "missing ODM2 table Variables"):
+            odm2.read_summary(path)
+
+        with open(path, "wb") as database_file:
+            database_file.write(b"not a database")
+
+        with self.assertRaisesMessage(odm2.ODM2Error, "not a SQLite database"):
+            odm2.read_summary(path)
+
+
+def get_file_entry(path, logical_file_type, content_type=None, checksum="1"):
+    return {
+        "url": f"https://www.hydroshare.org/resource/res/data/contents/{path}",
+        "content_type": content_type,
+        "logical_file_type": logical_file_type,
+        "size": 1024,
+        "checksum": checksum
+    }
+
+
+@mock.patch.dict(settings.HIS, BACKEND_SETTINGS)
+class ReconcileTests(TestCase):
+
+    def test_reconcile(self):
+        file_list = [
+            get_file_entry("new/dem.tif", "GeoRasterLogicalFile", "image/tiff"),
+            get_file_entry("new/dem.vrt", "GeoRasterLogicalFile", "application/xml"),
+            get_file_entry("same/roads.shp", "GeoFeatureLogicalFile", "application/x-qgis"),
+            get_file_entry("changed/dem.tif", "GeoRasterLogicalFile", "image/tiff", checksum="2"),
+            get_file_entry("series/data.sqlite", "TimeSeriesLogicalFile"),
+            get_file_entry("notes/readme.txt", "GenericLogicalFile", "text/plain"),
+        ]
+        layers = list(classification.classify_files(file_list))
+        versions = {(layer.backend, layer.registered_name): classification.get_file_version(layer.file) for layer in layers}
+        versions[("geoserver", "changed")] = "old version"
+
+        plan = classification.reconcile(
+            layers,
+            [("same", "datastores"), ("changed", "coveragestores"), ("stale", "coveragestores")],
+            ["stale"],
+            versions
+        )
+        geoserver_register, geoserver_unregister, hydroserver_register, hydroserver_unregister = plan
+
+        self.assertEqual([db["layer_name"] for db in geoserver_register], ["new", "changed"])
+        self.assertEqual(geoserver_register[0]["hs_path"], "res/data/contents/new/dem.tif")
+        self.assertEqual(geoserver_unregister, [
+            {"layer_name": "changed", "store_type": "coveragestores"},
+            {"layer_name": "stale", "store_type": "coveragestores"}
+        ])
+        self.assertEqual([db["database_name"] for db in hydroserver_register], ["series"])
+        self.assertEqual(hydroserver_unregister, [{"database_name": "stale"}])
+
+    def test_benchmark_reconcile_plan(self):
+        file_list, geoserver_list, hydroserver_list = benchmark_reconcile.build_synthetic_resource(100)
+
+        elapsed, plan = benchmark_reconcile.time_reconcile(file_list, geoserver_list, hydroserver_list, 1)
+
+        self.assertEqual([len(i) for i in plan], [20, 1, 10, 1])
+        self.assertEqual({db["layer_type"] for db in plan[0]}, {"GeographicRaster", "GeographicFeature"})
+        self.assertEqual(plan[1], [{"layer_name": "stale_0", "store_type": "coveragestores"}])
+        self.assertEqual(plan[3], [{"database_name": "stale_0"}])
+        self.assertFalse({db["layer_name"] for db in plan[0]} & {name for name, store_type in geoserver_list})
+
+
+class ClientTests(TestCase):
+
+    def setUp(self):
+        self.statuses = []
+        self.methods = []
+        test = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                self.respond()
+
+            def respond(self):
+                test.methods.append(self.command)
+                self.send_response(test.statuses.pop(0) if test.statuses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}/"
+
+        patcher = mock.patch.dict(settings.HIS, {
+            "http_retries": 2, "http_backoff_factor": 0, "circuit_failure_threshold": None
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        clients.close_sessions()
+        self.addCleanup(clients.close_sessions)
+
+    def test_gateway_errors_are_retried(self):
+        self.statuses = [503, 502]
+
+        self.assertEqual(clients.get("hydroshare", self.url).status_code, 200)
+        self.assertEqual(self.methods, ["GET", "GET", "GET"])
+
+    def test_retries_give_up_with_last_response(self):
+        self.statuses = [503, 503, 503, 503]
+
+        self.assertEqual(clients.get("hydroshare", self.url).status_code, 503)
+        self.assertEqual(len(self.methods), 3)
+
+    def test_posts_are_not_retried(self):
+        self.statuses = [503]
+
+        self.assertEqual(clients.post("geoserver", self.url).status_code, 503)
+        self.assertEqual(self.methods, ["POST"])
+
+    def test_sessions_are_pooled_per_backend(self):
+        session = clients.get_session("geoserver")
+
+        self.assertIs(clients.get_session("geoserver"), session)
+        self.assertIsNot(clients.get_session("hydroserver"), session)
+
+        clients.close_sessions()
+        self.assertIsNot(clients.get_session("geoserver"), session)
+
+        with self.assertRaises(ValueError):
+            clients.get_session("unknown")
+
+
+class FingerprintTests(TestCase):
+
+    def test_fingerprint_ignores_file_order(self):
+        files = [{"url": "a.tif", "size": 1}, {"url": "b.shp", "size": 2}]
+        forward = utilities.FileListFingerprint()
+        backward = utilities.FileListFingerprint()
+        changed = utilities.FileListFingerprint()
+
+        list(forward.track(files))
+        list(backward.track(reversed(files)))
+        list(changed.track([files[0], dict(files[1], size=3)]))
+
+        self.assertEqual(forward.hexdigest(), backward.hexdigest())
+        self.assertNotEqual(forward.hexdigest(), changed.hexdigest())
+
+    def test_cached_response_needs_same_fingerprint(self):
+        fingerprints.save_response("res", "abc", {"content": []})
+
+        self.assertEqual(fingerprints.get_cached_response("res", "abc"), {"content": []})
+        self.assertIsNone(fingerprints.get_cached_response("res", "def"))
+
+        ResourceFingerprint.objects.filter(resource_id="res").update(updated=timezone.now() - timedelta(seconds=600))
+
+        with mock.patch.dict(settings.HIS, {"reconcile_cache_ttl": 60}):
+            self.assertIsNone(fingerprints.get_cached_response("res", "abc"))
+
+    def test_unchanged_file_list_skips_backends(self):
+        response = {"resource": {}, "content": []}
+        fingerprints.save_response("res", utilities.FileListFingerprint().hexdigest(), response)
+
+        with mock.patch.object(utilities, "get_file_list", side_effect=lambda res_id: iter([])), \
+                mock.patch.object(registration, "fetch_inventories", side_effect=RuntimeError) as fetch_inventories:
+            self.assertEqual(pipeline.publish_resource_services("res", None, False), ("cached", response, None))
+            fetch_inventories.assert_not_called()
+
+            with self.assertRaises(RuntimeError):
+                pipeline.publish_resource_services("res", None, True)
+
+
+class StyleTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(styles, "_known_styles", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stored = set()
+        self.methods = []
+
+        for method in ("get", "post", "put"):
+            patcher = mock.patch.object(styles.clients, method, side_effect=self.get_fake_request(method.upper()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_fake_request(self, method):
+        def request(backend, url, params=None, data=None, **kwargs):
+            self.methods.append(method)
+            if method == "GET":
+                return mock.Mock(status_code=200 if url.split("/")[-1][:-len(".json")] in self.stored else 404)
+            if method == "POST":
+                self.stored.add(params["name"])
+                return mock.Mock(status_code=201)
+            return mock.Mock(status_code=200 if json.loads(data)["layer"]["defaultStyle"]["name"] in self.stored else 404)
+
+        return request
+
+    def test_layers_with_equal_statistics_reuse_a_style(self):
+        self.assertTrue(styles.apply_raster_style("ws", "dem", "100", "0", "-9999"))
+        self.assertTrue(styles.apply_raster_style("ws", "slope", 100.0, 0, -9999))
+
+        self.assertEqual(len(self.stored), 1)
+        self.assertEqual(self.methods, ["GET", "POST", "PUT", "PUT"])
+
+    def test_deleted_style_is_uploaded_again(self):
+        self.assertTrue(styles.apply_raster_style("ws", "dem", 100, 0, -9999))
+        self.stored.clear()
+
+        self.assertTrue(styles.apply_raster_style("ws", "slope", 100, 0, -9999))
+
+        self.assertEqual(len(self.stored), 1)
+        self.assertEqual(self.methods, ["GET", "POST", "PUT", "PUT", "GET", "POST", "PUT"])
+
+    def test_recreated_workspace_forgets_its_styles(self):
+        with mock.patch.dict(settings.HIS, {"style_scope": "workspace"}):
+            self.assertTrue(styles.apply_raster_style("ws", "dem", 100, 0, -9999))
+            styles.forget_workspace_styles("ws")
+            self.stored.clear()
+            self.assertTrue(styles.apply_raster_style("ws", "dem", 100, 0, -9999))
+
+        self.assertEqual(self.methods, ["GET", "POST", "PUT", "GET", "POST", "PUT"])
+
+    def test_equal_statistics_share_a_style(self):
+        name = styles.get_raster_style_name(100, "-5", "-9999")
+
+        self.assertEqual(styles.get_raster_style_name("100.0", -5.0, -9999.0), name)
+        self.assertEqual(styles.get_raster_style_name(" 100 ", "-5.00", "-9999"), name)
+        self.assertNotEqual(styles.get_raster_style_name(100, -5, None), name)
+        self.assertNotEqual(styles.get_raster_style_name(101, -5, -9999), name)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+
+        for patcher in (
+            mock.patch.dict(settings.HIS, {"metrics_dir": self.metrics_dir}),
+            mock.patch.object(metrics, "_counters", {}),
+            mock.patch.object(metrics, "_histograms", {}),
+            mock.patch.object(metrics, "_pid", os.getpid())
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_worker_snapshots_are_merged(self):
+        metrics.increment("his_updates_total", {"outcome": "succeeded"})
+        metrics.observe("his_update_duration_seconds", {"outcome": "succeeded"}, 0.2)
+
+        buckets = [0] * (len(metrics.DURATION_BUCKETS) + 1)
+        buckets[metrics.DURATION_BUCKETS.index(5.0)] = 1
+        labels = [["outcome", "succeeded"]]
+
+        with open(os.path.join(self.metrics_dir, "1.json"), "w") as snapshot_file:
+            json.dump({
+                "counters": [["his_updates_total", labels, 2]],
+                "histograms": [["his_update_duration_seconds", labels, buckets, 3.0, 1]]
+            }, snapshot_file)
+
+        lines = metrics.render_metrics().splitlines()
+
+        self.assertIn("# TYPE his_updates_total counter", lines)
+        self.assertIn('his_updates_total{outcome="succeeded"} 3', lines)
+        self.assertIn('his_update_duration_seconds_bucket{outcome="succeeded",le="0.1"} 0', lines)
+        self.assertIn('his_update_duration_seconds_bucket{outcome="succeeded",le="0.25"} 1', lines)
+        self.assertIn('his_update_duration_seconds_bucket{outcome="succeeded",le="5.0"} 2', lines)
+        self.assertIn('his_update_duration_seconds_bucket{outcome="succeeded",le="+Inf"} 2', lines)
+        self.assertIn('his_update_duration_seconds_sum{outcome="succeeded"} 3.2', lines)
+        self.assertIn('his_update_duration_seconds_count{outcome="succeeded"} 2', lines)
+
+    def test_forked_worker_starts_empty(self):
+        metrics.increment("his_updates_total", {"outcome": "succeeded"}, 5)
+
+        with mock.patch.object(metrics, "_pid", 0):
+            metrics.increment("his_updates_total", {"outcome": "succeeded"})
+            self.assertEqual(metrics.get_snapshot()["counters"], [["his_updates_total", (("outcome", "succeeded"),), 1]])
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(metrics.format_labels((("url", 'a"b\\c\n'),)), '{url="a\\"b\\\\c\\n"}')
+
+
+class CircuitTests(TestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(settings.HIS, {
+                "circuit_failure_threshold": 2, "circuit_reset_timeout": 30, "circuit_refresh_interval": 0
+            }),
+            mock.patch.object(circuit, "_circuits", {}),
+            mock.patch.object(circuit, "_failures", {})
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_state(self):
+        return BackendCircuit.objects.get(backend="geoserver").state
+
+    def open_circuit(self, seconds_ago):
+        circuit.set_circuit("geoserver", BackendCircuit.OPEN, timezone.now() - timedelta(seconds=seconds_ago))
+
+    def test_consecutive_failures_open_circuit(self):
+        self.assertFalse(circuit.before_request("geoserver"))
+
+        circuit.record_failure("geoserver", False)
+        circuit.record_success("geoserver", False)
+        circuit.record_failure("geoserver", False)
+        self.assertFalse(BackendCircuit.objects.filter(backend="geoserver").exists())
+
+        circuit.record_failure("geoserver", False)
+        self.assertEqual(self.get_state(), BackendCircuit.OPEN)
+
+        with self.assertRaises(circuit.BackendUnavailableError):
+            circuit.before_request("geoserver")
+
+        self.assertFalse(circuit.before_request("hydroserver"))
+
+    def test_successful_probe_closes_circuit(self):
+        self.open_circuit(60)
+
+        self.assertTrue(circuit.before_request("geoserver"))
+        self.assertEqual(self.get_state(), BackendCircuit.HALF_OPEN)
+
+        with self.assertRaises(circuit.BackendUnavailableError):
+            circuit.before_request("geoserver")
+
+        circuit.record_success("geoserver", True)
+
+        self.assertEqual(self.get_state(), BackendCircuit.CLOSED)
+        self.assertFalse(circuit.before_request("geoserver"))
+
+    def test_failed_probe_reopens_circuit(self):
+        self.open_circuit(60)
+
+        probe = circuit.before_request("geoserver")
+        circuit.record_failure("geoserver", probe)
+
+        self.assertEqual(self.get_state(), BackendCircuit.OPEN)
+
+        with self.assertRaises(circuit.BackendUnavailableError):
+            circuit.before_request("geoserver")
+
+    def test_open_circuit_waits_for_reset_timeout(self):
+        self.open_circuit(10)
+
+        with self.assertRaises(circuit.BackendUnavailableError):
+            circuit.before_request("geoserver")
+
+        self.assertEqual(self.get_state(), BackendCircuit.OPEN)
+
+
+class AdmissionTests(TestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(settings.HIS, {
+                "max_concurrent_updates": 1, "admission_queue_size": 1, "admission_retry_after": 7,
+                "admission_wait_timeout": 0, "update_poll_interval": 0
+            }),
+            mock.patch.object(admission, "_slots_created", 0)
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        admission.ensure_slots()
+
+    def add_ticket(self, priority):
+        return UpdateTicket.objects.create(priority=priority, heartbeat=timezone.now())
+
+    def test_interactive_updates_queue_ahead_of_bulk(self):
+        bulk_ticket = self.add_ticket(admission.BULK)
+        first = self.add_ticket(admission.INTERACTIVE)
+        second = self.add_ticket(admission.INTERACTIVE)
+
+        self.assertEqual(admission.get_queue_position(first), 0)
+        self.assertEqual(admission.get_queue_position(second), 1)
+        self.assertEqual(admission.get_queue_position(bulk_ticket), 2)
+        self.assertEqual(admission.get_waiting(admission.INTERACTIVE).count(), 2)
+
+    def test_free_slot_is_claimed_and_released(self):
+        update = mock.Mock(return_value={"content": []})
+
+        self.assertEqual(admission.run_admitted(admission.INTERACTIVE, update, "res"), {"content": []})
+
+        update.assert_called_once_with("res")
+        self.assertEqual(admission.get_free_slots(), [0])
+
+    def test_full_queue_is_rejected(self):
+        self.assertEqual(admission.claim_slot("other", [0]), 0)
+        self.add_ticket(admission.INTERACTIVE)
+        update = mock.Mock()
+
+        with self.assertRaises(admission.AdmissionError) as context:
+            admission.run_admitted(admission.INTERACTIVE, update)
+
+        self.assertEqual(str(context.exception), "Error: Too many updates are queued.")
+        self.assertEqual(context.exception.retry_after, 7)
+        update.assert_not_called()
+
+    def test_bulk_queue_does_not_reject_interactive_update(self):
+        self.assertEqual(admission.claim_slot("other", [0]), 0)
+        self.add_ticket(admission.BULK)
+
+        with self.assertRaises(admission.AdmissionError) as context:
+            admission.run_admitted(admission.INTERACTIVE, mock.Mock())
+
+        self.assertEqual(str(context.exception), "Error: Timed out waiting for an update slot.")
+        self.assertEqual(UpdateTicket.objects.count(), 1)
+
+    def test_rejected_update_returns_429(self):
+        self.assertEqual(admission.claim_slot("other", [0]), 0)
+        self.add_ticket(admission.INTERACTIVE)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("user"))
+
+        response = client.post("/his/services/update/res/")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(response.data, {"message": "Error: Too many updates are queued."})
+
+
+class TracingTests(TestCase):
+
+    def setUp(self):
+        self.trace_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.trace_dir)
+        patcher = mock.patch.dict(settings.HIS, {"trace_dir": self.trace_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_events(self, res_id):
+        return {event["name"]: event for event in tracing.load_trace(res_id)["traceEvents"]}
+
+    def test_spans_are_nested_and_saved(self):
+        def request():
+            with tracing.span("http", backend="geoserver") as attributes:
+                attributes["status"] = 201
+
+        def update(result):
+            with tracing.span("registration", layers=1):
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    tracing.submit(executor, request).result()
+            return result
+
+        self.assertEqual(tracing.run_traced("res/1", update, "done"), "done")
+        self.assertEqual(os.listdir(self.trace_dir), ["res_1.json"])
+        self.assertEqual(tracing.load_trace("res/1")["otherData"], {"resource_id": "res/1"})
+
+        events = self.get_events("res/1")
+        self.assertEqual(set(events), {"update", "registration", "http"})
+        self.assertIsNone(events["update"]["args"]["parent_id"])
+        self.assertEqual(events["registration"]["args"]["parent_id"], events["update"]["args"]["span_id"])
+        self.assertEqual(events["http"]["args"]["parent_id"], events["registration"]["args"]["span_id"])
+        self.assertEqual(events["http"]["args"]["status"], 201)
+        self.assertEqual(events["http"]["cat"], "http")
+
+    def test_failed_update_is_traced(self):
+        with self.assertRaises(ValueError):
+            tracing.run_traced("res", mock.Mock(side_effect=ValueError))
+
+        self.assertEqual(self.get_events("res")["update"]["args"]["error"], "ValueError")
+
+    def test_spans_are_free_without_trace(self):
+        self.assertFalse(tracing.is_tracing())
+
+        with tracing.span("http", backend="geoserver") as attributes:
+            self.assertEqual(attributes, {})
+
+        self.assertIsNone(tracing.load_trace("res"))
+
+
+class PipelineTests(TransactionTestCase):
+
+    def run_update(self, engine):
+        responses = []
+
+        def post_update(res_id):
+            responses.append(pipeline.update_resource_services(res_id))
+            return 201, responses[-1]
+
+        with mock.patch.dict(settings.HIS, {"max_concurrent_updates": None}):
+            results = benchmark.run_benchmark(post_update, [10], 1, engine=engine, write=lambda line: None)
+
+        self.assertEqual(results[0]["failed"], 0)
+        self.assertEqual(len(responses[0]["content"]), 10)
+        self.assertTrue(all(i["success"] for i in responses[0]["content"]))
+        self.assertEqual(PublishedLayer.objects.filter(resource__resource_id=f"benchmark-{engine}-10-0").count(), 10)
+
+    def test_update_against_fake_backends(self):
+        self.run_update("threads")
+
+    @unittest.skipIf(async_clients.aiohttp is None, "aiohttp is not installed")
+    def test_async_update_against_fake_backends(self):
+        self.run_update("asyncio")
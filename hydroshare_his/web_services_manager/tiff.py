@@ -0,0 +1,580 @@
+import math
+import mmap
+import os
+import struct
+import zlib
+from collections import namedtuple
+from hydroshare_his import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TiffError(Exception):
+    """
+    Raised when a file is not a TIFF this module can read.
+    """
+
+
+TiffHeader = namedtuple("TiffHeader", (
+    "width",
+    "height",
+    "samples_per_pixel",
+    "bits_per_sample",
+    "sample_format",
+    "compression",
+    "tiled",
+    "overviews",
+    "bbox",
+    "crs",
+    "warnings"
+))
+
+
+TiffDirectory = namedtuple("TiffDirectory", (
+    "width",
+    "height",
+    "samples_per_pixel",
+    "bits_per_sample",
+    "sample_format",
+    "compression",
+    "predictor",
+    "planar_config",
+    "block_width",
+    "block_height",
+    "offsets",
+    "byte_counts",
+    "subfile_type",
+    "byte_order",
+    "tags"
+))
+
+
+# TIFF field types: struct format and size of one value.
+FIELD_TYPES = {
+    1: ("B", 1),
+    2: ("s", 1),
+    3: ("H", 2),
+    4: ("I", 4),
+    5: ("I", 8),
+    6: ("b", 1),
+    7: ("B", 1),
+    8: ("h", 2),
+    9: ("i", 4),
+    10: ("i", 8),
+    11: ("f", 4),
+    12: ("d", 8),
+    16: ("Q", 8),
+    17: ("q", 8),
+    18: ("Q", 8),
+}
+
+NEW_SUBFILE_TYPE = 254
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIG = 284
+PREDICTOR = 317
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+SAMPLE_FORMAT = 339
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+MODEL_TRANSFORMATION = 34264
+GEO_KEY_DIRECTORY = 34735
+GDAL_NODATA = 42113
+
+UNCOMPRESSED = 1
+DEFLATE = (8, 32946)
+
+# Compressions GeoServer's GeoTIFF reader decodes: none, CCITT, LZW, JPEG, deflate, and PackBits.
+SUPPORTED_COMPRESSIONS = frozenset((1, 2, 3, 4, 5, 7, 8, 32773, 32946))
+
+GT_RASTER_TYPE = 1025
+GEOGRAPHIC_TYPE = 2048
+PROJECTED_CS_TYPE = 3072
+RASTER_PIXEL_IS_AREA = 1
+USER_DEFINED = 32767
+
+# Largest piece of a block decoded and reduced at once.
+CHUNK_BYTES = 16 * 1024 * 1024
+INPUT_BYTES = 1024 * 1024
+
+
+def read_tag_value(buffer, byte_order, field_type, count, value_offset):
+    fmt, size = FIELD_TYPES[field_type]
+
+    if field_type == 2:
+        return bytes(buffer[value_offset:value_offset + count]).split(b"\0", 1)[0].decode("latin-1")
+
+    if field_type in (5, 10):
+        values = struct.unpack_from(f"{byte_order}{count * 2}{fmt}", buffer, value_offset)
+        return tuple(values[i] / values[i + 1] if values[i + 1] else 0.0 for i in range(0, len(values), 2))
+
+    return struct.unpack_from(f"{byte_order}{count}{fmt}", buffer, value_offset)
+
+
+def read_directories(buffer):
+    """
+    Reads every image file directory of a classic or BigTIFF file as TiffDirectory records.
+    """
+
+    if len(buffer) < 8 or bytes(buffer[:2]) not in (b"II", b"MM"):
+        raise TiffError("Not a TIFF file.")
+
+    byte_order = "<" if bytes(buffer[:2]) == b"II" else ">"
+    version = struct.unpack_from(f"{byte_order}H", buffer, 2)[0]
+
+    if version == 42:
+        count_fmt, entry_size, offset_fmt, inline_size = "H", 12, "I", 4
+        next_offset = struct.unpack_from(f"{byte_order}I", buffer, 4)[0]
+    elif version == 43:
+        count_fmt, entry_size, offset_fmt, inline_size = "Q", 20, "Q", 8
+        next_offset = struct.unpack_from(f"{byte_order}Q", buffer, 8)[0]
+    else:
+        raise TiffError("Not a TIFF file.")
+
+    count_size = struct.calcsize(count_fmt)
+    offset_size = struct.calcsize(offset_fmt)
+    directories = []
+    visited = set()
+
+    while next_offset and next_offset not in visited:
+        if next_offset + count_size > len(buffer):
+            raise TiffError("Truncated TIFF file.")
+
+        visited.add(next_offset)
+        entry_count = struct.unpack_from(f"{byte_order}{count_fmt}", buffer, next_offset)[0]
+        tags = {}
+
+        for i in range(entry_count):
+            entry = next_offset + count_size + i * entry_size
+            tag, field_type, count = struct.unpack_from(f"{byte_order}HH{offset_fmt}", buffer, entry)
+            if field_type not in FIELD_TYPES:
+                continue
+            value_offset = entry + 4 + offset_size
+            if FIELD_TYPES[field_type][1] * count > inline_size:
+                value_offset = struct.unpack_from(f"{byte_order}{offset_fmt}", buffer, value_offset)[0]
+            if value_offset + FIELD_TYPES[field_type][1] * count > len(buffer):
+                raise TiffError("Truncated TIFF file.")
+            tags[tag] = read_tag_value(buffer, byte_order, field_type, count, value_offset)
+
+        directories.append(get_directory(tags, byte_order))
+        next_offset = struct.unpack_from(
+            f"{byte_order}{offset_fmt}", buffer, next_offset + count_size + entry_count * entry_size
+        )[0]
+
+    if not directories:
+        raise TiffError("TIFF file has no images.")
+
+    return directories
+
+
+def get_directory(tags, byte_order):
+    width = tags.get(IMAGE_WIDTH, (0,))[0]
+    height = tags.get(IMAGE_LENGTH, (0,))[0]
+
+    if TILE_OFFSETS in tags:
+        block_width = tags.get(TILE_WIDTH, (0,))[0]
+        block_height = tags.get(TILE_LENGTH, (0,))[0]
+        offsets = tags[TILE_OFFSETS]
+        byte_counts = tags.get(TILE_BYTE_COUNTS, ())
+    else:
+        block_width = width
+        block_height = min(tags.get(ROWS_PER_STRIP, (height,))[0], height) or height
+        offsets = tags.get(STRIP_OFFSETS, ())
+        byte_counts = tags.get(STRIP_BYTE_COUNTS, ())
+
+    return TiffDirectory(
+        width,
+        height,
+        tags.get(SAMPLES_PER_PIXEL, (1,))[0],
+        tags.get(BITS_PER_SAMPLE, (1,))[0],
+        tags.get(SAMPLE_FORMAT, (1,))[0],
+        tags.get(COMPRESSION, (UNCOMPRESSED,))[0],
+        tags.get(PREDICTOR, (1,))[0],
+        tags.get(PLANAR_CONFIG, (1,))[0],
+        block_width,
+        block_height,
+        offsets,
+        byte_counts,
+        tags.get(NEW_SUBFILE_TYPE, (0,))[0],
+        byte_order,
+        tags
+    )
+
+
+def get_nodata(directory):
+    """
+    Gets the GDAL nodata value of an image, or None if it has none.
+    """
+
+    nodata = directory.tags.get(GDAL_NODATA)
+
+    if not nodata:
+        return None
+
+    try:
+        return float(nodata.strip())
+    except ValueError:
+        return None
+
+
+def get_geokeys(tags):
+    """
+    Gets the GeoTIFF keys whose values are stored in the key directory itself.
+    """
+
+    directory = tags.get(GEO_KEY_DIRECTORY, ())
+    geokeys = {}
+
+    for i in range(4, len(directory) - 3, 4):
+        key, location, count, value = directory[i:i + 4]
+        if location == 0 and count == 1:
+            geokeys[key] = value
+
+    return geokeys
+
+
+def get_bbox(image, geokeys):
+    """
+    Gets (bounding box, EPSG identifier) of an image georeferenced by a tiepoint and pixel scale in
+    an EPSG coordinate system, or (None, None) if GeoServer has to work it out.
+    """
+
+    code = geokeys.get(PROJECTED_CS_TYPE) or geokeys.get(GEOGRAPHIC_TYPE)
+    tiepoint = image.tags.get(MODEL_TIEPOINT, ())
+    scale = image.tags.get(MODEL_PIXEL_SCALE, ())
+
+    if (
+        code in (None, USER_DEFINED) or MODEL_TRANSFORMATION in image.tags or len(tiepoint) != 6 or
+        len(scale) < 2 or geokeys.get(GT_RASTER_TYPE, RASTER_PIXEL_IS_AREA) != RASTER_PIXEL_IS_AREA
+    ):
+        return None, None
+
+    minx = tiepoint[3] - tiepoint[0] * scale[0]
+    maxy = tiepoint[4] + tiepoint[1] * scale[1]
+
+    bbox = (minx, maxy - image.height * scale[1], minx + image.width * scale[0], maxy)
+
+    if not all(math.isfinite(value) for value in bbox) or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        return None, None
+
+    return bbox, f"EPSG:{code}"
+
+
+def check_header(path, buffer, directories):
+    """
+    Checks that GeoServer can import a GeoTIFF and summarizes its layout as a TiffHeader.
+
+    Raises TiffError with the reason if the image has no georeferencing, an unsupported compression,
+    or blocks outside the file. warnings lists layouts that render slowly in WMS.
+    """
+
+    image = directories[0]
+
+    if not image.width or not image.height:
+        raise TiffError("TIFF image has no pixels.")
+
+    if image.compression not in SUPPORTED_COMPRESSIONS:
+        raise TiffError(f"Unsupported TIFF compression {image.compression}.")
+
+    if not image.offsets or len(image.offsets) != len(image.byte_counts):
+        raise TiffError("TIFF image has no data blocks.")
+
+    if max(offset + count for offset, count in zip(image.offsets, image.byte_counts)) > len(buffer):
+        raise TiffError("Truncated TIFF file.")
+
+    georeferenced = GEO_KEY_DIRECTORY in image.tags and (
+        MODEL_TRANSFORMATION in image.tags or (MODEL_TIEPOINT in image.tags and MODEL_PIXEL_SCALE in image.tags)
+    )
+    base_path = os.path.splitext(path)[0]
+
+    if not georeferenced and not any(os.path.isfile(f"{base_path}.{i}") for i in ("tfw", "tifw", "wld")):
+        raise TiffError("TIFF file has no georeferencing.")
+
+    tiled = TILE_OFFSETS in image.tags
+    overviews = sum(1 for i in directories[1:] if i.subfile_type & 1)
+    warnings = []
+
+    if image.width * image.height > settings.HIS.get("slow_raster_pixels", 16777216):
+        if not tiled:
+            warnings.append("Raster is not internally tiled and will render slowly in WMS.")
+        if not overviews:
+            warnings.append("Raster has no overviews and will render slowly in WMS at small scales.")
+
+    bbox, crs = get_bbox(image, get_geokeys(image.tags)) if georeferenced else (None, None)
+
+    return TiffHeader(
+        image.width,
+        image.height,
+        image.samples_per_pixel,
+        image.bits_per_sample,
+        image.sample_format,
+        image.compression,
+        tiled,
+        overviews,
+        bbox,
+        crs,
+        warnings
+    )
+
+
+def read_header(path):
+    """
+    Reads and checks a GeoTIFF's image file directories from a memory-mapped file, without touching
+    its pixel data. Raises TiffError if GeoServer cannot import the file.
+    """
+
+    try:
+        with open(path, "rb") as tiff_file:
+            if os.fstat(tiff_file.fileno()).st_size == 0:
+                raise TiffError("Empty TIFF file.")
+            with mmap.mmap(tiff_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return check_header(path, buffer, read_directories(buffer))
+    except OSError as e:
+        raise TiffError(f"Unable to read TIFF file: {e.strerror}.")
+    except (ValueError, struct.error):
+        raise TiffError("Corrupt TIFF file.")
+
+
+def get_local_header(db):
+    """
+    Reads and checks a raster layer's GeoTIFF in geoserver_data_dir, or returns None if the file is
+    not available locally.
+    """
+
+    geoserver_directory = settings.HIS.get("geoserver_data_dir")
+
+    if geoserver_directory is None:
+        return None
+
+    path = os.path.join(geoserver_directory, db["hs_path"])
+
+    if not os.path.isfile(path):
+        return None
+
+    return read_header(path)
+
+
+def get_dtype(directory):
+    kind = {1: "u", 2: "i", 3: "f"}.get(directory.sample_format)
+
+    if kind is None or directory.bits_per_sample not in (8, 16, 32, 64) or (kind == "f" and directory.bits_per_sample < 32):
+        raise TiffError("Unsupported TIFF sample type.")
+
+    return numpy.dtype(f"{directory.byte_order}{kind}{directory.bits_per_sample // 8}")
+
+
+def read_chunks(buffer, offset, byte_count, compression, chunk_size, total_size):
+    """
+    Yields a block's decoded bytes in pieces of chunk_size without decoding the whole block at once.
+    """
+
+    if compression == UNCOMPRESSED:
+        for start in range(0, total_size, chunk_size):
+            yield offset + start, min(chunk_size, total_size - start)
+        return
+
+    decompressor = zlib.decompressobj()
+    position = offset
+    end = offset + byte_count
+    pending = b""
+
+    for start in range(0, total_size, chunk_size):
+        size = min(chunk_size, total_size - start)
+        chunk = bytearray()
+        while len(chunk) < size:
+            if not pending:
+                if position >= end:
+                    raise TiffError("Truncated TIFF block.")
+                pending = buffer[position:min(position + INPUT_BYTES, end)]
+                position += len(pending)
+            chunk += decompressor.decompress(pending, size - len(chunk))
+            pending = decompressor.unconsumed_tail
+        yield chunk, size
+
+
+def decode_rows(data, predictor, dtype, columns, samples):
+    """
+    Converts decompressed block rows to a (rows, columns, samples) array, reversing the horizontal
+    (2) or floating point (3) predictor.
+    """
+
+    if predictor == 3:
+        raw = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, columns * samples * dtype.itemsize)
+        raw = numpy.cumsum(raw, axis=1, dtype=numpy.uint8)
+        raw = raw.reshape(-1, dtype.itemsize, columns * samples).transpose(0, 2, 1)
+        values = numpy.ascontiguousarray(raw).view(dtype.newbyteorder(">"))
+        return values.reshape(-1, columns, samples)
+
+    values = numpy.frombuffer(data, dtype=dtype).reshape(-1, columns, samples)
+
+    if predictor == 2:
+        values = numpy.cumsum(values, axis=1, dtype=dtype)
+
+    return values
+
+
+def iter_band(buffer, directory):
+    """
+    Yields the first band of an image as 2-D arrays, one chunk of block rows at a time.
+    """
+
+    if directory.compression != UNCOMPRESSED and directory.compression not in DEFLATE:
+        raise TiffError("Unsupported TIFF compression.")
+
+    if directory.predictor not in (1, 2, 3):
+        raise TiffError("Unsupported TIFF predictor.")
+
+    dtype = get_dtype(directory)
+    samples = 1 if directory.planar_config == 2 else directory.samples_per_pixel
+    blocks_across = math.ceil(directory.width / directory.block_width)
+    blocks_down = math.ceil(directory.height / directory.block_height)
+    row_bytes = directory.block_width * samples * dtype.itemsize
+    chunk_rows = max(1, CHUNK_BYTES // row_bytes)
+
+    if len(directory.offsets) < blocks_across * blocks_down:
+        raise TiffError("Truncated TIFF block index.")
+
+    for index in range(blocks_across * blocks_down):
+        block_row, block_column = divmod(index, blocks_across)
+        rows = min(directory.block_height, directory.height - block_row * directory.block_height)
+        columns = min(directory.block_width, directory.width - block_column * directory.block_width)
+        byte_count = directory.byte_counts[index] if index < len(directory.byte_counts) else 0
+
+        if directory.offsets[index] == 0:
+            continue
+
+        chunks = read_chunks(
+            buffer, directory.offsets[index], byte_count, directory.compression,
+            chunk_rows * row_bytes, rows * row_bytes
+        )
+
+        for data, size in chunks:
+            if directory.compression == UNCOMPRESSED:
+                if data + size > len(buffer):
+                    raise TiffError("Truncated TIFF block.")
+                data = numpy.frombuffer(buffer, dtype=numpy.uint8, count=size, offset=data)
+            values = decode_rows(data, directory.predictor, dtype, directory.block_width, samples)
+            yield values[:, :columns, 0]
+
+
+def get_band_statistics(buffer, directory, nodata):
+    """
+    Reduces the first band of an image to (minimum, maximum), skipping nodata and NaN values.
+    """
+
+    minimum = None
+    maximum = None
+
+    for values in iter_band(buffer, directory):
+        if values.dtype.kind == "f" or nodata is not None:
+            valid = numpy.ones(values.shape, dtype=bool)
+            if values.dtype.kind == "f":
+                valid &= ~numpy.isnan(values)
+            if nodata is not None:
+                valid &= values != nodata
+            if not valid.any():
+                continue
+            values = values[valid]
+        if values.size == 0:
+            continue
+        block_min = values.min().item()
+        block_max = values.max().item()
+        minimum = block_min if minimum is None else min(minimum, block_min)
+        maximum = block_max if maximum is None else max(maximum, block_max)
+
+    if minimum is None:
+        return None
+
+    return minimum, maximum
+
+
+def select_directory(directories, max_pixels):
+    """
+    Picks the full-resolution image, or its largest overview within max_pixels when the image is larger.
+    """
+
+    image = directories[0]
+
+    if max_pixels is None or image.width * image.height <= max_pixels:
+        return image
+
+    overviews = [
+        i for i in directories[1:]
+        if i.subfile_type & 1 and i.samples_per_pixel == image.samples_per_pixel
+    ]
+    within = [i for i in overviews if i.width * i.height <= max_pixels]
+
+    if within:
+        return max(within, key=lambda i: i.width * i.height)
+    if overviews:
+        return min(overviews, key=lambda i: i.width * i.height)
+
+    return image
+
+
+def format_value(value):
+    """
+    Formats a statistic the way GDAL writes it to a VRT file.
+    """
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+def get_raster_statistics(path, max_pixels=None):
+    """
+    Computes (maximum, minimum, nodata) of a GeoTIFF's first band from a memory-mapped file, one
+    block at a time. Images with more than max_pixels pixels are summarized from an overview when
+    one exists. Returns None if the file cannot be read or has no valid values.
+    """
+
+    if numpy is None:
+        return None
+
+    try:
+        with open(path, "rb") as tiff_file:
+            if os.fstat(tiff_file.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(tiff_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                directories = read_directories(buffer)
+                nodata = get_nodata(directories[0])
+                statistics = get_band_statistics(buffer, select_directory(directories, max_pixels), nodata)
+    except (OSError, ValueError, BufferError, TiffError, zlib.error, struct.error):
+        return None
+
+    if statistics is None or statistics[0] >= statistics[1]:
+        return None
+
+    minimum, maximum = statistics
+
+    return format_value(maximum), format_value(minimum), format_value(nodata) if nodata is not None else None
+
+
+def get_local_statistics(db):
+    """
+    Computes a raster layer's statistics from the GeoTIFF in geoserver_data_dir.
+    """
+
+    geoserver_directory = settings.HIS.get("geoserver_data_dir")
+
+    if geoserver_directory is None:
+        return None
+
+    return get_raster_statistics(
+        os.path.join(geoserver_directory, db["hs_path"]),
+        settings.HIS.get("raster_stats_max_pixels")
+    )
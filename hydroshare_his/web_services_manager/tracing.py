@@ -0,0 +1,156 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from hydroshare_his import settings
+
+
+_trace = contextvars.ContextVar("his_trace", default=None)
+_parent = contextvars.ContextVar("his_trace_parent", default=None)
+
+
+class Trace:
+    """
+    Spans recorded during one traced resource update, in the Chrome trace event format.
+    """
+
+    def __init__(self, res_id):
+        self.res_id = res_id
+        self.start = time.perf_counter()
+        self.events = []
+        self.span_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add_span(self, name, span_id, parent_id, start, end, attributes):
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": dict(attributes, span_id=span_id, parent_id=parent_id)
+        }
+
+        with self.lock:
+            self.events.append(event)
+
+    def to_json(self):
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"resource_id": self.res_id}
+        }
+
+
+def is_tracing():
+    return _trace.get() is not None
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Records a span around a block while a trace is active. Yields a dict the block can add attributes
+    such as sizes or status codes to.
+    """
+
+    trace = _trace.get()
+
+    if trace is None:
+        yield {}
+        return
+
+    span_id = next(trace.span_ids)
+    parent_id = _parent.get()
+    token = _parent.set(span_id)
+    start = time.perf_counter()
+
+    try:
+        yield attributes
+    except Exception as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        trace.add_span(name, span_id, parent_id, start, time.perf_counter(), attributes)
+
+
+def submit(executor, function, *args, **kwargs):
+    """
+    Submits a call to an executor so it runs inside the caller's trace and span.
+    """
+
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
+
+
+def get_trace_path(res_id):
+    trace_dir = settings.HIS.get("trace_dir")
+
+    if trace_dir is None:
+        return None
+
+    file_name = re.sub(r"[^\w-]", "_", str(res_id))
+
+    return os.path.join(trace_dir, f"{file_name}.json")
+
+
+def save_trace(trace):
+    """
+    Writes a trace to trace_dir, replacing the previous trace of the same resource.
+    """
+
+    path = get_trace_path(trace.res_id)
+
+    if path is None:
+        return
+
+    temporary_path = f"{path}.{threading.get_ident()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary_path, "w") as trace_file:
+            json.dump(trace.to_json(), trace_file)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+def load_trace(res_id):
+    """
+    Reads the last trace written for a resource, or returns None if there is none.
+    """
+
+    path = get_trace_path(res_id)
+
+    if path is None:
+        return None
+
+    try:
+        with open(path) as trace_file:
+            return json.load(trace_file)
+    except (OSError, ValueError):
+        return None
+
+
+def run_traced(res_id, function, *args, **kwargs):
+    """
+    Runs function(...) with a trace of res_id active, then saves the trace.
+    """
+
+    trace = Trace(res_id)
+    token = _trace.set(trace)
+
+    try:
+        with span("update", resource_id=res_id):
+            return function(*args, **kwargs)
+    finally:
+        _trace.reset(token)
+        save_trace(trace)
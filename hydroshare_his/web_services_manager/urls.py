@@ -6,7 +6,11 @@ from web_services_manager import views
 #(?P<file_path>.*)
 
 urlpatterns = [
+    url(r'^update/$', views.Services.as_view({"post":"post_bulk_update_services"}), name="bulk_update_services"),
     url(r'^update/(?P<resource_id>[\w\-]+)/$', views.Services.as_view({"post":"post_update_services"}), name="update_services"),
+    url(r'^jobs/(?P<job_id>[\w\-]+)/$', views.Services.as_view({"get":"get_job_status"}), name="job_status"),
+    url(r'^resource/(?P<resource_id>[\w\-]+)/$', views.Services.as_view({"get":"get_resource_services"}), name="resource_services"),
+    url(r'^traces/(?P<resource_id>[\w\-]+)/$', views.Services.as_view({"get":"get_update_trace"}), name="update_trace"),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns, allowed=None)
@@ -1,52 +1,26 @@
-import requests
 import json
 import os
+import hashlib
 import urllib
+import requests
 from hydroshare_his import settings
 from lxml import etree
+from web_services_manager import clients
+from web_services_manager import circuit
+from web_services_manager import classification
+from web_services_manager import inventory
+from web_services_manager import registry
+from web_services_manager import tiff
+from web_services_manager import styles
+from web_services_manager import tracing
 
 
 def get_layer_style(max_value, min_value, ndv_value, layer_id):
     """
     Sets default style for raster layers.
     """
-    if ndv_value < min_value:
-        low_ndv = f'<ColorMapEntry color="#000000" quantity="{ndv_value}" label="nodata" opacity="0.0" />'
-        high_ndv = ""
-    elif ndv_value > max_value:
-        low_ndv = ""
-        high_ndv = f'<ColorMapEntry color="#000000" quantity="{ndv_value}" label="nodata" opacity="0.0" />'
-    else:
-        low_ndv = ""
-        high_ndv = ""
-    layer_style = f"""<?xml version="1.0" encoding="ISO-8859-1"?>
-    <StyledLayerDescriptor version="1.0.0" xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc"
-      xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
-      xsi:schemaLocation="http://www.opengis.net/sld http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd">
-      <NamedLayer>
-        <Name>simpleraster</Name>
-        <UserStyle>
-          <Name>{layer_id}</Name>
-          <Title>Default raster style</Title>
-          <Abstract>Default greyscale raster style</Abstract>
-          <FeatureTypeStyle>
-            <Rule>
-              <RasterSymbolizer>
-                <Opacity>1.0</Opacity>
-                <ColorMap>
-                  {low_ndv}
-                  <ColorMapEntry color="#000000" quantity="{min_value}" label="values" />
-                  <ColorMapEntry color="#FFFFFF" quantity="{max_value}" label="values" />
-                  {high_ndv}
-                </ColorMap>
-              </RasterSymbolizer>
-            </Rule>
-          </FeatureTypeStyle>
-        </UserStyle>
-      </NamedLayer>
-    </StyledLayerDescriptor>"""
-
-    return layer_style
+
+    return styles.render_raster_style(max_value, min_value, ndv_value, layer_id)
 
 
 def get_geoserver_list(res_id):
@@ -54,67 +28,101 @@ def get_geoserver_list(res_id):
     Gets a list of data stores and coverages from a GeoServer workspace.
     """
 
-    layer_list = []
+    return inventory.GeoServerInventory(res_id).fetch().get_layer_list()
 
-    geoserver_namespace = settings.HIS.get("geoserver_ns")
-    geoserver_url = settings.HIS.get("geoserver_url")
-    geoserver_user = settings.HIS.get("geoserver_user")
-    geoserver_pass = settings.HIS.get("geoserver_pass")
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
 
-    workspace_id = f"{geoserver_namespace}-{res_id}"
+def get_hydroserver_list(res_id):
+    """
+    Gets a list of databases from a HydroServer network.
+    """
 
-    headers = {
-        "content-type": "application/json"
-    }
+    return inventory.HydroServerInventory(res_id).fetch().get_database_list()
 
-    ds_rest_url = f"{geoserver_url}/workspaces/{workspace_id}/datastores.json"
-    cv_rest_url = f"{geoserver_url}/workspaces/{workspace_id}/coverages.json"
-    ds_response = requests.get(ds_rest_url, auth=geoserver_auth, headers=headers)
-    cv_response = requests.get(cv_rest_url, auth=geoserver_auth, headers=headers)
 
-    if ds_response.status_code == 200:
-        ds_response_content = json.loads(ds_response.content)
-        if ds_response_content.get("dataStores") and ds_response_content.get("dataStores") != "":
-            for datastore in ds_response_content["dataStores"]["dataStore"]:
-                layer_list.append((datastore["name"], "datastores"))
+def get_file_list(res_id):
+    """
+    Gets an iterator over a resource's HydroShare file list, or None if the resource is not publicly accessible.
+
+    Pages are fetched and parsed one at a time, following pagination links, as the iterator is consumed.
+    """
+
+    hydroshare_url = settings.HIS.get("hydroshare_url")
+    rest_url = f"{hydroshare_url}/resource/{res_id}/file_list/"
+    response = clients.get("hydroshare", rest_url, operation="list")
 
-    if cv_response.status_code == 200:
-        cv_response_content = json.loads(cv_response.content)
-        if cv_response_content.get("coverages") and cv_response_content.get("coverages") != "":
-            for coverage in cv_response_content["coverages"]["coverage"]:
-                layer_list.append((coverage["name"], "coveragestores"))
+    if response.status_code != 200:
+        return None
 
-    return layer_list
+    return iter_file_list_pages(response)
 
 
-def get_hydroserver_list(res_id):
+def iter_file_list_pages(response):
     """
-    Gets a list of data stores and coverages from a GeoServer workspace.
+    Yields file list entries from a first page response and every page linked after it.
+
+    Raises circuit.BackendUnavailableError if a later page cannot be fetched, so a partial file
+    list is never reconciled.
     """
 
-    database_list = []
+    while True:
+        page = json.loads(response.content.decode('utf-8'))
+        next_url = page.get("next")
+        response = None
 
-    hydroserver_url = settings.HIS.get("hydroserver_url")
+        for result in page["results"]:
+            yield result
 
-    if hydroserver_url is not None:
-        rest_url = f"{hydroserver_url}/manage/network/{res_id}/databases/"
-        response = requests.get(rest_url)
+        page = None
 
-        if response.status_code == 200:
-            response_content = json.loads(response.content)
-            for database in response_content:
-                database_list.append(database["database_id"])
+        if not next_url:
+            return
 
-    return database_list
+        try:
+            response = clients.get("hydroshare", next_url, operation="list")
+        except requests.exceptions.RequestException:
+            raise circuit.BackendUnavailableError("hydroshare")
+
+        if response.status_code != 200:
+            raise circuit.BackendUnavailableError("hydroshare")
 
 
-def get_database_list(res_id):
+class FileListFingerprint:
+    """
+    Order-independent hash of the parts of a HydroShare file list that affect which web services are published.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def update(self, result):
+        digest = hashlib.sha256(json.dumps([
+            result["url"],
+            result.get("content_type"),
+            result.get("logical_file_type"),
+            result.get("size"),
+            result.get("checksum")
+        ]).encode("utf-8")).digest()
+        self.total = (self.total + int.from_bytes(digest, "big")) % (1 << 256)
+        self.count += 1
+
+    def track(self, file_list):
+        for result in file_list:
+            self.update(result)
+            yield result
+
+    def hexdigest(self):
+        return hashlib.sha256(f"{self.count}:{self.total:064x}".encode("utf-8")).hexdigest()
+
+
+def get_database_list(res_id, layers=None, geoserver_inventory=None, hydroserver_inventory=None):
     """
     Gets a list of HydroShare databases on which web services can be published.
+
+    layers, if given, is the output of classification.classify_files for the resource's file list.
+    Inventories that are not given are fetched from the backends. Only new, removed, and changed
+    layers are listed. A workspace or network is created only if it does not exist, and never on a
+    backend whose inventory is unavailable.
     """
 
     db_list = {
@@ -131,114 +139,40 @@ def get_database_list(res_id):
         }
     }
 
-    hydroshare_url = settings.HIS.get("hydroshare_url")
-    rest_url = f"{hydroshare_url}/resource/{res_id}/file_list/"
-    response = requests.get(rest_url)
+    if layers is None:
+        file_list = get_file_list(res_id)
+        if file_list is None:
+            db_list["access"] = "private"
+            return db_list
+        layers = classification.classify_files(file_list)
 
-    if response.status_code != 200:
-        db_list["access"] = "private"
-        return db_list
-    else:
-        db_list["access"] = "public"
+    db_list["access"] = "public"
 
-    file_list = json.loads(response.content.decode('utf-8'))["results"]
+    if geoserver_inventory is None:
+        geoserver_inventory = inventory.GeoServerInventory(res_id).fetch()
 
-    geoserver_list = get_geoserver_list(res_id)
-    if geoserver_list:
+    if hydroserver_inventory is None:
+        hydroserver_inventory = inventory.HydroServerInventory(res_id).fetch()
+
+    geoserver_list = geoserver_inventory.get_layer_list()
+    if geoserver_inventory.workspace_exists:
         db_list["geoserver"]["create_workspace"] = False
 
-    hydroserver_list = get_hydroserver_list(res_id)
-    if hydroserver_list:
+    hydroserver_list = hydroserver_inventory.get_database_list()
+    if hydroserver_inventory.network_exists:
         db_list["hydroserver"]["create_network"] = False
 
-    registered_list = []
-
-    for result in file_list:
-        if (
-                result["logical_file_type"] == "GeoRasterLogicalFile" and 
-                result["content_type"] == "image/tiff" and 
-                settings.HIS.get("geoserver_url") is not None
-            ) or (
-                result["logical_file_type"] == "GeoFeatureLogicalFile" and 
-                result["content_type"] == "application/x-qgis" and
-                settings.HIS.get("geoserver_url") is not None
-            ):
-
-            layer_name = "/".join(result["url"].split("/")[7:-1])
-            layer_path = "/".join(result["url"].split("/")[4:])
-            file_name = ".".join(result["url"].split("/")[-1].split(".")[:-1])
-            layer_ext = result["url"].split("/")[-1].split(".")[-1]
-            layer_type = result["content_type"]
-            if result["content_type"] == "image/tiff" and layer_ext == "tif":
-                registered_list.append(layer_name.replace("/", " "))
-                if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
-                    db_list["geoserver"]["register"].append(
-                        {
-                            "layer_name": layer_name,
-                            "layer_type": "GeographicRaster",
-                            "file_name": file_name,
-                            "file_type": "geotiff",
-                            "hs_path": layer_path,
-                            "store_type": "coveragestores",
-                            "layer_group": "coverages",
-                            "verification": "coverage"
-                        }
-                    )
-            if result["content_type"] == "application/x-qgis" and layer_ext == "shp":
-                registered_list.append(layer_name.replace("/", " "))
-                if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
-                    db_list["geoserver"]["register"].append(
-                        {
-                            "layer_name": layer_name,
-                            "layer_type": "GeographicFeature",
-                            "file_name": file_name,
-                            "file_type": "shp",
-                            "hs_path": layer_path,
-                            "store_type": "datastores",
-                            "layer_group": "featuretypes",
-                            "verification": "featureType"
-                        }
-                    )
-
-        elif (
-                result["logical_file_type"] == "TimeSeriesLogicalFile" and 
-                result["url"].split("/")[-1].split(".")[-1] in ("sqlite", "db") and
-                settings.HIS.get("hydroserver_url") is not None
-            ):
-
-            layer_name = "/".join(result["url"].split("/")[7:-1])
-            registered_list.append(layer_name)
-
-            if layer_name not in hydroserver_list:
-                db_list["hydroserver"]["register"].append(
-                    {
-                        "database_name": layer_name,
-                        "hs_path": "/".join(result["url"].split("/")[4:]),
-                        "layer_title": ".".join(result["url"].split("/")[-1].split(".")[:-1])
-                    }
-                )
-
-    for layer in geoserver_list:
-        if layer[0] not in registered_list:
-            db_list["geoserver"]["unregister"].append(
-                {
-                    "layer_name": layer[0],
-                    "store_type": layer[1]
-                }
-            )
-
-    for database in hydroserver_list:
-        if database not in registered_list:
-            db_list["hydroserver"]["unregister"].append(
-                {
-                    "database_name": database
-                }
-            )
-
-    if not db_list["geoserver"]["register"]:
+    (
+        db_list["geoserver"]["register"],
+        db_list["geoserver"]["unregister"],
+        db_list["hydroserver"]["register"],
+        db_list["hydroserver"]["unregister"]
+    ) = classification.reconcile(layers, geoserver_list, hydroserver_list, registry.get_file_versions(res_id))
+
+    if not db_list["geoserver"]["register"] or not geoserver_inventory.available:
         db_list["geoserver"]["create_workspace"] = False
 
-    if not db_list["hydroserver"]["register"]:
+    if not db_list["hydroserver"]["register"] or not hydroserver_inventory.available:
         db_list["hydroserver"]["create_network"] = False
 
     return db_list
@@ -251,24 +185,16 @@ def register_geoserver_workspace(res_id):
 
     geoserver_namespace = settings.HIS.get("geoserver_ns")
     geoserver_url = settings.HIS.get("geoserver_url")
-    geoserver_user = settings.HIS.get("geoserver_user")
-    geoserver_pass = settings.HIS.get("geoserver_pass")
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
 
     workspace_id = f"{geoserver_namespace}-{res_id}"
 
-    unregister_geoserver_databases(res_id)
-
     headers = {
         "content-type": "application/json"
     }
 
     data = json.dumps({"workspace": {"name": workspace_id}})
     rest_url = f"{geoserver_url}/workspaces"
-    response = requests.post(rest_url, headers=headers, data=data, auth=geoserver_auth)
+    response = clients.post("geoserver", rest_url, headers=headers, data=data, operation="create_workspace")
 
     return workspace_id
 
@@ -276,14 +202,6 @@ def register_geoserver_workspace(res_id):
 def register_hydroserver_network(res_id):
     
     hydroserver_url = settings.HIS.get("hydroserver_url")
-    hydroserver_user = settings.HIS.get("hydroserver_user")
-    hydroserver_pass = settings.HIS.get("hydroserver_pass")
-    hydroserver_auth = requests.auth.HTTPBasicAuth(
-        hydroserver_user, 
-        hydroserver_pass
-    )
-
-    unregister_hydroserver_databases(res_id)
 
     rest_url = f"{hydroserver_url}/manage/networks/"
 
@@ -291,7 +209,7 @@ def register_hydroserver_network(res_id):
         "network_id": res_id
     }
 
-    response = requests.post(rest_url, data=data, auth=hydroserver_auth)
+    response = clients.post("hydroserver", rest_url, data=data, operation="create_network")
 
     return response
 
@@ -303,12 +221,6 @@ def unregister_geoserver_databases(res_id):
 
     geoserver_namespace = settings.HIS.get("geoserver_ns")
     geoserver_url = settings.HIS.get("geoserver_url")
-    geoserver_user = settings.HIS.get("geoserver_user")
-    geoserver_pass = settings.HIS.get("geoserver_pass")
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
 
     workspace_id = f"{geoserver_namespace}-{res_id}"
 
@@ -323,7 +235,7 @@ def unregister_geoserver_databases(res_id):
     rest_url = f"{geoserver_url}/workspaces/{workspace_id}"
 
     if geoserver_url is not None:
-        response = requests.delete(rest_url, params=params, auth=geoserver_auth, headers=headers)
+        response = clients.delete("geoserver", rest_url, params=params, headers=headers, operation="delete")
     else:
         response = None
 
@@ -336,37 +248,147 @@ def unregister_hydroserver_databases(res_id):
     """
 
     hydroserver_url = settings.HIS.get("hydroserver_url")
-    hydroserver_user = settings.HIS.get("hydroserver_user")
-    hydroserver_pass = settings.HIS.get("hydroserver_pass")
-    hydroserver_auth = requests.auth.HTTPBasicAuth(
-        hydroserver_user,
-        hydroserver_pass
-    )
 
     rest_url = f"{hydroserver_url}/manage/network/{res_id}/"
 
     if hydroserver_url is not None:
-        response = requests.delete(rest_url, auth=hydroserver_auth)
+        response = clients.delete("hydroserver", rest_url, operation="delete")
     else:
         response = None
 
     return response
 
 
+def get_vrt_url(db):
+    """
+    Gets the HydroShare URL of a raster layer's VRT file.
+    """
+
+    hydroshare_url = "/".join(settings.HIS.get("hydroshare_url").split("/")[:-1])
+
+    return f"{hydroshare_url}/resource/{'.'.join(db['hs_path'].split('.')[:-1])}.vrt"
+
+
+def get_raster_statistics(db):
+    """
+    Reads (maximum, minimum, nodata) from a raster layer's VRT file on HydroShare.
+    Returns None if the VRT file does not define them.
+    """
+
+    response = clients.get("hydroshare", get_vrt_url(db), operation="read_vrt")
+    if response.status_code != 200:
+        return None
+
+    return parse_raster_statistics(response.content)
+
+
+def parse_raster_statistics(content):
+    """
+    Parses (maximum, minimum, nodata) from the content of a VRT file, or returns None if it does not define them.
+    """
+
+    vrt = etree.fromstring(content.decode('utf-8'))
+    layer_max = None
+    layer_min = None
+    layer_ndv = None
+    for element in vrt.iterfind(".//MDI"):
+        if element.get("key") == "STATISTICS_MAXIMUM":
+            layer_max = element.text
+        if element.get("key") == "STATISTICS_MINIMUM":
+            layer_min = element.text
+
+    if layer_max == None or layer_min == None:
+        return None
+
+    try:
+        if float(layer_min) >= float(layer_max):
+            return None
+    except ValueError:
+        return None
+
+    try:
+        layer_ndv = vrt.find(".//NoDataValue").text
+    except:
+        return None
+
+    if layer_ndv == None:
+        return None
+
+    return layer_max, layer_min, layer_ndv
+
+
+def get_geoserver_layer_info(db, message, success=False):
+    """
+    Builds the result of a GeoServer layer registration, including any preflight warnings about a
+    layer that was published.
+    """
+
+    db_info = {"success": success, "type": db["layer_type"], "layer_name": db["layer_name"], "message": message}
+
+    if success and db.get("warnings"):
+        db_info["warnings"] = db["warnings"]
+
+    return db_info
+
+
+def get_layer_definition(db, layer_name):
+    """
+    Builds the body of the request that creates a coverage or feature type under its final name.
+    """
+
+    layer = {
+        "name": layer_name,
+        "nativeName": db["file_name"],
+        "title": layer_name,
+        "enabled": True
+    }
+
+    if db["verification"] == "coverage":
+        layer["nativeCoverageName"] = db["file_name"]
+
+    if db.get("local_bbox") is not None:
+        layer["srs"] = db["local_bbox"]["crs"]
+        layer["nativeBoundingBox"] = db["local_bbox"]
+
+    return json.dumps({db["verification"]: layer})
+
+
+def parse_layer_bbox(response, db):
+    """
+    Gets the native bounding box from GeoServer's description of a new layer, or None if the layer
+    is missing or disabled.
+    """
+
+    try:
+        layer = json.loads(response.content.decode('utf-8'))[db["verification"]]
+        if layer["enabled"] is False:
+            return None
+        return layer["nativeBoundingBox"]
+    except:
+        return None
+
+
+def get_wms_preview_url(workspace_id, layer_name, bbox):
+    geoserver_url = settings.HIS.get("geoserver_url")
+
+    return f"{'/'.join((geoserver_url.split('/')[:-1]))}/{workspace_id}/wms?service=WMS&version=1.1.0&request=GetMap&layers={workspace_id}:{urllib.parse.quote(layer_name)}&bbox={bbox['minx']}%2C{bbox['miny']}%2C{bbox['maxx']}%2C{bbox['maxy']}&width=612&height=768&srs={bbox['crs']}&format=application/openlayers"
+
+
 def register_geoserver_db(res_id, db):
     """
     Attempts to register a GeoServer layer
+
+    The store is created without configuring a layer, then the coverage or feature type is created
+    under its final name and read back for the bounding box GeoServer computed. If the bounding box
+    is already known from db["local_bbox"], it is declared in the create call and not read back.
+
+    On success the layer's native bounding box is stored in db["bbox"]. Raster statistics are read
+    from db["raster_stats"] when cached, otherwise from the VRT file, and stored there.
     """
 
     geoserver_namespace = settings.HIS.get("geoserver_ns")
     geoserver_url = settings.HIS.get("geoserver_url")
-    geoserver_user = settings.HIS.get("geoserver_user")
     geoserver_directory = settings.HIS.get("geoserver_data_dir")
-    geoserver_pass = settings.HIS.get("geoserver_pass")
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
 
     workspace_id = f"{geoserver_namespace}-{res_id}"
 
@@ -375,78 +397,62 @@ def register_geoserver_db(res_id, db):
     }
 
     if any(i in db['layer_name'] for i in [".", ","]):
-        return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to register GeoServer layer."}
+        return get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
+
+    layer_name = db["layer_name"].replace("/", " ")
+    store_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{layer_name}"
 
-    rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}/external.{db['file_type']}"
+    rest_url = f"{store_url}/external.{db['file_type']}"
     data = f"file://{geoserver_directory}/{db['hs_path']}"
-    response = requests.put(rest_url, data=data, headers=headers, auth=geoserver_auth)
+    response = clients.put("geoserver", rest_url, params={"configure": "none"}, data=data, headers=headers, operation="create_store")
 
     if response.status_code != 201:
-        return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to register GeoServer layer."}
-
-    rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}/{db['layer_group']}/{db['file_name']}.json"
-    response = requests.get(rest_url, headers=headers, auth=geoserver_auth)
+        return get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
 
-    try:
-        if json.loads(response.content.decode('utf-8'))[db["verification"]]["enabled"] is False:
-            return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to register GeoServer layer."}
-    except:
-        return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to register GeoServer layer."}
+    rest_url = f"{store_url}/{db['layer_group']}"
+    response = clients.post("geoserver", rest_url, data=get_layer_definition(db, layer_name), headers=headers, operation="create_layer")
 
-    bbox = json.loads(response.content)[db["verification"]]["nativeBoundingBox"]
+    if response.status_code != 201:
+        return get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
 
-    data = response.content.decode('utf-8').replace('"name":"' + db["file_name"] + '"', '"name":"' + db["layer_name"].replace("/", " ") + '"')
-    response = requests.put(rest_url, headers=headers, auth=geoserver_auth, data=data)
+    if db.get("local_bbox") is not None:
+        bbox = db["local_bbox"]
+    else:
+        rest_url = f"{store_url}/{db['layer_group']}/{layer_name}.json"
+        response = clients.get("geoserver", rest_url, headers=headers, operation="verify")
+        bbox = parse_layer_bbox(response, db)
 
-    if response.status_code != 200:
-        return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to register GeoServer layer."}
+    if bbox is None:
+        return get_geoserver_layer_info(db, "Error: Unable to register GeoServer layer.")
 
     if db["layer_type"] == "GeographicRaster":
         try:
-            hydroshare_url = "/".join(settings.HIS.get("hydroshare_url").split("/")[:-1])
-            layer_vrt_url = f"{hydroshare_url}/resource/{'.'.join(db['hs_path'].split('.')[:-1])}.vrt"
-            response = requests.get(layer_vrt_url)
-            vrt = etree.fromstring(response.content.decode('utf-8'))
-            layer_max = None
-            layer_min = None
-            layer_ndv = None
-            for element in vrt.iterfind(".//MDI"):
-                if element.get("key") == "STATISTICS_MAXIMUM":
-                    layer_max = element.text
-                if element.get("key") == "STATISTICS_MINIMUM":
-                    layer_min = element.text
-
-            if layer_max == None or layer_min == None or layer_min >= layer_max:
-                return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
-
-            try:
-                layer_ndv = vrt.find(".//NoDataValue").text
-            except:
-                return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
-
-            if layer_ndv == None:
-                return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
-
-            layer_style = get_layer_style(layer_max, layer_min, layer_ndv, db["layer_name"].replace("/", " "))
-
-            rest_url = f"{geoserver_url}/workspaces/{workspace_id}/styles"
-            headers = {"content-type": "application/vnd.ogc.sld+xml"}
-            response = requests.post(rest_url, data=layer_style, auth=geoserver_auth, headers=headers)
-
-            if response.status_code != 201:
-                return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
-
-            rest_url = f"{geoserver_url}/layers/{workspace_id}:{db['layer_name'].replace('/', ' ')}"
-            headers = {"content-type": "application/json"}
-            body = '{"layer": {"defaultStyle": {"name": "' + db["layer_name"].replace("/", " ") + '", "href":"https:\/\/geoserver.hydroshare.org\/geoserver\/rest\/styles\/' + db["layer_name"].replace("/", " ") + '.json"}}}'
-            response = requests.put(rest_url, data=body, auth=geoserver_auth, headers=headers)
-
-            if response.status_code != 200:
-                return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
+            if db.get("raster_stats") is None:
+                try:
+                    with tracing.span("vrt_statistics"):
+                        db["raster_stats"] = get_raster_statistics(db)
+                except:
+                    db["raster_stats"] = None
+
+            if db["raster_stats"] is None:
+                with tracing.span("tiff_statistics", hs_path=db["hs_path"]):
+                    db["raster_stats"] = tiff.get_local_statistics(db)
+
+            if db["raster_stats"] is None:
+                return get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+
+            layer_max, layer_min, layer_ndv = db["raster_stats"]
+
+            if not styles.apply_raster_style(workspace_id, layer_name, layer_max, layer_min, layer_ndv):
+                return get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+        except circuit.BackendUnavailableError:
+            raise
         except:
-            return {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to parse VRT file."}
+            return get_geoserver_layer_info(db, "Error: Unable to parse VRT file.")
+
+    db["bbox"] = bbox
 
-    return {"success": True, "type": db["layer_type"], "layer_name": db["layer_name"], "message": f"{'/'.join((geoserver_url.split('/')[:-1]))}/{workspace_id}/wms?service=WMS&version=1.1.0&request=GetMap&layers={workspace_id}:{urllib.parse.quote(db['layer_name'].replace('/', ' '))}&bbox={bbox['minx']}%2C{bbox['miny']}%2C{bbox['maxx']}%2C{bbox['maxy']}&width=612&height=768&srs={bbox['crs']}&format=application/openlayers"}
+    return get_geoserver_layer_info(db, get_wms_preview_url(workspace_id, layer_name, bbox), success=True)
 
 
 def unregister_geoserver_db(res_id, db):
@@ -456,12 +462,6 @@ def unregister_geoserver_db(res_id, db):
 
     geoserver_namespace = settings.HIS.get("geoserver_ns")
     geoserver_url = settings.HIS.get("geoserver_url")
-    geoserver_user = settings.HIS.get("geoserver_user")
-    geoserver_pass = settings.HIS.get("geoserver_pass")
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
 
     workspace_id = f"{geoserver_namespace}-{res_id}"
 
@@ -475,28 +475,23 @@ def unregister_geoserver_db(res_id, db):
 
     if geoserver_url is not None:
         rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}"
-        response = requests.delete(rest_url, params=params, headers=headers, auth=geoserver_auth)
+        response = clients.delete("geoserver", rest_url, params=params, headers=headers, operation="delete")
     else:
         response = None
 
     return response
 
 
-def register_hydroserver_db(res_id, db):
+def get_database_definition(res_id, db):
+    """
+    Builds the form data of the request that adds a database to a HydroServer network.
+    """
 
-    hydroserver_url = settings.HIS.get("hydroserver_url")
-    hydroserver_user = settings.HIS.get("hydroserver_user")
-    hydroserver_pass = settings.HIS.get("hydroserver_pass")
     hydroserver_data_dir = settings.HIS.get("hydroserver_data_dir")
-    hydroserver_auth = requests.auth.HTTPBasicAuth(
-        hydroserver_user, 
-        hydroserver_pass
-    )
-
-    rest_url = f"{hydroserver_url}/manage/network/{res_id}/databases/"
 
     db_path = f"{hydroserver_data_dir}/{db['hs_path']}"
-    data = {
+
+    return {
         "network_id": str(res_id),
         "database_id": str(db["database_name"]),
         "database_name": str(db["layer_title"]),
@@ -504,12 +499,35 @@ def register_hydroserver_db(res_id, db):
         "database_type": "odm2_sqlite"
     }
 
-    response = requests.post(rest_url, data=data, auth=hydroserver_auth)
+
+def register_hydroserver_db(res_id, db):
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
+
+    rest_url = f"{hydroserver_url}/manage/network/{res_id}/databases/"
+
+    response = clients.post("hydroserver", rest_url, data=get_database_definition(res_id, db), operation="create_database")
+
+    return get_hydroserver_database_info(res_id, db, response)
+
+
+def get_hydroserver_database_info(res_id, db, response):
+    """
+    Builds the result of a HydroServer database registration, including the database's catalog
+    summary if a preflight check stored one in db["catalog"].
+    """
+
+    hydroserver_url = settings.HIS.get("hydroserver_url")
 
     if response.status_code != 201:
         return {"success": False, "type": "Timeseries", "message": "Error: Unable to register Water Data Server database."}
 
-    return {"success": True, "type": "Timeseries", "message": f"{hydroserver_url}/refts/catalog/?network_id={res_id}&database_id={db['database_name']}"}
+    db_info = {"success": True, "type": "Timeseries", "message": f"{hydroserver_url}/refts/catalog/?network_id={res_id}&database_id={db['database_name']}"}
+
+    if db.get("catalog") is not None:
+        db_info["catalog"] = db["catalog"]
+
+    return db_info
 
 
 def unregister_hydroserver_db(res_id, db):
@@ -518,17 +536,11 @@ def unregister_hydroserver_db(res_id, db):
     """
 
     hydroserver_url = settings.HIS.get("hydroserver_url")
-    hydroserver_user = settings.HIS.get("hydroserver_user")
-    hydroserver_pass = settings.HIS.get("hydroserver_pass")
-    hydroserver_auth = requests.auth.HTTPBasicAuth(
-        hydroserver_user,
-        hydroserver_pass
-    )
 
     rest_url = f"{hydroserver_url}/manage/network/{res_id}/database/{db['database_name']}/"
 
     if hydroserver_url is not None:
-        response = requests.delete(rest_url, auth=hydroserver_auth)
+        response = clients.delete("hydroserver", rest_url, operation="delete")
     else:
         response = None
 
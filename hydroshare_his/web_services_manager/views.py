@@ -1,7 +1,22 @@
 from rest_framework.response import Response
 from rest_framework import viewsets, status
-from rest_framework.permissions import BasePermission, IsAuthenticated, SAFE_METHODS
+from rest_framework.permissions import BasePermission, IsAdminUser, IsAuthenticated, SAFE_METHODS
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from web_services_manager import utilities
+from web_services_manager import pipeline
+from web_services_manager import jobs
+from web_services_manager import coalesce
+from web_services_manager import registry
+from web_services_manager import bulk
+from web_services_manager import metrics
+from web_services_manager import circuit
+from web_services_manager import admission
+from web_services_manager import tracing
+from web_services_manager.models import UpdateJob
+from hydroshare_his import settings
+import functools
 import json
 
 
@@ -10,6 +25,35 @@ class ReadOnly(BasePermission):
         return request.method in SAFE_METHODS
 
 
+def get_boolean_param(request, name, default=False):
+    """
+    Reads a true/false query parameter.
+    """
+
+    value = request.query_params.get(name)
+
+    if value is None:
+        return default
+
+    return value.lower() in ("true", "1", "yes")
+
+
+def is_async_request(request):
+    """
+    Checks whether the caller opted in to asynchronous processing.
+    """
+
+    return get_boolean_param(request, "async", settings.HIS.get("async_updates", False))
+
+
+def get_metrics(request):
+    """
+    Returns request and update metrics of all worker processes in the Prometheus text format.
+    """
+
+    return HttpResponse(metrics.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class Services(viewsets.ViewSet):
     """
     Services
@@ -19,66 +63,126 @@ class Services(viewsets.ViewSet):
 
     permission_classes = (IsAuthenticated|ReadOnly,)
 
+    def get_permissions(self):
+        if self.action == "get_update_trace":
+            return [IsAdminUser()]
+        return super().get_permissions()
+
     def post_update_services(self, request, resource_id, *args, **kwargs):
         """
         Checks HydroShare resource for data that can be exposed via WMS, WFS, WCS, or WOF web services,
         publishes those services, then returns access URLs to HydroShare.
-        """
 
-        db_list_response = utilities.get_database_list(resource_id)
+        With ?async=true the update is queued and a job id is returned with status 202. With
+        ?force=true the resource is reconciled even if its file list has not changed. Synchronous
+        updates wait for an update slot, behind other interactive updates but ahead of bulk callers,
+        which pass ?priority=bulk. Status 429 with Retry-After is returned when the queue is full.
+        With ?trace=true a trace of the update is saved for get_update_trace.
+        """
 
-        registered_services = {
-            "geoserver": [],
-            "hydroserver": []
-        }
+        force = get_boolean_param(request, "force")
+        trace = get_boolean_param(request, "trace")
 
-        if db_list_response["access"] == ("private" or "not_found"):
+        if is_async_request(request):
 
-            utilities.unregister_geoserver_databases(resource_id)
-            utilities.unregister_hydroserver_databases(resource_id)
+            job = jobs.submit_update_job(resource_id, force=force)
 
             response = {
-                "resource": {},
-                "content": []
+                "job_id": str(job.job_id),
+                "status": job.status,
+                "status_url": request.build_absolute_uri(reverse("job_status", kwargs={"job_id": str(job.job_id)}))
             }
 
-            return Response(response, status=status.HTTP_201_CREATED)
+            return Response(response, status=status.HTTP_202_ACCEPTED)
+
+        if request.query_params.get("priority") == "bulk":
+            priority = admission.BULK
+        else:
+            priority = admission.INTERACTIVE
+
+        try:
+            response = coalesce.run_coalesced(
+                resource_id,
+                functools.partial(admission.run_admitted, priority, pipeline.update_resource_services),
+                force=force,
+                trace=trace
+            )
+        except admission.AdmissionError as e:
+            return Response(
+                {"message": str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except coalesce.CoalescedUpdateError as e:
+            return Response({"message": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except circuit.BackendUnavailableError as e:
+            return Response({"message": f"Error: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(response, status=status.HTTP_201_CREATED)
+
+    def post_bulk_update_services(self, request, *args, **kwargs):
+        """
+        Updates web services for many HydroShare resources and streams one JSON result per line.
+
+        Resource ids are given as a JSON list in "resource_ids" or as an uploaded text file "file" with
+        one id per line. ?workers= sets the worker pool size and ?force=true skips unchanged-file checks.
+        """
+
+        if "file" in request.FILES:
+            lines = [line.decode("utf-8") for line in request.FILES["file"]]
+        else:
+            resource_ids = request.data.get("resource_ids") if hasattr(request.data, "get") else request.data
+            if not isinstance(resource_ids, list):
+                return Response({"message": "Error: No resource ids provided."}, status=status.HTTP_400_BAD_REQUEST)
+            lines = (str(res_id) for res_id in resource_ids)
+
+        try:
+            workers = int(request.query_params.get("workers", 0))
+        except ValueError:
+            return Response({"message": "Error: Invalid worker count."}, status=status.HTTP_400_BAD_REQUEST)
 
-        elif db_list_response["access"] == "public":
+        results = bulk.stream_bulk_update(
+            bulk.parse_resource_ids(lines),
+            workers=workers,
+            force=get_boolean_param(request, "force")
+        )
 
-            if db_list_response["geoserver"]["create_workspace"]:
-                utilities.register_geoserver_workspace(resource_id)
+        return StreamingHttpResponse(results, content_type="application/x-ndjson")
 
-            if db_list_response["hydroserver"]["create_network"]:
-                utilities.register_hydroserver_network(resource_id)
+    def get_job_status(self, request, job_id, *args, **kwargs):
+        """
+        Returns progress of an asynchronous update job and, once finished, its HydroShare response.
+        """
+
+        try:
+            job = UpdateJob.objects.get(job_id=job_id)
+        except (UpdateJob.DoesNotExist, ValidationError):
+            return Response({"message": "Error: Job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(jobs.get_job_status(job), status=status.HTTP_200_OK)
 
-            for db in db_list_response["geoserver"]["unregister"]:
-                utilities.unregister_geoserver_db(resource_id, db)
+    def get_resource_services(self, request, resource_id, *args, **kwargs):
+        """
+        Returns the web services recorded for a HydroShare resource without querying GeoServer or HydroServer.
+        """
 
-            for db in db_list_response["hydroserver"]["unregister"]:
-                utilities.unregister_hydroserver_db(resource_id, db)
+        registered = registry.get_registered_services(resource_id)
 
-            for db in db_list_response["geoserver"]["register"]:
-                db_info = utilities.register_geoserver_db(resource_id, db)
-                registered_services["geoserver"].append(db_info)
-                if db_info["success"] is False:
-                    utilities.unregister_geoserver_db(resource_id, db)
+        if registered is None:
+            return Response({"message": "Error: Resource not found."}, status=status.HTTP_404_NOT_FOUND)
 
-            for db in db_list_response["hydroserver"]["register"]:
-                db_info = utilities.register_hydroserver_db(resource_id, db)
-                registered_services["hydroserver"].append(db_info)
-                if db_info["success"] is False:
-                    utilities.unregister_hydroserver_db(resource_id, db)
+        response = utilities.build_hydroshare_response(resource_id, *registered)
 
-            geoserver_list = utilities.get_geoserver_list(resource_id)
-            hydroserver_list = utilities.get_hydroserver_list(resource_id)
+        return Response(response, status=status.HTTP_200_OK)
 
-            if not geoserver_list:
-                utilities.unregister_geoserver_databases(resource_id)
+    def get_update_trace(self, request, resource_id, *args, **kwargs):
+        """
+        Returns the last saved trace of a resource update in the Chrome trace event format. Admin only.
+        """
 
-            if not hydroserver_list:
-                utilities.unregister_hydroserver_databases(resource_id)
+        trace = tracing.load_trace(resource_id)
 
-            response = utilities.build_hydroshare_response(resource_id, registered_services, geoserver_list, hydroserver_list)
+        if trace is None:
+            return Response({"message": "Error: Trace not found."}, status=status.HTTP_404_NOT_FOUND)
 
-            return Response(response, status=status.HTTP_201_CREATED)
+        return Response(trace, status=status.HTTP_200_OK)